@@ -2,38 +2,80 @@
 Audit log routes
 """
 from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from database import get_db
+from database import get_async_db
+from repositories import AuditRepository
 from auth.auth import get_current_user
 
 router = APIRouter()
 templates = Jinja2Templates(directory="jinja_templates")
 
 
+def _filters(entity_type: str, entity_id: str, user_id: str, action: str, since: str, until: str) -> dict:
+    return {
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "user_id": user_id,
+        "action": action,
+        "since": since,
+        "until": until,
+    }
+
+
 @router.get("", response_class=HTMLResponse)
-async def audit_log(request: Request):
-    """Render the audit log page"""
+async def audit_log(
+    request: Request,
+    entity_type: str = "",
+    entity_id: str = "",
+    user_id: str = "",
+    action: str = "",
+    since: str = "",
+    until: str = "",
+    cursor: str = "",
+):
+    """Render the audit log page (filterable, newest first)"""
     try:
         user = get_current_user(request)
         if not user:
-            from fastapi.responses import RedirectResponse
             return RedirectResponse(url="/auth/login", status_code=302)
-        
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-        
-        c.execute("SELECT * FROM audit_log ORDER BY timestamp DESC LIMIT 100")
-        logs = [dict(row) for row in c.fetchall()]
-        conn.close()
+
+        filters = _filters(entity_type, entity_id, user_id, action, since, until)
+        page = await get_async_db().run_read(AuditRepository().list_page, filters, cursor or None)
 
         return templates.TemplateResponse("audit_page.html", {
             "request": request,
-            "logs": logs,
+            **page,
+            "filters": filters,
             "user": user
         })
     except Exception as e:
         print(f"Error loading audit log: {e}")
-        from fastapi.responses import RedirectResponse
         return RedirectResponse(url="/auth/login", status_code=302)
+
+
+@router.get("/items", response_class=HTMLResponse)
+async def audit_log_items(
+    request: Request,
+    entity_type: str = "",
+    entity_id: str = "",
+    user_id: str = "",
+    action: str = "",
+    since: str = "",
+    until: str = "",
+    cursor: str = "",
+):
+    """Audit entries for HTMX filter and pagination updates"""
+    user = get_current_user(request)
+    if not user:
+        return RedirectResponse(url="/auth/login", status_code=302)
+
+    filters = _filters(entity_type, entity_id, user_id, action, since, until)
+    page = await get_async_db().run_read(AuditRepository().list_page, filters, cursor or None)
+
+    return templates.TemplateResponse("audit_items.html", {
+        "request": request,
+        **page,
+        "filters": filters,
+        "user": user
+    })
@@ -4,30 +4,11 @@ Dependency injection for FastAPI
 from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.responses import RedirectResponse
-from database.connection import get_db_connection
-from app.services.user_service import UserService
-from app.services.dmt_service import DMTService
-from app.services.audit_service import AuditService
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def get_user_service(conn=Depends(get_db_connection)) -> UserService:
-    """Get user service instance"""
-    return UserService(conn)
-
-
-def get_dmt_service(conn=Depends(get_db_connection)) -> DMTService:
-    """Get DMT service instance"""
-    return DMTService(conn)
-
-
-def get_audit_service(conn=Depends(get_db_connection)) -> AuditService:
-    """Get audit service instance"""
-    return AuditService(conn)
-
-
 def get_current_user(request: Request) -> Dict[str, Any]:
     """Get current authenticated user from session"""
     user = request.session.get('user')
@@ -1,14 +1,20 @@
 """
 DMT (Defective Material Tag) routes with workflow management
 """
+import json
 from typing import Optional
 from fastapi import APIRouter, Form, Request, status
 from fastapi.responses import Response
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from config import EntityType
-from database import get_db
-from services import ExportService
+from database import get_db, get_async_db, get_report_number_allocator
+from database.audit import get_audit_writer
+from database.counters import read_counters
+from database.cache import get_cache, SELECTORS
+from services import ExportService, get_dashboard_stats
+from services.employee_search import get_employee_index, peek_employee_index, fragment_key
+from repositories import DMTRepository, DMTCard, DMTHistory
 from auth.auth import get_current_user, get_all_users, get_assignable_users
 import uuid
 
@@ -22,26 +28,9 @@ def render_toast(message: str, type: str = "success") -> str:
     return templates.get_template("components/toast.html").render(message=message, color=color)
 
 
-def get_next_report_number() -> int:
-    """Get the next report number and increment the counter"""
-    try:
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-        
-        c.execute("SELECT next_number FROM report_counter WHERE id = 1")
-        result = c.fetchone()
-        next_number = result[0] if result else 1000
-        
-        c.execute("UPDATE report_counter SET next_number = ? WHERE id = 1", (next_number + 1,))
-        conn.commit()
-        conn.close()
-        
-        return next_number
-    except Exception as e:
-        print(f"Error getting next report number: {e}")
-        import time
-        return 1000 + int(time.time() % 10000)
+def get_next_report_number(conn) -> int:
+    """Allocate the next report number within conn's current transaction"""
+    return get_report_number_allocator().allocate(conn)
 
 
 def get_workflow_permissions(user_role: str, workflow_status: str, record_status: str, created_by: str = None, current_user_id: str = None):
@@ -102,6 +91,111 @@ def get_workflow_permissions(user_role: str, workflow_status: str, record_status
     return permissions
 
 
+def _load_dashboard(user: dict):
+    """Collect DMT dashboard counters and recent records (blocking)"""
+    db = get_db()
+    conn = db.get_connection()
+    c = conn.cursor()
+
+    dmt_entities = [
+        EntityType.WORKCENTERS,
+        EntityType.CUSTOMERS,
+        EntityType.INSPECTION_ITEMS,
+        EntityType.PREPARED_BY,
+        EntityType.CAR_TYPES,
+        EntityType.DISPOSITIONS,
+        EntityType.FAILURE_CODES,
+    ]
+
+    # All counters come from the trigger-maintained stats_counters table
+    counters = read_counters(conn)
+    stats = {entity.value: counters.get(f"{entity.value}.active", 0) for entity in dmt_entities}
+    stats["dmt_records"] = counters.get("dmt_records.active", 0)
+    stats["open_dmts"] = counters.get("dmt_records.open", 0)
+    stats["closed_dmts"] = counters.get("dmt_records.closed", 0)
+
+    c.execute(*DMTRepository.visible_select(
+        user, columns=DMTCard.select_list(), order="created_at DESC", limit=10
+    ))
+    c.row_factory = DMTCard.row_factory
+    recent_dmts = c.fetchall()
+    
+    conn.close()
+    return stats, recent_dmts
+
+
+SELECTOR_ENTITIES = {
+    "workcenters": EntityType.WORKCENTERS,
+    "partnumbers": EntityType.PARTNUMBERS,
+    "employees": EntityType.EMPLOYEES,
+    "customers": EntityType.CUSTOMERS,
+    "inspection_items": EntityType.INSPECTION_ITEMS,
+    "prepared_by": EntityType.PREPARED_BY,
+    "car_types": EntityType.CAR_TYPES,
+    "dispositions": EntityType.DISPOSITIONS,
+    "failure_codes": EntityType.FAILURE_CODES,
+}
+
+
+def _query_selectors(conn) -> dict:
+    """Load id/name pairs for every DMT form selector (blocking)"""
+    c = conn.cursor()
+
+    selectors = {}
+    for key, entity in SELECTOR_ENTITIES.items():
+        c.execute(f"SELECT id, name FROM {entity.value} WHERE is_active = 1 ORDER BY name")
+        selectors[key] = [dict(row) for row in c.fetchall()]
+
+    return selectors
+
+
+def _load_selectors(conn) -> dict:
+    """Selector lists for the DMT form, served from the reference data cache"""
+    return get_cache().get(SELECTORS, "dmt_form", lambda: _query_selectors(conn), conn=conn)
+
+
+def _load_form_data(conn, role: str, dmt_id: Optional[str] = None):
+    """
+    Load the record being edited (if any), the selector lists and the
+    users assignable by role, all through conn (blocking)
+    """
+    record = None
+    if dmt_id is not None:
+        c = conn.cursor()
+        c.execute("SELECT * FROM dmt_records WHERE id = ? AND is_active = 1", (dmt_id,))
+        record = c.fetchone()
+        if not record:
+            return None, None, None
+        record = dict(record)
+
+    return record, _load_selectors(conn), get_assignable_users(role, conn)
+
+
+def _assignable_user_ids(conn, role: str) -> set:
+    return {u["id"] for u in get_assignable_users(role, conn)}
+
+
+def _can_view(conn, user: dict, dmt_id: str) -> bool:
+    """Whether user may see the record (same rules as the DMT list)"""
+    clause, params = DMTRepository.visibility_clause(user)
+    row = conn.execute(f"SELECT 1 FROM dmt_records WHERE id = ? AND {clause}", [dmt_id] + params).fetchone()
+    return row is not None
+
+
+def _load_history(conn, user: dict, dmt_id: str):
+    """The record's versions, newest first, or None if the user may not see it (blocking)"""
+    if not _can_view(conn, user, dmt_id):
+        return None
+    return DMTHistory.history(conn, dmt_id)
+
+
+def _load_version(conn, user: dict, dmt_id: str, version: int):
+    """The record as it was at version, or None (blocking)"""
+    if not _can_view(conn, user, dmt_id):
+        return None
+    return DMTHistory.rebuild(conn, dmt_id, version)
+
+
 @router.get("", response_class=HTMLResponse)
 async def dmt_dashboard(request: Request):
     """Render the DMT analytics dashboard"""
@@ -110,50 +204,7 @@ async def dmt_dashboard(request: Request):
         if not user:
             return RedirectResponse(url="/auth/login", status_code=302)
         
-        db = get_db()
-        conn = db.get_connection()
-        c = db.get_connection().cursor()
-
-        stats = {}
-        dmt_entities = [
-            EntityType.WORKCENTERS,
-            EntityType.CUSTOMERS,
-            EntityType.INSPECTION_ITEMS,
-            EntityType.PREPARED_BY,
-            EntityType.CAR_TYPES,
-            EntityType.DISPOSITIONS,
-            EntityType.FAILURE_CODES,
-        ]
-        
-        for entity in dmt_entities:
-            try:
-                c.execute(f"SELECT COUNT(*) as count FROM {entity.value} WHERE is_active = 1")
-                stats[entity.value] = c.fetchone()[0]
-            except Exception as e:
-                print(f"Error getting stats for {entity.value}: {e}")
-                stats[entity.value] = 0
-
-        c.execute("SELECT COUNT(*) as count FROM dmt_records WHERE is_active = 1")
-        stats["dmt_records"] = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) as count FROM dmt_records WHERE status = 'open' AND is_active = 1")
-        stats["open_dmts"] = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) as count FROM dmt_records WHERE status = 'closed' AND is_active = 1")
-        stats["closed_dmts"] = c.fetchone()[0]
-
-        if user["role"] in ["Admin", "Inspector", "Supervisor"]:
-            c.execute("SELECT * FROM dmt_records WHERE is_active = 1 ORDER BY created_at DESC LIMIT 10")
-        else:
-            c.execute("""
-                SELECT * FROM dmt_records 
-                WHERE is_active = 1 AND (created_by = ? OR assigned_to = ?)
-                ORDER BY created_at DESC LIMIT 10
-            """, (user["id"], user["id"]))
-        
-        recent_dmts = [dict(row) for row in c.fetchall()]
-        
-        conn.close()
+        stats, recent_dmts = await get_async_db().run_read(_load_dashboard, user)
 
         return templates.TemplateResponse("dmt/dashboard.html", {
             "request": request,
@@ -167,98 +218,34 @@ async def dmt_dashboard(request: Request):
 
 
 @router.get("/records", response_class=HTMLResponse)
-async def dmt_records_list(request: Request, page: int = 1, search: str = ""):
+async def dmt_records_list(request: Request, search: str = "", cursor: str = ""):
     """List all DMT records with pagination and search"""
     user = get_current_user(request)
     if not user:
         return RedirectResponse(url="/auth/login", status_code=302)
     
-    db = get_db()
-    conn = db.get_connection()
-    c = conn.cursor()
-
-    where_clause = "WHERE is_active = 1"
-    params = []
-    
-    # Admin, Inspector, and Supervisor can see all uploaded DMTs
-    if user["role"] in ["Admin", "Inspector", "Supervisor"]:
-        where_clause += " AND (is_session = 0 OR (is_session = 1 AND created_by = ?))"
-        params.append(user["id"])
-    else:
-        # Others can only see their own sessions and assigned/created uploaded DMTs
-        where_clause += " AND ((is_session = 0 AND (created_by = ? OR assigned_to = ?)) OR (is_session = 1 AND created_by = ?))"
-        params.extend([user["id"], user["id"], user["id"]])
-    
-    if search:
-        where_clause += " AND (report_number LIKE ? OR part_num LIKE ? OR shop_order LIKE ? OR status LIKE ?)"
-        search_param = f"%{search}%"
-        params.extend([search_param, search_param, search_param, search_param])
-
-    c.execute(f"SELECT COUNT(*) as count FROM dmt_records {where_clause}", params)
-    total = c.fetchone()[0]
-
-    offset = (page - 1) * 20
-    c.execute(
-        f"SELECT * FROM dmt_records {where_clause} ORDER BY report_number DESC LIMIT 20 OFFSET ?",
-        params + [offset]
-    )
-    records = [dict(row) for row in c.fetchall()]
-    
-    conn.close()
+    listing = await get_async_db().run_read(DMTRepository().list_page, user, search=search, cursor=cursor or None)
 
     return templates.TemplateResponse("dmt/list.html", {
         "request": request,
-        "records": records,
-        "total": total,
-        "page": page,
+        **listing,
         "search": search,
         "user": user
     })
 
 
 @router.get("/records/items", response_class=HTMLResponse)
-async def get_dmt_records_items(request: Request, page: int = 1, search: str = ""):
+async def get_dmt_records_items(request: Request, search: str = "", cursor: str = ""):
     """Get paginated DMT records for HTMX updates"""
     user = get_current_user(request)
     if not user:
         return RedirectResponse(url="/auth/login", status_code=302)
     
-    db = get_db()
-    conn = db.get_connection()
-    c = conn.cursor()
-
-    where_clause = "WHERE is_active = 1"
-    params = []
-    
-    if user["role"] in ["Admin", "Inspector", "Supervisor"]:
-        where_clause += " AND (is_session = 0 OR (is_session = 1 AND created_by = ?))"
-        params.append(user["id"])
-    else:
-        where_clause += " AND ((is_session = 0 AND (created_by = ? OR assigned_to = ?)) OR (is_session = 1 AND created_by = ?))"
-        params.extend([user["id"], user["id"], user["id"]])
-    
-    if search:
-        where_clause += " AND (report_number LIKE ? OR part_num LIKE ? OR shop_order LIKE ? OR status LIKE ?)"
-        search_param = f"%{search}%"
-        params.extend([search_param, search_param, search_param, search_param])
-
-    c.execute(f"SELECT COUNT(*) as count FROM dmt_records {where_clause}", params)
-    total = c.fetchone()[0]
-
-    offset = (page - 1) * 20
-    c.execute(
-        f"SELECT * FROM dmt_records {where_clause} ORDER BY report_number DESC LIMIT 20 OFFSET ?",
-        params + [offset]
-    )
-    records = [dict(row) for row in c.fetchall()]
-    
-    conn.close()
+    listing = await get_async_db().run_read(DMTRepository().list_page, user, search=search, cursor=cursor or None)
 
     return templates.TemplateResponse("dmt/records_list.html", {
         "request": request,
-        "records": records,
-        "total": total,
-        "page": page,
+        **listing,
         "search": search,
         "user": user
     })
@@ -271,30 +258,7 @@ async def dmt_create_form(request: Request):
     if not user:
         return RedirectResponse(url="/auth/login", status_code=302)
     
-    db = get_db()
-    conn = db.get_connection()
-    c = conn.cursor()
-
-    selectors = {}
-    selector_entities = {
-        "workcenters": EntityType.WORKCENTERS,
-        "partnumbers": EntityType.PARTNUMBERS,
-        "employees": EntityType.EMPLOYEES,
-        "customers": EntityType.CUSTOMERS,
-        "inspection_items": EntityType.INSPECTION_ITEMS,
-        "prepared_by": EntityType.PREPARED_BY,
-        "car_types": EntityType.CAR_TYPES,
-        "dispositions": EntityType.DISPOSITIONS,
-        "failure_codes": EntityType.FAILURE_CODES,
-    }
-    
-    for key, entity in selector_entities.items():
-        c.execute(f"SELECT id, name FROM {entity.value} WHERE is_active = 1 ORDER BY name")
-        selectors[key] = [dict(row) for row in c.fetchall()]
-    
-    assignable_users = get_assignable_users(user["role"])
-    
-    conn.close()
+    _, selectors, assignable_users = await get_async_db().run_read_with_connection(_load_form_data, user["role"])
 
     permissions = get_workflow_permissions(user["role"], "draft", "open")
 
@@ -341,7 +305,7 @@ async def create_dmt_record(
     assigned_to: str = Form(""),
     save_as_session: str = Form("false"),
 ):
-    """Create a new DMT record"""
+    """Create a new DMT record (record, report number and audit row in one transaction)"""
     try:
         user = get_current_user(request)
         if not user:
@@ -384,20 +348,39 @@ async def create_dmt_record(
                     status_code=303
                 )
         
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-
-        dmt_id = str(uuid.uuid4())[:8].upper()
-        report_number = get_next_report_number()
-        
         is_session = 1 if save_as_session == "true" else 0
-        
-        print(f"[v0] Creating DMT record: id={dmt_id}, report_number={report_number}, is_session={is_session}")
-        
-        c.execute("""
-            INSERT INTO dmt_records (
-                id, report_number, 
+
+        def _insert(conn):
+            c = conn.cursor()
+
+            dmt_id = str(uuid.uuid4())[:8].upper()
+            report_number = get_next_report_number(conn)
+            
+            print(f"[v0] Creating DMT record: id={dmt_id}, report_number={report_number}, is_session={is_session}")
+            
+            try:
+                _write_record(conn, c, dmt_id, report_number)
+            except Exception:
+                conn.rollback()
+                get_report_number_allocator().discard(report_number, conn=conn)
+                raise
+
+        def _write_record(conn, c, dmt_id, report_number):
+            c.execute("""
+                INSERT INTO dmt_records (
+                    id, report_number, 
+                    work_center, part_num, operation, employee_name, qty, customer,
+                    shop_order, serial_number, inspection_item, date, prepared_by,
+                    description, car_type, car_cycle, car_second_cycle_date,
+                    process_description, analysis, analysis_by,
+                    disposition, disposition_date, engineer, failure_code, rework_hours,
+                    responsible_dept, material_scrap_cost, others_cost, engineering_remarks,
+                    repair_process, 
+                    status, workflow_status, 
+                    created_by, assigned_to, is_session
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                dmt_id, report_number, 
                 work_center, part_num, operation, employee_name, qty, customer,
                 shop_order, serial_number, inspection_item, date, prepared_by,
                 description, car_type, car_cycle, car_second_cycle_date,
@@ -405,29 +388,15 @@ async def create_dmt_record(
                 disposition, disposition_date, engineer, failure_code, rework_hours,
                 responsible_dept, material_scrap_cost, others_cost, engineering_remarks,
                 repair_process, 
-                status, workflow_status, 
-                created_by, assigned_to, is_session
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            dmt_id, report_number, 
-            work_center, part_num, operation, employee_name, qty, customer,
-            shop_order, serial_number, inspection_item, date, prepared_by,
-            description, car_type, car_cycle, car_second_cycle_date,
-            process_description, analysis, analysis_by,
-            disposition, disposition_date, engineer, failure_code, rework_hours,
-            responsible_dept, material_scrap_cost, others_cost, engineering_remarks,
-            repair_process, 
-            'open', 'draft', 
-            user["id"], assigned_to, is_session
-        ))
-
-        c.execute(
-            "INSERT INTO audit_log (entity_type, entity_id, action, user_id) VALUES (?, ?, ?, ?)",
-            ("dmt_records", dmt_id, "CREATE", user["id"])
-        )
+                'open', 'draft', 
+                user["id"], assigned_to, is_session
+            ))
+
+            DMTHistory.record(conn, dmt_id, None, user["id"])
+            get_audit_writer().record(conn, "dmt_records", dmt_id, "CREATE", user["id"])
 
-        conn.commit()
-        conn.close()
+        await get_async_db().run_transaction(_insert)
+        get_dashboard_stats().invalidate()
 
         print(f"[v0] DMT record created successfully")
         
@@ -446,40 +415,13 @@ async def dmt_edit_form(dmt_id: str, request: Request):
     if not user:
         return RedirectResponse(url="/auth/login", status_code=302)
     
-    db = get_db()
-    conn = db.get_connection()
-    c = conn.cursor()
-
-    c.execute("SELECT * FROM dmt_records WHERE id = ? AND is_active = 1", (dmt_id,))
-    record = c.fetchone()
+    record, selectors, assignable_users = await get_async_db().run_read_with_connection(
+        _load_form_data, user["role"], dmt_id
+    )
     
     if not record:
-        conn.close()
         return render_toast("DMT record not found", "error")
 
-    record = dict(record)
-
-    selectors = {}
-    selector_entities = {
-        "workcenters": EntityType.WORKCENTERS,
-        "partnumbers": EntityType.PARTNUMBERS,
-        "employees": EntityType.EMPLOYEES,
-        "customers": EntityType.CUSTOMERS,
-        "inspection_items": EntityType.INSPECTION_ITEMS,
-        "prepared_by": EntityType.PREPARED_BY,
-        "car_types": EntityType.CAR_TYPES,
-        "dispositions": EntityType.DISPOSITIONS,
-        "failure_codes": EntityType.FAILURE_CODES,
-    }
-    
-    for key, entity in selector_entities.items():
-        c.execute(f"SELECT id, name FROM {entity.value} WHERE is_active = 1 ORDER BY name")
-        selectors[key] = [dict(row) for row in c.fetchall()]
-    
-    assignable_users = get_assignable_users(user["role"])
-    
-    conn.close()
-
     permissions = get_workflow_permissions(
         user["role"], 
         record.get("workflow_status", "draft"),
@@ -497,6 +439,34 @@ async def dmt_edit_form(dmt_id: str, request: Request):
         "permissions": permissions
     })
 
+@router.get("/history/{dmt_id}", response_class=HTMLResponse)
+async def dmt_history(dmt_id: str, request: Request):
+    """Change history of a DMT record with field-level diffs"""
+    user = get_current_user(request)
+    if not user:
+        return render_toast("Please log in", "error")
+
+    versions = await get_async_db().run_read_with_connection(_load_history, user, dmt_id)
+    if versions is None:
+        return render_toast("DMT record not found", "error")
+
+    return templates.get_template("dmt/history.html").render(dmt_id=dmt_id, versions=versions)
+
+
+@router.get("/history/{dmt_id}/{version}")
+async def dmt_version(dmt_id: str, version: int, request: Request):
+    """A past version of a DMT record, rebuilt from its snapshot and deltas"""
+    user = get_current_user(request)
+    if not user:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+
+    record = await get_async_db().run_read_with_connection(_load_version, user, dmt_id, version)
+    if record is None:
+        return JSONResponse({"error": "Version not found"}, status_code=404)
+
+    return JSONResponse({"dmt_id": dmt_id, "version": version, "record": record})
+
+
 @router.post("/update/{dmt_id}", response_class=HTMLResponse)
 async def update_dmt_record(
     request: Request,
@@ -533,15 +503,14 @@ async def update_dmt_record(
     assigned_to: str = Form(""),
     save_as_session: str = Form("false"),
 ):
-    """Update an existing DMT record"""
+    """Update an existing DMT record (record and audit row in one transaction)"""
     try:
         user = get_current_user(request)
         if not user:
             return RedirectResponse(url="/auth/login", status_code=303)
         
         if assigned_to:
-            assignable_users = get_assignable_users(user["role"])
-            assignable_ids = [u["id"] for u in assignable_users]
+            assignable_ids = await get_async_db().run_read_with_connection(_assignable_user_ids, user["role"])
             
             if assigned_to not in assignable_ids:
                 return RedirectResponse(
@@ -586,42 +555,44 @@ async def update_dmt_record(
                     status_code=303
                 )
         
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-
         is_session = 1 if save_as_session == "true" else 0
-        
-        print(f"[v0] Updating DMT record: id={dmt_id}, is_session={is_session}")
-
-        c.execute("""
-            UPDATE dmt_records SET
-                work_center = ?, part_num = ?, operation = ?, employee_name = ?, qty = ?,
-                customer = ?, shop_order = ?, serial_number = ?, inspection_item = ?,
-                date = ?, prepared_by = ?, description = ?, car_type = ?, car_cycle = ?,
-                car_second_cycle_date = ?, process_description = ?, analysis = ?,
-                analysis_by = ?, disposition = ?, disposition_date = ?, engineer = ?,
-                failure_code = ?, rework_hours = ?, responsible_dept = ?,
-                material_scrap_cost = ?, others_cost = ?, engineering_remarks = ?,
-                repair_process = ?, status = ?, assigned_to = ?, is_session = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ? AND is_active = 1
-        """, (
-            work_center, part_num, operation, employee_name, qty, customer,
-            shop_order, serial_number, inspection_item, date, prepared_by,
-            description, car_type, car_cycle, car_second_cycle_date,
-            process_description, analysis, analysis_by,
-            disposition, disposition_date, engineer, failure_code, rework_hours,
-            responsible_dept, material_scrap_cost, others_cost, engineering_remarks,
-            repair_process, status, assigned_to, is_session, dmt_id
-        ))
-
-        c.execute(
-            "INSERT INTO audit_log (entity_type, entity_id, action, user_id) VALUES (?, ?, ?, ?)",
-            ("dmt_records", dmt_id, "UPDATE", user["id"])
-        )
 
-        conn.commit()
-        conn.close()
+        def _update(conn):
+            print(f"[v0] Updating DMT record: id={dmt_id}, is_session={is_session}")
+
+            c = conn.cursor()
+            before = DMTHistory.current(conn, dmt_id)
+
+            c.execute("""
+                UPDATE dmt_records SET
+                    work_center = ?, part_num = ?, operation = ?, employee_name = ?, qty = ?,
+                    customer = ?, shop_order = ?, serial_number = ?, inspection_item = ?,
+                    date = ?, prepared_by = ?, description = ?, car_type = ?, car_cycle = ?,
+                    car_second_cycle_date = ?, process_description = ?, analysis = ?,
+                    analysis_by = ?, disposition = ?, disposition_date = ?, engineer = ?,
+                    failure_code = ?, rework_hours = ?, responsible_dept = ?,
+                    material_scrap_cost = ?, others_cost = ?, engineering_remarks = ?,
+                    repair_process = ?, status = ?, assigned_to = ?, is_session = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND is_active = 1
+            """, (
+                work_center, part_num, operation, employee_name, qty, customer,
+                shop_order, serial_number, inspection_item, date, prepared_by,
+                description, car_type, car_cycle, car_second_cycle_date,
+                process_description, analysis, analysis_by,
+                disposition, disposition_date, engineer, failure_code, rework_hours,
+                responsible_dept, material_scrap_cost, others_cost, engineering_remarks,
+                repair_process, status, assigned_to, is_session, dmt_id
+            ))
+
+            if before is None or not before["is_active"]:
+                return
+            changes = DMTHistory.record(conn, dmt_id, before, user["id"])
+            get_audit_writer().record(
+                conn, "dmt_records", dmt_id, "UPDATE", user["id"], json.dumps(changes) if changes else None
+            )
+
+        await get_async_db().run_transaction(_update)
+        get_dashboard_stats().invalidate()
 
         print(f"[v0] DMT record updated successfully")
         
@@ -645,26 +616,22 @@ async def delete_dmt_record(dmt_id: str, request: Request):
     if not user or user["role"] not in ["Admin", "Inspector", "Supervisor"]:
         return Response(status_code=status.HTTP_403_FORBIDDEN, content="Not authorized")
     
-    db = get_db()
-    conn = db.get_connection()
-    c = conn.cursor()
+    def _delete(conn):
+        c = conn.cursor()
 
-    # Check if the record exists before trying to delete
-    c.execute("SELECT id FROM dmt_records WHERE id = ? AND is_active = 1", (dmt_id,))
-    record_exists = c.fetchone()
-    
-    if record_exists:
-        c.execute(
-            "UPDATE dmt_records SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (dmt_id,)
-        )
-        c.execute(
-            "INSERT INTO audit_log (entity_type, entity_id, action, user_id) VALUES (?, ?, ?, ?)",
-            ("dmt_records", dmt_id, "DELETE", user["id"])
-        )
-        conn.commit()
+        # Check if the record exists before trying to delete
+        before = DMTHistory.current(conn, dmt_id)
+        
+        if before and before["is_active"]:
+            c.execute(
+                "UPDATE dmt_records SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (dmt_id,)
+            )
+            DMTHistory.record(conn, dmt_id, before, user["id"])
+            get_audit_writer().record(conn, "dmt_records", dmt_id, "DELETE", user["id"])
 
-    conn.close()
+    await get_async_db().run_transaction(_delete)
+    get_dashboard_stats().invalidate()
 
     # Return an empty response but add the HX-Trigger header
     # This tells any element listening for 'dmtListChanged' to fire its trigger.
@@ -674,43 +641,27 @@ async def delete_dmt_record(dmt_id: str, request: Request):
     )
 @router.get("/export/{format}")
 async def export_dmt_records(format: str, request: Request, days: Optional[int] = None):
-    """Export DMT records in JSON or CSV format"""
+    """Export DMT records as CSV, JSON or NDJSON (streamed)"""
     try:
         user = get_current_user(request)
         if not user:
             return render_toast("Please log in to export DMT records", "error")
         
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
+        where, params = "", []
 
-        where_clause = "WHERE is_active = 1"
-        params = []
-        
-        # Filter by user role and session visibility
-        if user["role"] not in ["Admin", "Inspector", "Supervisor"]:
-            where_clause += " AND ((is_session = 0 AND (created_by = ? OR assigned_to = ?)) OR (is_session = 1 AND created_by = ?))"
-            params.extend([user["id"], user["id"], user["id"]])
-        else:
-            where_clause += " AND (is_session = 0 OR (is_session = 1 AND created_by = ?))"
-            params.append(user["id"])
-        
         # Apply date filter if specified
         if days:
-            where_clause += " AND created_at >= datetime('now', '-' || ? || ' days')"
+            where += " AND created_at >= datetime('now', '-' || ? || ' days')"
             params.append(days)
 
-        c.execute(f"SELECT * FROM dmt_records {where_clause} ORDER BY created_at DESC", params)
-        records = [dict(row) for row in c.fetchall()]
-        
-        conn.close()
+        # Rows are read with fetchmany() while the response is being sent
+        rows = ExportService.iter_query(
+            *DMTRepository.visible_select(user, where=where, params=params, order="created_at DESC")
+        )
 
-        print(f"[v0] Exporting {len(records)} DMT records (format: {format}, days: {days})")
+        print(f"[v0] Exporting DMT records (format: {format}, days: {days})")
 
-        if format == "csv":
-            return ExportService.export_csv(records, "dmt_records")
-        else:
-            return ExportService.export_json(records, "dmt_records")
+        return ExportService.stream_response(rows, "dmt_records", format)
     except Exception as e:
         print(f"[v0] Error exporting DMT records: {e}")
         import traceback
@@ -726,55 +677,56 @@ async def advance_workflow(dmt_id: str, request: Request):
         if not user:
             return render_toast("Please log in", "error")
         
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-        
-        c.execute("SELECT workflow_status, status FROM dmt_records WHERE id = ? AND is_active = 1", (dmt_id,))
-        result = c.fetchone()
-        
-        if not result:
-            conn.close()
-            return render_toast("DMT record not found", "error")
-        
-        current_workflow = result[0]
-        current_status = result[1]
-        
-        if current_status == "closed":
-            conn.close()
-            return render_toast("Cannot advance closed record", "error")
-        
-        workflow_transitions = {
-            "draft": ("supervisor_review", "supervisor_completed_at"),
-            "supervisor_review": ("manager_review", "manager_completed_at"),
-            "manager_review": ("engineer_review", None),
-            "engineer_review": ("completed", "engineer_completed_at")
-        }
-        
-        if current_workflow not in workflow_transitions:
-            conn.close()
-            return render_toast("Invalid workflow status", "error")
-        
-        next_workflow, timestamp_field = workflow_transitions[current_workflow]
-        
-        if timestamp_field:
-            c.execute(
-                f"UPDATE dmt_records SET workflow_status = ?, {timestamp_field} = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (next_workflow, dmt_id)
-            )
-        else:
-            c.execute(
-                "UPDATE dmt_records SET workflow_status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (next_workflow, dmt_id)
+        def _advance(conn):
+            """Returns (next_workflow, error_message)"""
+            c = conn.cursor()
+            
+            before = DMTHistory.current(conn, dmt_id)
+            
+            if not before or not before["is_active"]:
+                return None, "DMT record not found"
+            
+            current_workflow = before["workflow_status"]
+            current_status = before["status"]
+            
+            if current_status == "closed":
+                return None, "Cannot advance closed record"
+            
+            workflow_transitions = {
+                "draft": ("supervisor_review", "supervisor_completed_at"),
+                "supervisor_review": ("manager_review", "manager_completed_at"),
+                "manager_review": ("engineer_review", None),
+                "engineer_review": ("completed", "engineer_completed_at")
+            }
+            
+            if current_workflow not in workflow_transitions:
+                return None, "Invalid workflow status"
+            
+            next_workflow, timestamp_field = workflow_transitions[current_workflow]
+            
+            if timestamp_field:
+                c.execute(
+                    f"UPDATE dmt_records SET workflow_status = ?, {timestamp_field} = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (next_workflow, dmt_id)
+                )
+            else:
+                c.execute(
+                    "UPDATE dmt_records SET workflow_status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (next_workflow, dmt_id)
+                )
+            
+            DMTHistory.record(conn, dmt_id, before, user["id"])
+            get_audit_writer().record(
+                conn, "dmt_records", dmt_id, "WORKFLOW_ADVANCE", user["id"],
+                f"Advanced from {current_workflow} to {next_workflow}",
             )
-        
-        c.execute(
-            "INSERT INTO audit_log (entity_type, entity_id, action, user_id, changes) VALUES (?, ?, ?, ?, ?)",
-            ("dmt_records", dmt_id, "WORKFLOW_ADVANCE", user["id"], f"Advanced from {current_workflow} to {next_workflow}")
-        )
-        
-        conn.commit()
-        conn.close()
+            
+            return next_workflow, None
+
+        next_workflow, error = await get_async_db().run_transaction(_advance)
+        if error:
+            return render_toast(error, "error")
+        get_dashboard_stats().invalidate()
         
         html = f'<div hx-get="/dmt/edit/{dmt_id}" hx-target="#main-content" hx-trigger="load"></div>'
         html += render_toast(f"Workflow advanced to {next_workflow.replace('_', ' ').title()}", "success")
@@ -795,22 +747,21 @@ async def close_dmt(dmt_id: str, request: Request):
         if user["role"] not in ["Admin", "Inspector", "Engineer"]:
             return render_toast("Only Engineers, Inspectors, and Admins can close DMT records", "error")
         
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-        
-        c.execute(
-            "UPDATE dmt_records SET status = 'closed', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND is_active = 1",
-            (dmt_id,)
-        )
-        
-        c.execute(
-            "INSERT INTO audit_log (entity_type, entity_id, action, user_id) VALUES (?, ?, ?, ?)",
-            ("dmt_records", dmt_id, "CLOSE", user["id"])
-        )
-        
-        conn.commit()
-        conn.close()
+        def _set_status(conn):
+            c = conn.cursor()
+            before = DMTHistory.current(conn, dmt_id)
+            
+            c.execute(
+                "UPDATE dmt_records SET status = 'closed', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND is_active = 1",
+                (dmt_id,)
+            )
+            
+            if before and before["is_active"]:
+                DMTHistory.record(conn, dmt_id, before, user["id"])
+            get_audit_writer().record(conn, "dmt_records", dmt_id, "CLOSE", user["id"])
+
+        await get_async_db().run_transaction(_set_status)
+        get_dashboard_stats().invalidate()
         
         return RedirectResponse(url="/dmt/records?success=DMT record closed successfully", status_code=303)
     except Exception as e:
@@ -829,22 +780,21 @@ async def reopen_dmt(dmt_id: str, request: Request):
         if user["role"] not in ["Admin", "Inspector"]:
             return render_toast("Only Admins and Inspectors can reopen DMT records", "error")
         
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-        
-        c.execute(
-            "UPDATE dmt_records SET status = 'open', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND is_active = 1",
-            (dmt_id,)
-        )
-        
-        c.execute(
-            "INSERT INTO audit_log (entity_type, entity_id, action, user_id) VALUES (?, ?, ?, ?)",
-            ("dmt_records", dmt_id, "REOPEN", user["id"])
-        )
-        
-        conn.commit()
-        conn.close()
+        def _set_status(conn):
+            c = conn.cursor()
+            before = DMTHistory.current(conn, dmt_id)
+            
+            c.execute(
+                "UPDATE dmt_records SET status = 'open', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND is_active = 1",
+                (dmt_id,)
+            )
+            
+            if before and before["is_active"]:
+                DMTHistory.record(conn, dmt_id, before, user["id"])
+            get_audit_writer().record(conn, "dmt_records", dmt_id, "REOPEN", user["id"])
+
+        await get_async_db().run_transaction(_set_status)
+        get_dashboard_stats().invalidate()
         
         return RedirectResponse(url=f"/dmt/edit/{dmt_id}?success=DMT record reopened successfully", status_code=303)
     except Exception as e:
@@ -854,51 +804,24 @@ async def reopen_dmt(dmt_id: str, request: Request):
 
 @router.get("/search/employees", response_class=HTMLResponse)
 async def search_employees(request: Request, q: str = ""):
-    """Search employees by ID, name, or employee number"""
+    """Typeahead: employees whose name words, employee number or ID start with the query"""
     try:
         user = get_current_user(request)
         if not user:
             return ""
         
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-        
-        search_param = f"%{q}%"
-        c.execute("""
-            SELECT id, name, employee_number 
-            FROM employees 
-            WHERE is_active = 1 
-            AND (
-                CAST(id AS TEXT) LIKE ? 
-                OR name LIKE ? 
-                OR employee_number LIKE ?
-            )
-            ORDER BY name 
-            LIMIT 10
-        """, (search_param, search_param, search_param))
-        
-        employees = [dict(row) for row in c.fetchall()]
-        conn.close()
-        
-        if not employees:
-            return '<div class="px-4 py-2 text-gray-500 text-sm">No employees found</div>'
-        
-        html = ""
-        for emp in employees:
-            emp_number = emp.get('employee_number', '')
-            emp_display = f"{emp['name']}"
-            if emp_number:
-                emp_display += f" ({emp_number})"
-            
-            html += f'''
-            <div class="px-4 py-2 hover:bg-blue-100 cursor-pointer employee-option" 
-                 data-id="{emp['id']}" 
-                 data-name="{emp['name']}">
-                <div class="font-medium">{emp['name']}</div>
-                {f'<div class="text-xs text-gray-500">ID: {emp["id"]} | {emp_number}</div>' if emp_number else f'<div class="text-xs text-gray-500">ID: {emp["id"]}</div>'}
-            </div>
-            '''
+        # Served from the in-memory prefix index; the rendered fragment is
+        # cached per (folded) query until the employees table changes
+        index = peek_employee_index()
+        if index is None:
+            index = await get_async_db().run_read(get_employee_index)
+
+        key = fragment_key(q)
+        html = index.cached_fragment(key)
+        if html is None:
+            employees = index.search(q)
+            html = templates.get_template("dmt/employee_results.html").render(employees=employees)
+            index.store_fragment(key, html)
         
         return html
     except Exception as e:
@@ -1,11 +1,14 @@
+import sqlite3
 from typing import Optional
 from fastapi import APIRouter, Form, Request, UploadFile, File
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from config import EntityType, Config
+from database import get_async_db
 from repositories import Repository
-from services import ExportService
-from services.csv_import_service import CSVImportService
+from services import ExportService, get_import_jobs
+from auth.auth import get_current_user
 from utils import get_entity_info
 
 router = APIRouter()
@@ -22,7 +25,7 @@ def render_toast(message: str, type: str = "success") -> str:
 async def entity_page(entity: str, request: Request):
     """Render an entity management page"""
     repo = Repository(EntityType(entity))
-    items, total = repo.get_all(page=1)
+    items, total = await get_async_db().run_read(repo.get_all, page=1)
     info = get_entity_info(entity)
     
     total_pages = (total + Config.PAGE_SIZE - 1) // Config.PAGE_SIZE
@@ -42,7 +45,7 @@ async def entity_page(entity: str, request: Request):
 async def get_items(entity: str, request: Request, page: int = 1, search: str = ""):
     """Get paginated and filtered items"""
     repo = Repository(EntityType(entity))
-    items, total = repo.get_all(page=page, search=search if search else None)
+    items, total = await get_async_db().run_read(repo.get_all, page=page, search=search if search else None)
     info = get_entity_info(entity)
     
     total_pages = (total + Config.PAGE_SIZE - 1) // Config.PAGE_SIZE
@@ -68,12 +71,16 @@ async def create_item(
     """Create a new item"""
     repo = Repository(EntityType(entity))
     
-    if entity == "employees" and employee_number:
-        repo.create(name.strip(), employee_number=employee_number.strip())
-    else:
-        repo.create(name.strip())
+    adb = get_async_db()
+    try:
+        if entity == "employees" and employee_number:
+            await adb.run_write(repo.create, name.strip(), employee_number=employee_number.strip())
+        else:
+            await adb.run_write(repo.create, name.strip())
+    except sqlite3.IntegrityError:
+        return render_toast(f"'{name.strip()}' already exists", "error")
 
-    items, total = repo.get_all(page=1)
+    items, total = await get_async_db().run_read(repo.get_all, page=1)
     info = get_entity_info(entity)
     
     total_pages = (total + Config.PAGE_SIZE - 1) // Config.PAGE_SIZE
@@ -91,72 +98,78 @@ async def create_item(
     return html
 
 
+def _can_access_job(user: Optional[dict], job: Optional[dict], entity: str) -> bool:
+    """Import jobs are visible to the user who uploaded them and to Admins"""
+    if not user or not job or job["entity"] != entity:
+        return False
+    return user["role"] == "Admin" or job["created_by"] == user["id"]
+
+
 @router.post("/{entity}/upload-csv", response_class=HTMLResponse)
 async def upload_csv(
     entity: str,
     request: Request,
     file: UploadFile = File(...)
 ):
-    """Upload and import CSV file"""
+    """Queue a CSV file for background import and return its progress panel"""
     # Validate file type
     if not file.filename.endswith('.csv'):
         return render_toast("Please upload a CSV file", "error")
     
+    user = get_current_user(request)
+    if not user:
+        return render_toast("Please log in to import data", "error")
+
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Parse CSV
-        items, parse_errors = CSVImportService.parse_csv(content, entity)
-        
-        if parse_errors:
-            error_msg = "<br>".join(parse_errors[:5])  # Show first 5 errors
-            if len(parse_errors) > 5:
-                error_msg += f"<br>...and {len(parse_errors) - 5} more errors"
-            return render_toast(f"CSV parsing errors:<br>{error_msg}", "error")
-        
-        if not items:
-            return render_toast("No valid items found in CSV", "error")
-        
-        # Import items
-        success, skipped, import_errors = CSVImportService.import_items(items, entity)
-        
-        # Refresh items list
-        repo = Repository(EntityType(entity))
-        items_list, total = repo.get_all(page=1)
-        info = get_entity_info(entity)
-        
-        total_pages = (total + Config.PAGE_SIZE - 1) // Config.PAGE_SIZE
-        html = templates.get_template("components/items_list.html").render(
-            request=request,
-            items=items_list,
-            total=total,
-            entity=entity,
-            page=1,
-            search="",
-            info=info,
-            total_pages=total_pages
+        EntityType(entity)
+        job = await run_in_threadpool(
+            get_import_jobs().create_job,
+            entity, file.filename, file.file, user["id"],
         )
-        
-        # Build success message
-        msg = f"✓ Imported {success} items"
-        if skipped > 0:
-            msg += f", skipped {skipped} duplicates"
-        if import_errors:
-            msg += f"<br>⚠ {len(import_errors)} errors occurred"
-        
-        html += render_toast(msg, "success" if not import_errors else "info")
+        html = templates.get_template("components/import_progress.html").render(entity=entity, job=job)
+        html += render_toast(f"Upload received, importing {file.filename} in the background", "info")
         return html
     
     except Exception as e:
         return render_toast(f"Upload failed: {str(e)}", "error")
 
 
+@router.get("/{entity}/import-jobs/{job_id}", response_class=HTMLResponse)
+async def import_job_progress(entity: str, job_id: str, request: Request):
+    """Progress panel for an import job (polled by HTMX until it finishes)"""
+    job = await get_async_db().run_read(get_import_jobs().get_job, job_id)
+    if not _can_access_job(get_current_user(request), job, entity):
+        return render_toast("Import job not found", "error")
+
+    html = templates.get_template("components/import_progress.html").render(entity=entity, job=job)
+    if job["status"] == "completed":
+        msg = f"✓ Imported {job['inserted']} items"
+        if job["skipped"]:
+            msg += f", skipped {job['skipped']} duplicates"
+        if job["errors"]:
+            msg += f"<br>⚠ {job['errors']} rows had errors"
+        html += render_toast(msg, "success" if not job["errors"] else "info")
+    elif job["status"] == "failed":
+        html += render_toast(f"Import failed: {job['message']}", "error")
+    return html
+
+
+@router.get("/{entity}/import-jobs/{job_id}/errors.csv")
+async def import_job_errors(entity: str, job_id: str, request: Request):
+    """Download the rows of an import job that were not imported"""
+    job = await get_async_db().run_read(get_import_jobs().get_job, job_id)
+    if not _can_access_job(get_current_user(request), job, entity):
+        return render_toast("Import job not found", "error")
+
+    rows = get_import_jobs().iter_error_rows(job_id)
+    return ExportService.stream_response(rows, f"{entity}_import_{job_id}_errors", "csv")
+
+
 @router.get("/{entity}/edit/{item_id}", response_class=HTMLResponse)
 async def edit_form(entity: str, item_id: str, request: Request):
     """Render edit form for an item"""
     repo = Repository(EntityType(entity))
-    item = repo.get_by_id(item_id)
+    item = await get_async_db().run_read(repo.get_by_id, item_id)
 
     if not item:
         return render_toast("Item not found", "error")
@@ -183,15 +196,19 @@ async def update_item(
     """Update an existing item"""
     repo = Repository(EntityType(entity))
     
-    if entity == "employees" and employee_number is not None:
-        updated = repo.update(item_id, name.strip(), employee_number=employee_number.strip())
-    else:
-        updated = repo.update(item_id, name.strip())
+    adb = get_async_db()
+    try:
+        if entity == "employees" and employee_number is not None:
+            updated = await adb.run_write(repo.update, item_id, name.strip(), employee_number=employee_number.strip())
+        else:
+            updated = await adb.run_write(repo.update, item_id, name.strip())
+    except sqlite3.IntegrityError:
+        return render_toast(f"Another item is already named '{name.strip()}'", "error")
 
     if not updated:
         return render_toast("Item not found", "error")
 
-    items, total = repo.get_all(page=1)
+    items, total = await get_async_db().run_read(repo.get_all, page=1)
     info = get_entity_info(entity)
     
     total_pages = (total + Config.PAGE_SIZE - 1) // Config.PAGE_SIZE
@@ -214,12 +231,12 @@ async def update_item(
 async def delete_item(entity: str, item_id: str, request: Request):
     """Delete an item"""
     repo = Repository(EntityType(entity))
-    success = repo.delete(item_id)
+    success = await get_async_db().run_write(repo.delete, item_id)
 
     if not success:
         return render_toast("Item not found", "error")
 
-    items, total = repo.get_all(page=1)
+    items, total = await get_async_db().run_read(repo.get_all, page=1)
     info = get_entity_info(entity)
     
     total_pages = (total + Config.PAGE_SIZE - 1) // Config.PAGE_SIZE
@@ -238,40 +255,13 @@ async def delete_item(entity: str, item_id: str, request: Request):
 
 
 @router.get("/{entity}/export/{format}")
-async def export_data(entity: str, format: str, days: Optional[int] = None):
-    """Export entity data in JSON or CSV format"""
+async def export_data(
+    entity: str, format: str, days: Optional[int] = None, search: Optional[str] = None
+):
+    """Export entity data as CSV, JSON or NDJSON (streamed from one query)"""
     repo = Repository(EntityType(entity))
-    
-    # Get all items without pagination when exporting
-    if days:
-        items, _ = repo.get_all(days=days, page=1)
-        # Get all pages if there are more items
-        total_items = []
-        page = 1
-        while True:
-            page_items, total = repo.get_all(days=days, page=page)
-            if not page_items:
-                break
-            total_items.extend(page_items)
-            if len(total_items) >= total:
-                break
-            page += 1
-        items = total_items
-    else:
-        # Get all items without date filter
-        total_items = []
-        page = 1
-        while True:
-            page_items, total = repo.get_all(page=page)
-            if not page_items:
-                break
-            total_items.extend(page_items)
-            if len(total_items) >= total:
-                break
-            page += 1
-        items = total_items
-
-    if format == "csv":
-        return ExportService.export_csv(items, entity)
-    else:
-        return ExportService.export_json(items, entity)
+
+    # iter_all runs lazily while the response is being sent
+    items = repo.iter_all(days=days, search=search)
+
+    return ExportService.stream_response(items, entity, format)
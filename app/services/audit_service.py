@@ -5,6 +5,7 @@ import sqlite3
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
+from database.audit import get_audit_writer
 
 logger = logging.getLogger(__name__)
 
@@ -17,14 +18,12 @@ class AuditService:
     
     def log_action(self, user_id: Optional[int], action: str, entity_type: str, 
                    entity_id: Optional[int] = None, details: Optional[str] = None):
-        """Log an audit action"""
+        """Log an audit action (committed with the caller's transaction, or batched in async mode)"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                INSERT INTO audit_logs (user_id, action, entity_type, entity_id, details)
-                VALUES (?, ?, ?, ?, ?)
-            """, (user_id, action, entity_type, entity_id, details))
-            self.conn.commit()
+            get_audit_writer().record(
+                self.conn, entity_type, str(entity_id) if entity_id is not None else "",
+                action, str(user_id) if user_id is not None else None, details,
+            )
             logger.debug(f"Audit log created: {action} on {entity_type}")
         except sqlite3.Error as e:
             logger.error(f"Error creating audit log: {e}")
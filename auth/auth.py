@@ -9,6 +9,7 @@ from enum import Enum
 from typing import Optional
 from fastapi import Request, HTTPException, status
 from database.connection import get_db
+from database.cache import get_cache, USERS
 
 
 class UserRole(str, Enum):
@@ -31,27 +32,36 @@ ROLE_HIERARCHY = {
 }
 
 
-def get_assignable_users(current_user_role: str) -> list:
+def _load_active_users(conn=None) -> list:
+    """All active users, ordered by username (blocking). Uses conn if given."""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db().get_connection()
+    c = conn.cursor()
+    
+    c.execute("""
+        SELECT id, username, role, is_active
+        FROM users
+        WHERE is_active = 1
+        ORDER BY username
+    """)
+    
+    users = [dict(row) for row in c.fetchall()]
+    if own_conn:
+        conn.close()
+    return users
+
+
+def get_assignable_users(current_user_role: str, conn=None) -> list:
     """
     Get users that can be assigned to based on role hierarchy.
     Users can only assign to roles equal or higher than their own.
+    A cache miss is loaded through conn (e.g. the request connection) if given.
     """
     try:
         current_role_level = ROLE_HIERARCHY.get(current_user_role, 0)
         
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT id, username, role, is_active
-            FROM users
-            WHERE is_active = 1
-            ORDER BY username
-        """)
-        
-        all_users = [dict(row) for row in c.fetchall()]
-        conn.close()
+        all_users = get_cache().get(USERS, "active", lambda: _load_active_users(conn), conn=conn)
         
         # Filter users based on role hierarchy
         assignable_users = [
@@ -103,12 +113,6 @@ def create_user(username: str, password: str, role: UserRole) -> dict:
             VALUES (?, ?, ?, ?)
         """, (user_id, username, password_hash, role.value))
         conn.commit()
-        
-        return {
-            "id": user_id,
-            "username": username,
-            "role": role.value
-        }
     except sqlite3.IntegrityError:
         raise ValueError("Username already exists")
     except Exception as e:
@@ -117,6 +121,14 @@ def create_user(username: str, password: str, role: UserRole) -> dict:
     finally:
         conn.close()
 
+    get_cache().invalidate(USERS)
+
+    return {
+        "id": user_id,
+        "username": username,
+        "role": role.value
+    }
+
 
 def authenticate_user(username: str, password: str) -> Optional[dict]:
     """Authenticate a user and return user data if successful"""
@@ -285,6 +297,8 @@ def update_user(user_id: str, username: str = None, password: str = None, role:
     finally:
         conn.close()
     
+    if success:
+        get_cache().invalidate(USERS)
     return success
 
 
@@ -293,9 +307,9 @@ def delete_user(user_id: str) -> bool:
     if not user_id:
         return False
     
+    db = get_db()
+    conn = db.get_connection()
     try:
-        db = get_db()
-        conn = db.get_connection()
         c = conn.cursor()
         
         c.execute("""
@@ -306,12 +320,15 @@ def delete_user(user_id: str) -> bool:
         
         conn.commit()
         success = c.rowcount > 0
-        conn.close()
-        
-        return success
     except Exception as e:
         print(f"Error deleting user: {e}")
         return False
+    finally:
+        conn.close()
+    
+    if success:
+        get_cache().invalidate(USERS)
+    return success
 
 
 def activate_user(user_id: str) -> bool:
@@ -319,9 +336,9 @@ def activate_user(user_id: str) -> bool:
     if not user_id:
         return False
     
+    db = get_db()
+    conn = db.get_connection()
     try:
-        db = get_db()
-        conn = db.get_connection()
         c = conn.cursor()
         
         c.execute("""
@@ -332,9 +349,12 @@ def activate_user(user_id: str) -> bool:
         
         conn.commit()
         success = c.rowcount > 0
-        conn.close()
-        
-        return success
     except Exception as e:
         print(f"Error activating user: {e}")
         return False
+    finally:
+        conn.close()
+    
+    if success:
+        get_cache().invalidate(USERS)
+    return success
@@ -0,0 +1,94 @@
+"""
+Session middleware backed by the server-side session store
+
+Drop-in replacement for Starlette's SessionMiddleware: request.session is
+a plain dict, but the data is kept in database/sessions.py instead of the
+cookie. The cookie holds only the session id, signed with
+Config.SECRET_KEY, so any worker process can resolve it and forged ids
+are rejected without a database lookup.
+"""
+import copy
+from typing import Optional
+from itsdangerous import BadSignature, Signer
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database import get_async_db
+from database.sessions import get_session_store
+
+
+class ServerSessionMiddleware:
+    """Loads request.session from the session store and saves it after the response"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        secret_key: str,
+        cookie_name: str = "qms_session",
+        max_age: int = 86400,
+        https_only: bool = False,
+        same_site: str = "lax",
+    ):
+        self.app = app
+        self.signer = Signer(secret_key, salt="qms-session")
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+        self.flags = f"httponly; samesite={same_site}" + ("; secure" if https_only else "")
+
+    def _unsign(self, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        try:
+            return self.signer.unsign(value).decode()
+        except BadSignature:
+            return None
+
+    def _cookie(self, session_id: Optional[str]) -> str:
+        if session_id is None:
+            return f"{self.cookie_name}=null; path=/; expires=Thu, 01 Jan 1970 00:00:00 GMT; {self.flags}"
+        value = self.signer.sign(session_id).decode()
+        return f"{self.cookie_name}={value}; path=/; Max-Age={self.max_age}; {self.flags}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        store = get_session_store()
+        adb = get_async_db()
+        session_id = self._unsign(HTTPConnection(scope).cookies.get(self.cookie_name))
+        data = None
+        if session_id is not None:
+            data = store.peek(session_id)
+            if data is None:
+                data = await adb.run_read(store.load, session_id)
+            if data is None:
+                session_id = None
+        scope["session"] = data or {}
+        original = copy.deepcopy(scope["session"])
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                cookie = None
+                if session:
+                    if session_id is None or session != original:
+                        new_id = session_id
+                        if new_id is None or session.get("user") != original.get("user"):
+                            # A new session or a login gets a fresh id (no fixation)
+                            new_id = store.new_id()
+                        await adb.run_write(store.save, new_id, session)
+                        if session_id is not None and new_id != session_id:
+                            await adb.run_write(store.delete, session_id)
+                        cookie = self._cookie(new_id)
+                    elif store.needs_touch(session_id):
+                        await adb.run_write(store.touch, session_id)
+                        cookie = self._cookie(session_id)
+                elif session_id is not None:
+                    await adb.run_write(store.delete, session_id)
+                    cookie = self._cookie(None)
+                if cookie is not None:
+                    MutableHeaders(scope=message).append("Set-Cookie", cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
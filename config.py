@@ -12,10 +12,76 @@ class Config:
 
     # Database
     DATABASE_PATH: str = os.getenv("DATABASE_PATH", "qms.db")
+    # Apply pending schema migrations at startup (scripts/migrate.py otherwise)
+    DB_AUTO_MIGRATE: bool = os.getenv("DB_AUTO_MIGRATE", "1") not in ("0", "false", "False")
+    DB_POOL_MAX_SIZE: int = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Executors used by the async access layer (keep below DB_POOL_MAX_SIZE)
+    DB_READ_WORKERS: int = int(os.getenv("DB_READ_WORKERS", "4"))
+    DB_WRITE_WORKERS: int = int(os.getenv("DB_WRITE_WORKERS", "1"))
+    DB_SLOW_QUERY_MS: float = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+
+    # SQLite PRAGMA profiles, applied once to every new connection.
+    # "safe" fsyncs every commit; "throughput" trades the last few commits
+    # on power loss (never corruption, thanks to WAL) for faster writes.
+    DB_PRAGMA_PROFILES: dict = {
+        "safe": {
+            "journal_mode": "WAL",
+            "synchronous": "FULL",
+            "busy_timeout": 5000,
+            "cache_size": -16000,  # negative = KiB, i.e. ~16 MB
+            "mmap_size": 0,
+            "temp_store": "MEMORY",
+        },
+        "throughput": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 10000,
+            "cache_size": -64000,
+            "mmap_size": 268435456,  # 256 MB
+            "temp_store": "MEMORY",
+        },
+    }
+    DB_PRAGMA_PROFILE: str = os.getenv("DB_PRAGMA_PROFILE", "safe")
 
     # Pagination
     PAGE_SIZE: int = int(os.getenv("PAGE_SIZE", "20"))
     MAX_PAGE_SIZE: int = 100
+    # Count the DMT list total on its first page (carried forward as an estimate)
+    DMT_LIST_COUNT_TOTAL: bool = os.getenv("DMT_LIST_COUNT_TOTAL", "1") not in ("0", "false", "False")
+    AUDIT_PAGE_SIZE: int = int(os.getenv("AUDIT_PAGE_SIZE", "50"))
+    # Report numbers reserved per process at a time; 1 allocates inside each insert's transaction
+    REPORT_NUMBER_BLOCK_SIZE: int = int(os.getenv("REPORT_NUMBER_BLOCK_SIZE", "1"))
+    # Rows fetched and encoded per chunk by streaming exports
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+    # CSV uploads are read in chunks of this many bytes and imported in batches of rows
+    CSV_READ_CHUNK_SIZE: int = int(os.getenv("CSV_READ_CHUNK_SIZE", str(256 * 1024)))
+    CSV_IMPORT_BATCH_SIZE: int = int(os.getenv("CSV_IMPORT_BATCH_SIZE", "5000"))
+    # Background import jobs: where uploads wait, how many run at once, and
+    # how long a running job may go without progress before it is re-queued
+    IMPORT_UPLOAD_DIR: str = os.getenv("IMPORT_UPLOAD_DIR", "uploads/imports")
+    IMPORT_WORKERS: int = int(os.getenv("IMPORT_WORKERS", "1"))
+    IMPORT_JOB_STALE_SECONDS: int = int(os.getenv("IMPORT_JOB_STALE_SECONDS", "300"))
+    # How often cached reference data checks for invalidations made by other processes
+    CACHE_VERSION_CHECK_SECONDS: float = float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "5"))
+    # Rendered employee typeahead fragments kept per index build
+    EMPLOYEE_SEARCH_FRAGMENT_CACHE: int = int(os.getenv("EMPLOYEE_SEARCH_FRAGMENT_CACHE", "1024"))
+    # Landing page statistics are reused per user for this long (DMT writes clear them)
+    DASHBOARD_STATS_TTL_SECONDS: float = float(os.getenv("DASHBOARD_STATS_TTL_SECONDS", "5"))
+    # Audit log durability: "sync" writes in the caller's transaction,
+    # "async" queues entries for a background group-commit writer
+    AUDIT_MODE: str = os.getenv("AUDIT_MODE", "sync")
+    AUDIT_QUEUE_SIZE: int = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_FLUSH_INTERVAL: float = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.2"))
+    # Months before the current one are rolled into audit_YYYYMM.db files here
+    AUDIT_ARCHIVE_DIR: str = os.getenv("AUDIT_ARCHIVE_DIR", "audit_archive")
+    # Archived months kept by the retention policy; 0 keeps them forever
+    AUDIT_RETENTION_MONTHS: int = int(os.getenv("AUDIT_RETENTION_MONTHS", "0"))
+    # Archive files attached at once by a query (SQLite allows 10 by default)
+    AUDIT_MAX_ATTACHED: int = int(os.getenv("AUDIT_MAX_ATTACHED", "8"))
+    # DMT change history stores a full snapshot every this many versions, deltas in between
+    DMT_HISTORY_SNAPSHOT_EVERY: int = int(os.getenv("DMT_HISTORY_SNAPSHOT_EVERY", "20"))
 
     # Application
     APP_TITLE: str = "Quality Management System"
@@ -23,9 +89,21 @@ class Config:
     APP_DESCRIPTION: str = "Professional QMS with DMT tracking and user management"
 
     # Security
-    SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
+    # DEBUG allows starting with the built-in SECRET_KEY (development only)
+    DEBUG: bool = os.getenv("DEBUG", "0") not in ("0", "false", "False")
+    DEFAULT_SECRET_KEY: str = "your-secret-key-change-in-production"
+    SECRET_KEY: str = os.getenv("SECRET_KEY", DEFAULT_SECRET_KEY)
     SESSION_COOKIE_NAME: str = "qms_session"
-    SESSION_MAX_AGE: int = 3600 * 24  # 24 hours
+    # Sessions expire this long after they were last used
+    SESSION_MAX_AGE: int = int(os.getenv("SESSION_MAX_AGE", str(3600 * 24)))  # 24 hours
+    # Expiry is pushed forward at most this often per session (saves a write per request)
+    SESSION_TOUCH_INTERVAL: int = int(os.getenv("SESSION_TOUCH_INTERVAL", "300"))
+    # Sessions kept in each process's LRU, and how long a cached one is trusted
+    # before it is re-read (bounds how late a logout in another worker is seen)
+    SESSION_CACHE_SIZE: int = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+    SESSION_CACHE_SECONDS: float = float(os.getenv("SESSION_CACHE_SECONDS", "5"))
+    SESSION_PURGE_INTERVAL: float = float(os.getenv("SESSION_PURGE_INTERVAL", "600"))
+    SESSION_HTTPS_ONLY: bool = os.getenv("SESSION_HTTPS_ONLY", "0") not in ("0", "false", "False")
 
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -38,10 +116,34 @@ class Config:
     # CORS (if needed for API)
     CORS_ORIGINS: list = ["*"]
 
+    @classmethod
+    def get_pragmas(cls) -> dict:
+        """
+        Resolve the active PRAGMA profile.
+        Individual settings can be overridden with DB_PRAGMA_<NAME> env vars,
+        e.g. DB_PRAGMA_SYNCHRONOUS=NORMAL.
+        """
+        if cls.DB_PRAGMA_PROFILE not in cls.DB_PRAGMA_PROFILES:
+            raise ValueError(
+                f"Unknown DB_PRAGMA_PROFILE '{cls.DB_PRAGMA_PROFILE}'. "
+                f"Choose one of: {', '.join(cls.DB_PRAGMA_PROFILES)}"
+            )
+        pragmas = dict(cls.DB_PRAGMA_PROFILES[cls.DB_PRAGMA_PROFILE])
+        for name in pragmas:
+            override = os.getenv(f"DB_PRAGMA_{name.upper()}")
+            if override is not None:
+                pragmas[name] = override
+        return pragmas
+
     @classmethod
     def validate(cls):
-        """Validate configuration"""
-        if cls.SECRET_KEY == "your-secret-key-change-in-production":
+        """
+        Validate configuration. Session cookies are signed with SECRET_KEY,
+        so the publicly known default key is refused unless DEBUG is set.
+        """
+        if not cls.SECRET_KEY or cls.SECRET_KEY == cls.DEFAULT_SECRET_KEY:
+            if not cls.DEBUG:
+                raise ValueError("SECRET_KEY is not set. Set SECRET_KEY (or DEBUG=1 for local development).")
             import warnings
 
             warnings.warn("Using default SECRET_KEY. Change this in production!")
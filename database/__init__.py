@@ -2,5 +2,20 @@
 Database package initialization
 """
 from .connection import Database, get_db
+from .async_db import AsyncDatabase, get_async_db
+from .report_numbers import ReportNumberAllocator, get_report_number_allocator
+from .audit import AuditWriter, get_audit_writer
+from .sessions import SessionStore, get_session_store
 
-__all__ = ["Database", "get_db"]
+__all__ = [
+    "Database",
+    "get_db",
+    "AsyncDatabase",
+    "get_async_db",
+    "ReportNumberAllocator",
+    "get_report_number_allocator",
+    "AuditWriter",
+    "get_audit_writer",
+    "SessionStore",
+    "get_session_store",
+]
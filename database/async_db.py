@@ -0,0 +1,179 @@
+"""
+Async database access layer for use from async route handlers
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from config import Config
+from .connection import Database, get_db
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """
+    Runs blocking sqlite3 work off the event loop.
+
+    Writes are funnelled through a dedicated writer executor (a single thread
+    by default, matching SQLite's one-writer model), while reads run on a
+    separate reader pool so a slow write or export never starves page loads.
+    Every job is timed; jobs slower than Config.DB_SLOW_QUERY_MS are logged.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        read_workers: int = 4,
+        write_workers: int = 1,
+        slow_query_ms: float = 200,
+    ):
+        self.db = db
+        self.slow_query_ms = slow_query_ms
+        self._reader = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-read")
+        self._writer = ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix="db-write")
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._timings_lock = threading.Lock()
+
+    def _timed(self, label: str, func: Callable, args: tuple, kwargs: dict):
+        """Run func on the worker thread and record how long it took"""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._timings_lock:
+                entry = self._timings.setdefault(label, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+                entry["calls"] += 1
+                entry["total_ms"] += elapsed_ms
+                entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            if elapsed_ms >= self.slow_query_ms:
+                logger.warning(f"Slow database call {label}: {elapsed_ms:.1f} ms")
+
+    async def _submit(self, executor: ThreadPoolExecutor, label: str, func: Callable, args: tuple, kwargs: dict):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._timed, label, func, args, kwargs)
+        return await loop.run_in_executor(executor, call)
+
+    @staticmethod
+    def _label(func: Callable) -> str:
+        return getattr(func, "__qualname__", None) or repr(func)
+
+    @staticmethod
+    def _sql_label(sql: str) -> str:
+        return " ".join(sql.split())[:120]
+
+    async def run_read(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking read function on the reader pool"""
+        return await self._submit(self._reader, self._label(func), func, args, kwargs)
+
+    async def run_write(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking write function on the writer executor"""
+        return await self._submit(self._writer, self._label(func), func, args, kwargs)
+
+    def _with_connection(self, func: Callable, args: tuple, kwargs: dict, commit: bool):
+        conn = self.db.get_connection()
+        try:
+            result = func(conn, *args, **kwargs)
+            if commit:
+                conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    async def run_read_with_connection(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run func(conn, *args) on the reader pool with one pooled connection,
+        checked out and returned inside the job. Everything func does
+        (including cache loads) should go through conn.
+        """
+        return await self._submit(
+            self._reader, self._label(func), self._with_connection, (func, args, kwargs, False), {}
+        )
+
+    async def run_transaction(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run func(conn, *args) on the writer executor as one transaction:
+        committed before the job returns, rolled back if func raises. The
+        connection never leaves the writer thread, so the write lock is
+        released as soon as the job ends.
+        """
+        return await self._submit(
+            self._writer, self._label(func), self._with_connection, (func, args, kwargs, True), {}
+        )
+
+    def _fetch(self, sql: str, params: Sequence, mode: str):
+        conn = self.db.get_connection()
+        try:
+            c = conn.execute(sql, params)
+            if mode == "all":
+                return [dict(row) for row in c.fetchall()]
+            row = c.fetchone()
+            if mode == "one":
+                return dict(row) if row else None
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def _execute(self, sql: str, params: Sequence) -> int:
+        conn = self.db.get_connection()
+        try:
+            c = conn.execute(sql, params)
+            conn.commit()
+            return c.rowcount
+        finally:
+            conn.close()
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[Dict]:
+        """Run a SELECT and return all rows as dicts"""
+        return await self._submit(self._reader, self._sql_label(sql), self._fetch, (sql, params, "all"), {})
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[Dict]:
+        """Run a SELECT and return the first row as a dict, or None"""
+        return await self._submit(self._reader, self._sql_label(sql), self._fetch, (sql, params, "one"), {})
+
+    async def fetchval(self, sql: str, params: Sequence = ()) -> Any:
+        """Run a SELECT and return the first column of the first row"""
+        return await self._submit(self._reader, self._sql_label(sql), self._fetch, (sql, params, "value"), {})
+
+    async def execute(self, sql: str, params: Sequence = ()) -> int:
+        """Run a single write statement in its own transaction; returns rowcount"""
+        return await self._submit(self._writer, self._sql_label(sql), self._execute, (sql, params), {})
+
+    def timings(self) -> Dict[str, Dict[str, float]]:
+        """Per-call timing stats: calls, total_ms, max_ms and avg_ms"""
+        with self._timings_lock:
+            return {
+                label: {**entry, "avg_ms": entry["total_ms"] / entry["calls"]}
+                for label, entry in self._timings.items()
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the executors, waiting for queued work by default"""
+        self._writer.shutdown(wait=wait)
+        self._reader.shutdown(wait=wait)
+
+
+_async_db: Optional[AsyncDatabase] = None
+_async_db_lock = threading.Lock()
+
+
+def get_async_db() -> AsyncDatabase:
+    """Get the global async database instance"""
+    global _async_db
+    if _async_db is None:
+        with _async_db_lock:
+            if _async_db is None:
+                _async_db = AsyncDatabase(
+                    get_db(),
+                    read_workers=Config.DB_READ_WORKERS,
+                    write_workers=Config.DB_WRITE_WORKERS,
+                    slow_query_ms=Config.DB_SLOW_QUERY_MS,
+                )
+    return _async_db
@@ -0,0 +1,241 @@
+"""
+Audit log writer
+
+Every mutation records its audit entry through AuditWriter.record(). Two
+durability modes (Config.AUDIT_MODE):
+
+- "sync": the INSERT runs on the caller's connection, inside its
+  transaction, so the entry commits or rolls back with the change.
+- "async": entries are held on the caller's pooled connection until its
+  transaction commits (PooledConnection.after_commit), then go onto a
+  bounded in-memory queue and a background thread group-commits them with
+  executemany, taking audit inserts off the request's transaction. A
+  change that rolls back drops its entries. Entries keep the time they
+  were recorded; a crash loses at most the queued entries. When the queue
+  is full the entry is written synchronously instead of being dropped.
+
+flush() waits for the queue to drain; shutdown() flushes and stops the
+thread (main.py calls it in the lifespan shutdown). stats() reports queue
+depth and write counters.
+"""
+import functools
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from config import Config
+from .connection import get_db
+
+SYNC = "sync"
+ASYNC = "async"
+
+INSERT_SQL = (
+    "INSERT INTO audit_log (entity_type, entity_id, action, user_id, changes, timestamp) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+# (entity_type, entity_id, action, user_id, changes)
+AuditEntry = Tuple[str, str, str, Optional[str], Optional[str]]
+
+
+def now_sql() -> str:
+    """UTC timestamp in SQLite's CURRENT_TIMESTAMP format"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class AuditWriter:
+    """Writes audit entries in the caller's transaction or in background batches"""
+
+    def __init__(
+        self,
+        db,
+        mode: str = SYNC,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        put_timeout: float = 0.05,
+    ):
+        if mode not in (SYNC, ASYNC):
+            raise ValueError(f"Unknown audit mode {mode!r} (expected {SYNC!r} or {ASYNC!r})")
+        self.db = db
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=queue_size)
+        self._idle = threading.Condition()
+        self._unfinished = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "largest_batch": 0,
+            "max_queue_depth": 0,
+            "overflow_sync": 0,
+            "failed": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def record(
+        self,
+        conn,
+        entity_type: str,
+        entity_id: str,
+        action: str,
+        user_id: Optional[str] = None,
+        changes: Optional[str] = None,
+    ):
+        """Record one audit entry (conn is the caller's connection, used in sync mode)"""
+        self.record_many(conn, [(entity_type, entity_id, action, user_id, changes)])
+
+    def record_many(self, conn, entries: Iterable[AuditEntry]):
+        """Record several audit entries"""
+        timestamp = now_sql()
+        rows = [(*entry, timestamp) for entry in entries]
+        if not rows:
+            return
+        after_commit = getattr(conn, "after_commit", None)
+        if self.mode == SYNC or self._stop.is_set() or after_commit is None:
+            # No commit hook on a plain sqlite3 connection: write with the change
+            conn.executemany(INSERT_SQL, rows)
+            return
+        after_commit(functools.partial(self._enqueue, conn, rows))
+
+    def _enqueue(self, conn, rows: Sequence[tuple]):
+        """Queue entries of a committed transaction (runs after conn.commit())"""
+        if self._stop.is_set():
+            overflow = list(rows)
+        else:
+            self._ensure_thread()
+            overflow = []
+            for row in rows:
+                with self._idle:
+                    self._unfinished += 1
+                try:
+                    self._queue.put(row, timeout=self.put_timeout)
+                except queue.Full:
+                    with self._idle:
+                        self._unfinished -= 1
+                    overflow.append(row)
+            with self._idle:
+                self._stats["enqueued"] += len(rows) - len(overflow)
+                self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+                self._stats["overflow_sync"] += len(overflow)
+        if overflow:
+            # Back-pressure: never drop an entry. The change is already
+            # committed, so the entries get their own transaction.
+            conn.executemany(INSERT_SQL, overflow)
+            conn.commit()
+
+    # ------------------------------------------------------------------
+    # Background writer
+    # ------------------------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            with self._idle:
+                self._unfinished -= len(batch)
+                if self._unfinished <= 0:
+                    self._idle.notify_all()
+
+    def _write_batch(self, batch: Sequence[tuple], attempts: int = 3):
+        """Group-commit one batch, retrying briefly if the database is busy"""
+        for attempt in range(1, attempts + 1):
+            conn = self.db.get_connection()
+            try:
+                conn.executemany(INSERT_SQL, batch)
+                conn.commit()
+                with self._idle:
+                    self._stats["written"] += len(batch)
+                    self._stats["batches"] += 1
+                    self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+                return
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Audit batch of {len(batch)} failed (attempt {attempt}/{attempts}): {e}")
+                time.sleep(0.1 * attempt)
+            finally:
+                conn.close()
+        with self._idle:
+            self._stats["failed"] += len(batch)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued entry is written; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._unfinished > 0:
+                if self._thread is None or not self._thread.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: Optional[float] = 10.0) -> bool:
+        """Flush queued entries and stop the writer; later entries are written synchronously"""
+        flushed = self.flush(timeout)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2 + 1)
+        return flushed
+
+    def stats(self) -> Dict:
+        """Queue depth and write counters"""
+        with self._idle:
+            return {
+                "mode": self.mode,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "pending": self._unfinished,
+                **self._stats,
+            }
+
+
+_audit_writer: Optional[AuditWriter] = None
+_audit_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> AuditWriter:
+    """Get the global audit writer"""
+    global _audit_writer
+    if _audit_writer is None:
+        with _audit_writer_lock:
+            if _audit_writer is None:
+                _audit_writer = AuditWriter(
+                    get_db(),
+                    mode=Config.AUDIT_MODE,
+                    queue_size=Config.AUDIT_QUEUE_SIZE,
+                    batch_size=Config.AUDIT_BATCH_SIZE,
+                    flush_interval=Config.AUDIT_FLUSH_INTERVAL,
+                )
+    return _audit_writer
@@ -0,0 +1,220 @@
+"""
+Monthly audit log partitions
+
+The current month's audit entries live in the main database. Older months
+are moved by rollover() into one archive file per month,
+Config.AUDIT_ARCHIVE_DIR/audit_YYYYMM.db, each with the same audit_log
+table and indexes. The main file then stays small, and old months can be
+backed up once and dropped by the retention policy.
+
+Readers see every partition through attached(conn, months). It ATTACHes the
+archive files and creates the temporary view audit_log_all, a UNION ALL of
+main.audit_log and the archives. SQLite pushes WHERE, ORDER BY and LIMIT
+into every arm, so each partition is read through its own indexes.
+AuditRepository decides which months a query needs.
+"""
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+from config import Config
+from .connection import get_db
+from .migrations import AUDIT_LOG_INDEXES
+
+VIEW_NAME = "audit_log_all"
+_FILE_PATTERN = re.compile(r"^audit_(\d{6})\.db$")
+
+_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS {schema}.audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity_type TEXT NOT NULL,
+        entity_id TEXT NOT NULL,
+        action TEXT NOT NULL,
+        user_id TEXT,
+        changes TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def month_of(timestamp: str) -> str:
+    """'2024-05-17 08:00:00' -> '202405'"""
+    return timestamp[:4] + timestamp[5:7]
+
+
+def month_start(month: str) -> str:
+    """'202405' -> '2024-05-01' (compares correctly with stored timestamps)"""
+    return f"{month[:4]}-{month[4:]}-01"
+
+
+def month_end(month: str) -> str:
+    """Start of the following month: '202412' -> '2025-01-01'"""
+    year, mon = int(month[:4]), int(month[4:])
+    year, mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return f"{year:04d}-{mon:02d}-01"
+
+
+def current_month() -> str:
+    """Current month (UTC, like the stored timestamps)"""
+    return datetime.now(timezone.utc).strftime("%Y%m")
+
+
+def shift_month(month: str, months: int) -> str:
+    """month moved by a number of months (negative goes back)"""
+    index = int(month[:4]) * 12 + int(month[4:]) - 1 + months
+    return f"{index // 12:04d}{index % 12 + 1:02d}"
+
+
+class AuditArchive:
+    """Monthly archive files for audit_log"""
+
+    def __init__(self, db, directory: str, max_attached: int = 8):
+        self.db = db
+        self.directory = directory
+        self.max_attached = max_attached
+        self._lock = threading.Lock()
+
+    def path_for(self, month: str) -> str:
+        return os.path.join(self.directory, f"audit_{month}.db")
+
+    def months(self) -> List[str]:
+        """Archived months, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(m.group(1) for m in map(_FILE_PATTERN.match, names) if m)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def attached(self, conn, months: List[str]) -> Iterator[str]:
+        """
+        Attach the given archive months to conn and yield the name of a
+        temporary view over main.audit_log plus those archives. Everything
+        is detached again on exit, so pooled connections go back clean.
+        Must not be used inside an open transaction.
+        """
+        if len(months) > self.max_attached:
+            raise ValueError(f"At most {self.max_attached} archive months can be attached at once")
+        schemas = []
+        try:
+            for month in months:
+                schema = f"audit_{month}"
+                conn.execute("ATTACH DATABASE ? AS " + schema, (self.path_for(month),))
+                schemas.append(schema)
+            arms = ["SELECT * FROM main.audit_log"] + [f"SELECT * FROM {s}.audit_log" for s in schemas]
+            conn.execute(f"CREATE TEMP VIEW {VIEW_NAME} AS " + " UNION ALL ".join(arms))
+            yield VIEW_NAME
+        finally:
+            conn.execute(f"DROP VIEW IF EXISTS temp.{VIEW_NAME}")
+            for schema in schemas:
+                conn.execute(f"DETACH DATABASE {schema}")
+
+    # ------------------------------------------------------------------
+    # Rollover and retention
+    # ------------------------------------------------------------------
+
+    def rollover(self, before: Optional[str] = None, batch_size: int = 50000) -> List[Tuple[str, int]]:
+        """
+        Move every month older than before (default: the current month) out
+        of main.audit_log into its archive file. Returns [(month, moved)].
+
+        Rows are copied and deleted in batches, each committed on its own.
+        WAL transactions are not atomic across attached files, so copies use
+        INSERT OR IGNORE: rerunning after a crash finishes the move without
+        duplicating anything.
+        """
+        before = before or current_month()
+        os.makedirs(self.directory, exist_ok=True)
+        moved: List[Tuple[str, int]] = []
+        with self._lock:
+            conn = self.db.get_connection()
+            try:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS audit_move (id INTEGER PRIMARY KEY)")
+                while True:
+                    oldest = conn.execute(
+                        "SELECT MIN(timestamp) FROM main.audit_log WHERE timestamp < ?", (month_start(before),)
+                    ).fetchone()[0]
+                    if oldest is None:
+                        break
+                    month = month_of(oldest)
+                    moved.append((month, self._move_month(conn, month, batch_size)))
+                conn.execute("DROP TABLE IF EXISTS temp.audit_move")
+            finally:
+                conn.close()
+        return moved
+
+    def _move_month(self, conn, month: str, batch_size: int) -> int:
+        schema = "audit_rollover"
+        conn.execute("ATTACH DATABASE ? AS " + schema, (self.path_for(month),))
+        try:
+            conn.execute(_TABLE_DDL.format(schema=schema))
+            for name, columns in AUDIT_LOG_INDEXES.items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.{name} ON audit_log({columns})")
+            conn.commit()
+
+            bounds = (month_start(month), month_end(month))
+            total = 0
+            while True:
+                conn.execute("DELETE FROM temp.audit_move")
+                count = conn.execute(
+                    "INSERT INTO temp.audit_move (id) SELECT id FROM main.audit_log "
+                    "WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp LIMIT ?",
+                    (*bounds, batch_size),
+                ).rowcount
+                if not count:
+                    break
+                conn.execute(
+                    f"INSERT OR IGNORE INTO {schema}.audit_log "
+                    "SELECT * FROM main.audit_log WHERE id IN (SELECT id FROM temp.audit_move)"
+                )
+                conn.execute("DELETE FROM main.audit_log WHERE id IN (SELECT id FROM temp.audit_move)")
+                conn.commit()
+                total += count
+            conn.commit()
+            return total
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+    def apply_retention(self, keep_months: int, dry_run: bool = False) -> List[str]:
+        """
+        Delete archive files older than the last keep_months months.
+        keep_months <= 0 keeps everything. Returns the removed months.
+        """
+        if keep_months <= 0:
+            return []
+        cutoff = shift_month(current_month(), -keep_months)
+        expired = [month for month in self.months() if month < cutoff]
+        if not dry_run:
+            for month in expired:
+                for suffix in ("", "-wal", "-shm", "-journal"):
+                    try:
+                        os.remove(self.path_for(month) + suffix)
+                    except FileNotFoundError:
+                        pass
+        return expired
+
+
+_audit_archive: Optional[AuditArchive] = None
+_audit_archive_lock = threading.Lock()
+
+
+def get_audit_archive() -> AuditArchive:
+    """Get the global audit archive"""
+    global _audit_archive
+    if _audit_archive is None:
+        with _audit_archive_lock:
+            if _audit_archive is None:
+                _audit_archive = AuditArchive(
+                    get_db(), Config.AUDIT_ARCHIVE_DIR, max_attached=Config.AUDIT_MAX_ATTACHED
+                )
+    return _audit_archive
@@ -0,0 +1,136 @@
+"""
+Versioned in-process cache for rarely changing reference data
+
+Values are cached per namespace ("selectors" for the entity lists on the
+DMT form, "users" for assignable users). Every namespace has a version row
+in cache_versions. Writers call invalidate(namespace) after committing,
+which bumps the row and drops the local entries at once. Other processes
+compare the version rows at most every Config.CACHE_VERSION_CHECK_SECONDS,
+so a cache hit between checks costs no database round trip at all.
+
+PRAGMA data_version was not used: it is per connection, and pooled
+connections are handed out to arbitrary threads.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from config import Config
+from .connection import get_db
+
+SELECTORS = "selectors"
+USERS = "users"
+NAMESPACES = (SELECTORS, USERS)
+
+
+class VersionedCache:
+    """Cache whose namespaces are invalidated through a shared version table"""
+
+    def __init__(self, db, check_interval: float = 5.0):
+        self.db = db
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, Hashable], Tuple[int, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: Hashable, loader: Callable[[], Any], conn=None) -> Any:
+        """
+        Cached value for (namespace, key), calling loader() on a miss.
+        Values are shared between callers and must not be mutated.
+        Callers that already hold a connection pass it as conn, so the
+        version check does not check out a second one from the pool.
+        """
+        self._refresh_versions(conn)
+        with self._lock:
+            version = self._versions.get(namespace, 0)
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader()
+        with self._lock:
+            # Only store if nobody invalidated the namespace while loading
+            if self._versions.get(namespace, 0) == version:
+                self._entries[(namespace, key)] = (version, value)
+        return value
+
+    def peek(self, namespace: str, key: Hashable) -> Any:
+        """
+        Cached value if it is present and no version check is due, else
+        None. Never touches the database, so it is safe on the event loop.
+        """
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            return None
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[0] == self._versions.get(namespace, 0):
+                self.hits += 1
+                return entry[1]
+        return None
+
+    def invalidate(self, namespace: str):
+        """Bump the namespace version for every process and drop local entries"""
+        conn = self.db.get_connection()
+        try:
+            version = conn.execute(
+                "UPDATE cache_versions SET version = version + 1 WHERE name = ? RETURNING version",
+                (namespace,),
+            ).fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self._versions[namespace] = version[0] if version else self._versions.get(namespace, 0) + 1
+            self._drop(namespace)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._checked_at = 0.0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _drop(self, namespace: str):
+        for cache_key in [k for k in self._entries if k[0] == namespace]:
+            del self._entries[cache_key]
+
+    def _refresh_versions(self, conn=None):
+        """Pick up invalidations made by other processes (rate limited)"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        if conn is not None:
+            rows = conn.execute("SELECT name, version FROM cache_versions").fetchall()
+        else:
+            conn = self.db.get_connection()
+            try:
+                rows = conn.execute("SELECT name, version FROM cache_versions").fetchall()
+            finally:
+                conn.close()
+        with self._lock:
+            self._checked_at = now
+            for name, version in rows:
+                if self._versions.get(name) != version:
+                    self._versions[name] = version
+                    self._drop(name)
+
+
+_cache: Optional[VersionedCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> VersionedCache:
+    """Get the global reference data cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = VersionedCache(get_db(), check_interval=Config.CACHE_VERSION_CHECK_SECONDS)
+    return _cache
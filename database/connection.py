@@ -3,7 +3,9 @@ Database connection and initialization
 """
 import sqlite3
 import os
-from config import Config, EntityType
+from config import Config
+from .pool import ConnectionPool, PooledConnection
+from . import migrations
 
 
 class Database:
@@ -14,162 +16,83 @@ class Database:
         db_exists = os.path.exists(db_path)
         if not db_exists:
             print(f"Creating new database at {db_path}")
+        self.pool = ConnectionPool(
+            self._connect,
+            max_size=Config.DB_POOL_MAX_SIZE,
+            timeout=Config.DB_POOL_TIMEOUT,
+        )
         self.init_db()
 
-    def get_connection(self):
-        """Get a database connection with row factory"""
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new physical connection"""
         try:
             conn = sqlite3.connect(self.db_path, check_same_thread=False)
             conn.row_factory = sqlite3.Row
+            self.apply_pragmas(conn)
             return conn
         except sqlite3.DatabaseError as e:
             print(f"Database error: {e}")
             print(f"The database file may be corrupted. Please delete {self.db_path} and run scripts/seed_database.py")
             raise
 
-    def init_db(self):
-        """Initialize database tables and indexes"""
+    @staticmethod
+    def apply_pragmas(conn: sqlite3.Connection):
+        """
+        Apply the active PRAGMA profile from Config.
+        This is the only place PRAGMA tuning is set; journal_mode is
+        persistent in the file, the rest are per-connection.
+        """
+        for name, value in Config.get_pragmas().items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+    def checkpoint(self, mode: str = "TRUNCATE") -> tuple:
+        """
+        Run a WAL checkpoint and refresh planner statistics.
+        Returns (busy, wal_pages, checkpointed_pages).
+        """
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
-            c = conn.cursor()
-
-            # Create entity tables
-            for entity in EntityType:
-                c.execute(f"""
-                    CREATE TABLE IF NOT EXISTS {entity.value} (
-                        id TEXT PRIMARY KEY,
-                        name TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_active BOOLEAN DEFAULT 1
-                    )
-                """)
-                c.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_{entity.value}_name ON {entity.value}(name)"
-                )
-                c.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_{entity.value}_created ON {entity.value}(created_at)"
-                )
-
-            c.execute("""
-                CREATE TABLE IF NOT EXISTS dmt_records (
-                    id TEXT PRIMARY KEY,
-                    report_number INTEGER UNIQUE,
-                    -- General Information
-                    work_center TEXT,
-                    part_num TEXT,
-                    operation TEXT,
-                    employee_name TEXT,
-                    qty TEXT,
-                    customer TEXT,
-                    shop_order TEXT,
-                    serial_number TEXT,
-                    inspection_item TEXT,
-                    date TEXT,
-                    prepared_by TEXT,
-                    -- Defect Description
-                    description TEXT,
-                    car_type TEXT,
-                    car_cycle TEXT,
-                    car_second_cycle_date TEXT,
-                    -- Process Analysis
-                    process_description TEXT,
-                    analysis TEXT,
-                    analysis_by TEXT,
-                    -- Engineering
-                    disposition TEXT,
-                    disposition_date TEXT,
-                    engineer TEXT,
-                    failure_code TEXT,
-                    rework_hours TEXT,
-                    responsible_dept TEXT,
-                    material_scrap_cost TEXT,
-                    others_cost TEXT,
-                    engineering_remarks TEXT,
-                    repair_process TEXT,
-                    -- Metadata
-                    status TEXT DEFAULT 'open',
-                    workflow_status TEXT DEFAULT 'draft',
-                    supervisor_completed_at TIMESTAMP,
-                    manager_completed_at TIMESTAMP,
-                    engineer_completed_at TIMESTAMP,
-                    created_by TEXT,
-                    assigned_to TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1,
-                    is_session BOOLEAN DEFAULT 0
-                )
-            """)
-            c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_id ON dmt_records(id)")
-            c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_report_number ON dmt_records(report_number)")
-            c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_shop_order ON dmt_records(shop_order)")
-            c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_part_num ON dmt_records(part_num)")
-            c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_status ON dmt_records(status)")
-            c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_created_by ON dmt_records(created_by)")
-            c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_assigned_to ON dmt_records(assigned_to)")
-            c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_is_session ON dmt_records(is_session)")
-
-            c.execute("""
-                CREATE TABLE IF NOT EXISTS audit_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    entity_type TEXT NOT NULL,
-                    entity_id TEXT NOT NULL,
-                    action TEXT NOT NULL,
-                    user_id TEXT,
-                    changes TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            c.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id TEXT PRIMARY KEY,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    is_active BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            c.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
-            c.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
+            result = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            conn.execute("PRAGMA optimize")
+            return tuple(result) if result else (0, 0, 0)
+        finally:
+            conn.close()
 
-            c.execute("""
-                CREATE TABLE IF NOT EXISTS report_counter (
-                    id INTEGER PRIMARY KEY CHECK (id = 1),
-                    next_number INTEGER NOT NULL DEFAULT 1000
-                )
-            """)
-            
-            c.execute("INSERT OR IGNORE INTO report_counter (id, next_number) VALUES (1, 1000)")
+    def get_connection(self) -> PooledConnection:
+        """
+        Check out a pooled connection with row factory.
+        Calling close() on it returns it to the pool.
+        """
+        return self.pool.acquire()
 
-            try:
-                c.execute("SELECT workflow_status FROM dmt_records LIMIT 1")
-            except sqlite3.OperationalError:
-                c.execute("ALTER TABLE dmt_records ADD COLUMN workflow_status TEXT DEFAULT 'draft'")
-                c.execute("ALTER TABLE dmt_records ADD COLUMN supervisor_completed_at TIMESTAMP")
-                c.execute("ALTER TABLE dmt_records ADD COLUMN manager_completed_at TIMESTAMP")
-                c.execute("ALTER TABLE dmt_records ADD COLUMN engineer_completed_at TIMESTAMP")
-                print("Added workflow columns to dmt_records table")
+    def pool_stats(self) -> dict:
+        """Connection pool usage counters (in-use, waits, creations, ...)"""
+        return self.pool.stats()
 
-            try:
-                c.execute("SELECT employee_number FROM employees LIMIT 1")
-            except sqlite3.OperationalError:
-                c.execute("ALTER TABLE employees ADD COLUMN employee_number TEXT")
-                c.execute("CREATE INDEX IF NOT EXISTS idx_employees_number ON employees(employee_number)")
-                print("Added employee_number column to employees table")
+    def close(self):
+        """Close all pooled connections"""
+        self.pool.close_all()
 
+    def init_db(self):
+        """Bring the schema up to date via the migration registry"""
+        try:
+            conn = self.get_connection()
             try:
-                c.execute("SELECT is_session FROM dmt_records LIMIT 1")
-            except sqlite3.OperationalError:
-                c.execute("ALTER TABLE dmt_records ADD COLUMN is_session BOOLEAN DEFAULT 0")
-                c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_is_session ON dmt_records(is_session)")
-                print("Added is_session column to dmt_records table")
-
-            conn.commit()
-            conn.close()
+                current = migrations.get_version(conn)
+                latest = migrations.latest_version()
+                if current >= latest:
+                    # Fast path: schema is current, no DDL at all
+                    return
+                if not Config.DB_AUTO_MIGRATE:
+                    print(
+                        f"Database schema is at version {current}, latest is {latest}. "
+                        "Run: python scripts/migrate.py apply"
+                    )
+                    return
+                for step, _ in migrations.migrate(conn):
+                    print(f"Applied migration {step.version}: {step.description}")
+            finally:
+                conn.close()
         except sqlite3.DatabaseError as e:
             print(f"\n{'='*60}")
             print("DATABASE ERROR DETECTED")
@@ -0,0 +1,116 @@
+"""
+Trigger-maintained row counters for dashboards
+
+stats_counters holds one row per counter. SQLite triggers on dmt_records
+and the entity tables adjust the counters on every insert, update of
+is_active/status and delete, so dashboards read them with a single query
+instead of running COUNT(*) over each table.
+"""
+import sqlite3
+from typing import Dict
+from config import EntityType
+
+# Entity tables whose active rows are counted
+COUNTED_ENTITIES = list(EntityType)
+
+
+def counter_queries() -> Dict[str, str]:
+    """Counter name -> authoritative COUNT query used to (re)build it"""
+    queries = {
+        "dmt_records.active": "SELECT COUNT(*) FROM dmt_records WHERE is_active = 1",
+        "dmt_records.open": "SELECT COUNT(*) FROM dmt_records WHERE is_active = 1 AND status = 'open'",
+        "dmt_records.closed": "SELECT COUNT(*) FROM dmt_records WHERE is_active = 1 AND status = 'closed'",
+    }
+    for entity in COUNTED_ENTITIES:
+        queries[f"{entity.value}.active"] = f"SELECT COUNT(*) FROM {entity.value} WHERE is_active = 1"
+    return queries
+
+
+def _dmt_contribution(row: str) -> str:
+    """CASE expression giving a dmt_records row's contribution to each counter"""
+    return f"""CASE name
+        WHEN 'dmt_records.active' THEN IFNULL({row}.is_active = 1, 0)
+        WHEN 'dmt_records.open' THEN IFNULL({row}.is_active = 1 AND {row}.status = 'open', 0)
+        WHEN 'dmt_records.closed' THEN IFNULL({row}.is_active = 1 AND {row}.status = 'closed', 0)
+    END"""
+
+
+def create_counter_triggers(conn: sqlite3.Connection):
+    """Create the stats_counters table and the triggers that maintain it"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.executemany(
+        "INSERT OR IGNORE INTO stats_counters (name, value) VALUES (?, 0)",
+        [(name,) for name in counter_queries()],
+    )
+
+    dmt_names = "('dmt_records.active', 'dmt_records.open', 'dmt_records.closed')"
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS stats_dmt_records_ai AFTER INSERT ON dmt_records BEGIN
+            UPDATE stats_counters SET value = value + {_dmt_contribution('new')}
+            WHERE name IN {dmt_names};
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS stats_dmt_records_au AFTER UPDATE OF is_active, status ON dmt_records BEGIN
+            UPDATE stats_counters
+            SET value = value + {_dmt_contribution('new')} - {_dmt_contribution('old')}
+            WHERE name IN {dmt_names};
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS stats_dmt_records_ad AFTER DELETE ON dmt_records BEGIN
+            UPDATE stats_counters SET value = value - {_dmt_contribution('old')}
+            WHERE name IN {dmt_names};
+        END
+    """)
+
+    for entity in COUNTED_ENTITIES:
+        table = entity.value
+        name = f"'{table}.active'"
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stats_{table}_ai AFTER INSERT ON {table} BEGIN
+                UPDATE stats_counters SET value = value + IFNULL(new.is_active = 1, 0) WHERE name = {name};
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stats_{table}_au AFTER UPDATE OF is_active ON {table} BEGIN
+                UPDATE stats_counters
+                SET value = value + IFNULL(new.is_active = 1, 0) - IFNULL(old.is_active = 1, 0)
+                WHERE name = {name};
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stats_{table}_ad AFTER DELETE ON {table} BEGIN
+                UPDATE stats_counters SET value = value - IFNULL(old.is_active = 1, 0) WHERE name = {name};
+            END
+        """)
+
+
+def rebuild_counters(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Recount every counter from its source table and store the result.
+    Returns {name: drift} for counters whose stored value was wrong.
+    Runs inside the caller's transaction; the caller commits.
+    """
+    stored = read_counters(conn)
+    drift = {}
+    for name, query in counter_queries().items():
+        actual = conn.execute(query).fetchone()[0]
+        if stored.get(name) != actual:
+            drift[name] = actual - (stored.get(name) or 0)
+        conn.execute(
+            "INSERT INTO stats_counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, actual),
+        )
+    return drift
+
+
+def read_counters(conn: sqlite3.Connection) -> Dict[str, int]:
+    """All counters in one query"""
+    return {row[0]: row[1] for row in conn.execute("SELECT name, value FROM stats_counters")}
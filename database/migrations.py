@@ -0,0 +1,569 @@
+"""
+Versioned schema migrations tracked with PRAGMA user_version
+
+Each migration is a function registered with @migration(version, description).
+Migrations run in version order, each inside its own transaction together
+with the user_version bump, so a failed step leaves the schema at the
+previous version. When user_version already equals the latest registered
+version, nothing but a single PRAGMA read is executed.
+"""
+import json
+import sqlite3
+from typing import Callable, Dict, List, Optional, Tuple
+from config import EntityType
+from .counters import create_counter_triggers, rebuild_counters
+
+
+class Migration:
+    """A single schema migration step"""
+
+    def __init__(self, version: int, description: str, apply: Callable[[sqlite3.Connection], None]):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+    def __repr__(self):
+        return f"<Migration {self.version}: {self.description}>"
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Register a migration function under the given schema version"""
+    def decorator(func: Callable[[sqlite3.Connection], None]):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append(Migration(version, description, func))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return func
+    return decorator
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """Current schema version stored in the database header"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version() -> int:
+    """Highest registered migration version"""
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def pending_migrations(conn: sqlite3.Connection, target: Optional[int] = None) -> List[Migration]:
+    """Migrations newer than the database's version, up to target (inclusive)"""
+    current = get_version(conn)
+    target = latest_version() if target is None else target
+    return [m for m in MIGRATIONS if current < m.version <= target]
+
+
+def migrate(
+    conn: sqlite3.Connection,
+    target: Optional[int] = None,
+    dry_run: bool = False,
+) -> List[Tuple[Migration, List[str]]]:
+    """
+    Apply pending migrations up to target (default: latest).
+    With dry_run=True every step is executed and then rolled back, so the
+    returned statements are exactly what would run.
+    Returns a list of (migration, executed_statements).
+    """
+    target = latest_version() if target is None else target
+    if get_version(conn) >= target:
+        return []
+
+    results = []
+    try:
+        if dry_run:
+            # One enclosing transaction, so later steps see the earlier ones
+            # and everything is undone at the end
+            conn.execute("BEGIN")
+        for step in pending_migrations(conn, target):
+            statements: List[str] = []
+            conn.set_trace_callback(statements.append)
+            try:
+                if not dry_run:
+                    conn.execute("BEGIN")
+                step.apply(conn)
+                conn.execute(f"PRAGMA user_version = {int(step.version)}")
+                if not dry_run:
+                    conn.commit()
+            finally:
+                conn.set_trace_callback(None)
+            results.append((step, [s for s in statements if s not in ("BEGIN", "COMMIT")]))
+    except Exception:
+        conn.rollback()
+        raise
+
+    if dry_run:
+        conn.rollback()
+    return results
+
+
+def column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    """Check whether a table has a column"""
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def add_column_if_missing(conn: sqlite3.Connection, table: str, column: str, definition: str) -> bool:
+    """ALTER TABLE ... ADD COLUMN unless the column is already there"""
+    if column_exists(conn, table, column):
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Migration registry
+# ---------------------------------------------------------------------------
+
+@migration(1, "Baseline schema: entity, DMT, audit, user and counter tables")
+def _baseline(conn):
+    c = conn.cursor()
+
+    for entity in EntityType:
+        c.execute(f"""
+            CREATE TABLE IF NOT EXISTS {entity.value} (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_active BOOLEAN DEFAULT 1
+            )
+        """)
+        c.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{entity.value}_name ON {entity.value}(name)"
+        )
+        c.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{entity.value}_created ON {entity.value}(created_at)"
+        )
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS dmt_records (
+            id TEXT PRIMARY KEY,
+            report_number INTEGER UNIQUE,
+            -- General Information
+            work_center TEXT,
+            part_num TEXT,
+            operation TEXT,
+            employee_name TEXT,
+            qty TEXT,
+            customer TEXT,
+            shop_order TEXT,
+            serial_number TEXT,
+            inspection_item TEXT,
+            date TEXT,
+            prepared_by TEXT,
+            -- Defect Description
+            description TEXT,
+            car_type TEXT,
+            car_cycle TEXT,
+            car_second_cycle_date TEXT,
+            -- Process Analysis
+            process_description TEXT,
+            analysis TEXT,
+            analysis_by TEXT,
+            -- Engineering
+            disposition TEXT,
+            disposition_date TEXT,
+            engineer TEXT,
+            failure_code TEXT,
+            rework_hours TEXT,
+            responsible_dept TEXT,
+            material_scrap_cost TEXT,
+            others_cost TEXT,
+            engineering_remarks TEXT,
+            repair_process TEXT,
+            -- Metadata
+            status TEXT DEFAULT 'open',
+            workflow_status TEXT DEFAULT 'draft',
+            supervisor_completed_at TIMESTAMP,
+            manager_completed_at TIMESTAMP,
+            engineer_completed_at TIMESTAMP,
+            created_by TEXT,
+            assigned_to TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            is_session BOOLEAN DEFAULT 0
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_id ON dmt_records(id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_report_number ON dmt_records(report_number)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_shop_order ON dmt_records(shop_order)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_part_num ON dmt_records(part_num)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_status ON dmt_records(status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_created_by ON dmt_records(created_by)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_assigned_to ON dmt_records(assigned_to)")
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity_type TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            user_id TEXT,
+            changes TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS report_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            next_number INTEGER NOT NULL DEFAULT 1000
+        )
+    """)
+    c.execute("INSERT OR IGNORE INTO report_counter (id, next_number) VALUES (1, 1000)")
+
+
+@migration(2, "Add workflow tracking columns to dmt_records")
+def _dmt_workflow_columns(conn):
+    added = add_column_if_missing(conn, "dmt_records", "workflow_status", "TEXT DEFAULT 'draft'")
+    add_column_if_missing(conn, "dmt_records", "supervisor_completed_at", "TIMESTAMP")
+    add_column_if_missing(conn, "dmt_records", "manager_completed_at", "TIMESTAMP")
+    add_column_if_missing(conn, "dmt_records", "engineer_completed_at", "TIMESTAMP")
+    if added:
+        print("Added workflow columns to dmt_records table")
+
+
+@migration(3, "Add employee_number to employees")
+def _employee_number(conn):
+    if add_column_if_missing(conn, "employees", "employee_number", "TEXT"):
+        print("Added employee_number column to employees table")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_number ON employees(employee_number)")
+
+
+@migration(4, "Add is_session flag to dmt_records")
+def _dmt_is_session(conn):
+    if add_column_if_missing(conn, "dmt_records", "is_session", "BOOLEAN DEFAULT 0"):
+        print("Added is_session column to dmt_records table")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_dmt_records_is_session ON dmt_records(is_session)")
+
+
+# Columns mirrored into the DMT full-text index
+DMT_FTS_COLUMNS = [
+    "report_number", "part_num", "shop_order", "serial_number",
+    "customer", "description", "analysis", "status",
+]
+
+
+def fts5_available(conn: sqlite3.Connection) -> bool:
+    """Whether this SQLite build ships the FTS5 extension"""
+    return bool(conn.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0])
+
+
+@migration(5, "Full-text search index over dmt_records (FTS5)")
+def _dmt_fts(conn):
+    if not fts5_available(conn):
+        print("SQLite was built without FTS5; DMT search will fall back to LIKE")
+        return
+
+    columns = ", ".join(DMT_FTS_COLUMNS)
+    new_values = ", ".join(f"new.{col}" for col in DMT_FTS_COLUMNS)
+    old_values = ", ".join(f"old.{col}" for col in DMT_FTS_COLUMNS)
+
+    # Keyed on report_number, not the rowid: dmt_records has a TEXT primary
+    # key, so its rowid is implicit and VACUUM may renumber it. report_number
+    # is a unique INTEGER that never changes once assigned; records without
+    # one (sessions not yet numbered) are left out of the index.
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS dmt_records_fts USING fts5(
+            {columns},
+            content='dmt_records',
+            content_rowid='report_number',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS dmt_records_fts_ai AFTER INSERT ON dmt_records
+        WHEN new.report_number IS NOT NULL BEGIN
+            INSERT INTO dmt_records_fts (rowid, {columns}) VALUES (new.report_number, {new_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS dmt_records_fts_ad AFTER DELETE ON dmt_records
+        WHEN old.report_number IS NOT NULL BEGIN
+            INSERT INTO dmt_records_fts (dmt_records_fts, rowid, {columns})
+            VALUES ('delete', old.report_number, {old_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS dmt_records_fts_au AFTER UPDATE OF {columns} ON dmt_records BEGIN
+            INSERT INTO dmt_records_fts (dmt_records_fts, rowid, {columns})
+            SELECT 'delete', old.report_number, {old_values} WHERE old.report_number IS NOT NULL;
+            INSERT INTO dmt_records_fts (rowid, {columns})
+            SELECT new.report_number, {new_values} WHERE new.report_number IS NOT NULL;
+        END
+    """)
+    # Backfill existing records
+    rebuild_dmt_fts(conn)
+
+
+@migration(6, "Trigger-maintained stats_counters for dashboards")
+def _stats_counters(conn):
+    create_counter_triggers(conn)
+    rebuild_counters(conn)
+
+
+@migration(7, "Report number gap log and counter resync")
+def _report_number_gaps(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_number_gaps (
+            number INTEGER PRIMARY KEY,
+            reason TEXT,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO report_counter (id, next_number) VALUES (1, 1000)")
+    # The old allocator could fall back to time-based numbers; never hand
+    # out a number at or below one that already exists
+    conn.execute("""
+        UPDATE report_counter
+        SET next_number = MAX(next_number, (SELECT IFNULL(MAX(report_number), 0) + 1 FROM dmt_records))
+        WHERE id = 1
+    """)
+
+
+@migration(8, "Case-insensitive name index on entity tables")
+def _entity_name_nocase(conn):
+    for entity in EntityType:
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{entity.value}_name_nocase "
+            f"ON {entity.value}(name COLLATE NOCASE)"
+        )
+
+
+@migration(9, "Background CSV import jobs")
+def _import_jobs(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id TEXT PRIMARY KEY,
+            entity TEXT NOT NULL,
+            filename TEXT,
+            file_path TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            rows_parsed INTEGER NOT NULL DEFAULT 0,
+            inserted INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            created_by TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_job_errors (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            row_number INTEGER,
+            name TEXT,
+            status TEXT,
+            message TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_import_job_errors_job ON import_job_errors(job_id, row_number)")
+
+
+# dmt_records columns that store an entity id, per entity table
+DMT_REFERENCE_COLUMNS: Dict[EntityType, List[str]] = {
+    EntityType.WORKCENTERS: ["work_center"],
+    EntityType.PARTNUMBERS: ["part_num"],
+    EntityType.CUSTOMERS: ["customer"],
+    EntityType.INSPECTION_ITEMS: ["inspection_item"],
+    EntityType.PREPARED_BY: ["prepared_by"],
+    EntityType.CAR_TYPES: ["car_type"],
+    EntityType.DISPOSITIONS: ["disposition"],
+    EntityType.FAILURE_CODES: ["failure_code"],
+    EntityType.EMPLOYEES: ["employee_name", "analysis_by", "engineer"],
+}
+
+
+def find_duplicate_names(conn: sqlite3.Connection, entity: EntityType) -> List[List[Dict]]:
+    """
+    Groups of active rows whose names differ only in ASCII case (SQLite's
+    NOCASE rules), oldest row first in each group
+    """
+    table = entity.value
+    rows = conn.execute(f"""
+        SELECT id, name, lower(name) AS name_key FROM {table}
+        WHERE is_active = 1 AND lower(name) IN (
+            SELECT lower(name) FROM {table} WHERE is_active = 1
+            GROUP BY lower(name) HAVING COUNT(*) > 1
+        )
+        ORDER BY name_key, created_at, rowid
+    """).fetchall()
+    groups: Dict[str, List[Dict]] = {}
+    for row in rows:
+        groups.setdefault(row[2], []).append({"id": row[0], "name": row[1]})
+    return list(groups.values())
+
+
+def merge_duplicate_names(conn: sqlite3.Connection, entity: EntityType) -> List[List[Dict]]:
+    """
+    Keep the oldest row of every duplicate group, point DMT records at it,
+    soft-delete the others and audit each merge. Returns the merged groups.
+    """
+    table = entity.value
+    groups = find_duplicate_names(conn, entity)
+    for group in groups:
+        survivor, losers = group[0], group[1:]
+        loser_ids = [row["id"] for row in losers]
+        marks = ", ".join("?" for _ in loser_ids)
+        if entity == EntityType.EMPLOYEES:
+            # Keep an employee number if only a duplicate had one
+            conn.execute(f"""
+                UPDATE {table} SET employee_number = (
+                    SELECT employee_number FROM {table}
+                    WHERE id IN (?, {marks}) AND employee_number IS NOT NULL AND employee_number != ''
+                    ORDER BY id = ? DESC LIMIT 1
+                )
+                WHERE id = ?
+            """, [survivor["id"], *loser_ids, survivor["id"], survivor["id"]])
+        for column in DMT_REFERENCE_COLUMNS.get(entity, []):
+            conn.execute(
+                f"UPDATE dmt_records SET {column} = ? WHERE {column} IN ({marks})",
+                [survivor["id"], *loser_ids],
+            )
+        conn.execute(
+            f"UPDATE {table} SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE id IN ({marks})",
+            loser_ids,
+        )
+        conn.executemany(
+            "INSERT INTO audit_log (entity_type, entity_id, action, changes) VALUES (?, ?, ?, ?)",
+            [
+                (table, loser["id"], "MERGE", json.dumps({"name": loser["name"], "merged_into": survivor["id"]}))
+                for loser in losers
+            ],
+        )
+    return groups
+
+
+@migration(10, "Unique case-insensitive names on entity tables (merges duplicates)")
+def _entity_name_unique(conn):
+    for entity in EntityType:
+        for group in merge_duplicate_names(conn, entity):
+            names = ", ".join(repr(row["name"]) for row in group)
+            print(f"Merged duplicate {entity.value}: {names} -> {group[0]['id']}")
+        # Only active rows must be unique, so a deleted name can be re-created
+        conn.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{entity.value}_name_unique "
+            f"ON {entity.value}(name COLLATE NOCASE) WHERE is_active = 1"
+        )
+        conn.execute(f"DROP INDEX IF EXISTS idx_{entity.value}_name_nocase")
+
+
+@migration(11, "Version table for cross-process cache invalidation")
+def _cache_versions(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.executemany(
+        "INSERT OR IGNORE INTO cache_versions (name, version) VALUES (?, 0)",
+        [("selectors",), ("users",)],
+    )
+
+
+# Partial indexes for the DMT visibility branches (see
+# DMTRepository.visibility_branches): each branch seeks one index on its
+# equality columns and reads it in report_number or created_at order.
+DMT_VISIBILITY_INDEXES = {
+    "idx_dmt_records_visible_number": "is_session, report_number",
+    "idx_dmt_records_creator_number": "created_by, is_session, report_number",
+    "idx_dmt_records_assignee_number": "assigned_to, is_session, report_number",
+    "idx_dmt_records_visible_created": "is_session, created_at",
+    "idx_dmt_records_creator_created": "created_by, is_session, created_at",
+    "idx_dmt_records_assignee_created": "assigned_to, is_session, created_at",
+}
+
+
+@migration(12, "Partial composite indexes for DMT visibility queries")
+def _dmt_visibility_indexes(conn):
+    for name, columns in DMT_VISIBILITY_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON dmt_records({columns}) WHERE is_active = 1")
+    # Superseded by the composites above
+    for name in ("idx_dmt_records_created_by", "idx_dmt_records_assigned_to", "idx_dmt_records_is_session"):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.execute("ANALYZE dmt_records")
+
+
+# audit_log access paths; SQLite appends the rowid (id) to every index, so
+# each one also serves the (timestamp, id) keyset order
+AUDIT_LOG_INDEXES = {
+    "idx_audit_log_timestamp": "timestamp",
+    "idx_audit_log_entity_type": "entity_type, timestamp",
+    "idx_audit_log_entity": "entity_type, entity_id, timestamp",
+    "idx_audit_log_user": "user_id, timestamp",
+    "idx_audit_log_action": "action, timestamp",
+}
+
+
+@migration(13, "Indexes for audit log filters and keyset pagination")
+def _audit_log_indexes(conn):
+    for name, columns in AUDIT_LOG_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON audit_log({columns})")
+
+
+@migration(14, "Field-level version history for DMT records")
+def _dmt_record_versions(conn):
+    # kind is 'snapshot' (data is the whole row) or 'delta' (changed columns only)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dmt_record_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dmt_id TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            data TEXT NOT NULL,
+            user_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (dmt_id, version)
+        )
+    """)
+
+
+@migration(15, "Server-side login sessions")
+def _user_sessions(conn):
+    # expires_at is a Unix timestamp; it slides forward while the session is used
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_expires_at ON user_sessions(expires_at)")
+
+
+def rebuild_dmt_fts(conn) -> int:
+    """
+    Re-index every numbered DMT record; returns how many were indexed.
+    FTS5's own 'rebuild' is not used: it would index records without a
+    report number under an arbitrary rowid.
+    """
+    columns = ", ".join(DMT_FTS_COLUMNS)
+    conn.execute("INSERT INTO dmt_records_fts (dmt_records_fts) VALUES ('delete-all')")
+    return conn.execute(f"""
+        INSERT INTO dmt_records_fts (rowid, {columns})
+        SELECT report_number, {columns} FROM dmt_records WHERE report_number IS NOT NULL
+    """).rowcount
@@ -0,0 +1,218 @@
+"""
+Bounded, thread-safe SQLite connection pool
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class PooledConnection:
+    """
+    Proxy around a sqlite3 connection checked out from a ConnectionPool.
+
+    Behaves like the underlying connection, except that close() returns the
+    connection to the pool instead of closing it, so existing callers that
+    do `conn = db.get_connection() ... conn.close()` keep working unchanged.
+
+    after_commit() registers work that must only happen once the current
+    transaction is durable: it runs after the next successful commit() and
+    is dropped by rollback() or close().
+    """
+
+    __slots__ = ("_conn", "_pool", "_released", "_after_commit")
+
+    def __init__(self, conn: sqlite3.Connection, pool: "ConnectionPool"):
+        self._conn = conn
+        self._pool = pool
+        self._released = False
+        self._after_commit: List[Callable[[], None]] = []
+
+    @property
+    def raw(self) -> sqlite3.Connection:
+        """The underlying sqlite3 connection"""
+        if self._released:
+            raise sqlite3.ProgrammingError("Cannot operate on a connection returned to the pool")
+        return self._conn
+
+    def __getattr__(self, name):
+        if name in PooledConnection.__slots__:
+            raise AttributeError(name)
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        if name in PooledConnection.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.raw, name, value)
+
+    def after_commit(self, callback: Callable[[], None]):
+        """Run callback after the current transaction commits (dropped on rollback)"""
+        self._after_commit.append(callback)
+
+    def commit(self):
+        self.raw.commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                # The transaction is already committed; don't report it as failed
+                print(f"After-commit callback failed: {e}")
+
+    def rollback(self):
+        self._after_commit = []
+        self.raw.rollback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Mirror sqlite3.Connection: commit on success, roll back on error
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def close(self):
+        """Return the connection to the pool (uncommitted work is rolled back)"""
+        if not self._released:
+            self._released = True
+            self._after_commit = []
+            self._pool.release(self._conn)
+
+    def __del__(self):
+        # Safety net for callers that forget to close on an error path
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Fixed-capacity pool of configured sqlite3 connections"""
+
+    def __init__(
+        self,
+        factory: Callable[[], sqlite3.Connection],
+        max_size: int = 10,
+        timeout: float = 30.0,
+    ):
+        self._factory = factory
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self._idle: List[sqlite3.Connection] = []
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._pid = os.getpid()
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "creations": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "discarded": 0,
+        }
+
+    def _check_fork(self):
+        """Forget connections inherited from a parent process after a fork"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._size = 0
+            self._cond = threading.Condition(threading.Lock())
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Check out a connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        timeout = self.timeout if timeout is None else timeout
+        self._check_fork()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            waited = False
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {timeout:.1f}s waiting for a database connection "
+                        f"(pool size {self.max_size})"
+                    )
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                self._cond.wait(remaining)
+
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                # Reserve the slot before connecting so we never exceed max_size
+                self._size += 1
+                conn = None
+            self._stats["checkouts"] += 1
+
+        if conn is None:
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["creations"] += 1
+
+        return PooledConnection(conn, self)
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding it if it is unusable"""
+        healthy = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            healthy = False
+
+        with self._cond:
+            if healthy and not self._closed and self._pid == os.getpid():
+                self._idle.append(conn)
+            else:
+                self._size = max(0, self._size - 1)
+                self._stats["discarded"] += 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._cond.notify()
+
+    def close_all(self):
+        """Close idle connections and stop handing out new ones"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                **self._stats,
+            }
@@ -0,0 +1,151 @@
+"""
+Atomic report number allocation
+
+Report numbers come from the single report_counter row. In the default mode
+a number is taken with UPDATE ... RETURNING on the caller's connection, so
+the increment commits or rolls back together with the DMT insert and two
+writers can never receive the same number.
+
+With Config.REPORT_NUMBER_BLOCK_SIZE > 1 each process reserves a block of
+numbers in one short transaction and hands them out from memory. Numbers
+that are reserved but never used (a failed insert, or the rest of the block
+at shutdown) are recorded in report_number_gaps so the sequence stays
+auditable.
+"""
+import os
+import sqlite3
+import threading
+from typing import Optional
+from config import Config
+from .connection import get_db
+
+
+class ReportNumberAllocator:
+    """Hands out unique report numbers, optionally from per-process blocks"""
+
+    def __init__(self, db, block_size: int = 1):
+        self.db = db
+        self.block_size = max(1, int(block_size))
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._next: Optional[int] = None
+        self._end: Optional[int] = None  # exclusive
+
+    @property
+    def uses_blocks(self) -> bool:
+        return self.block_size > 1
+
+    def allocate(self, conn: sqlite3.Connection) -> int:
+        """
+        Next report number. In single mode the counter is bumped inside the
+        caller's (open or implicitly started) transaction on conn; in block
+        mode the number comes from the process's block, and a new block is
+        reserved through conn when no transaction is open on it yet.
+        """
+        if not self.uses_blocks:
+            row = conn.execute(
+                "UPDATE report_counter SET next_number = next_number + 1 "
+                "WHERE id = 1 RETURNING next_number - 1"
+            ).fetchone()
+            if row is None:
+                raise RuntimeError("report_counter is not initialised")
+            return row[0]
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked child must not reuse the parent's block
+                self._pid = os.getpid()
+                self._next = self._end = None
+            if self._next is None or self._next >= self._end:
+                self._next, self._end = self._reserve_block(conn)
+            number = self._next
+            self._next += 1
+            return number
+
+    def _reserve_block(self, conn=None):
+        """
+        Reserve block_size numbers in a transaction of its own. It runs on
+        conn when conn has no open transaction (the reservation must not
+        roll back with the caller's insert), otherwise on a pooled one.
+        """
+        own_conn = conn is None or conn.in_transaction
+        if own_conn:
+            conn = self.db.get_connection()
+        try:
+            end = conn.execute(
+                "UPDATE report_counter SET next_number = next_number + ? "
+                "WHERE id = 1 RETURNING next_number",
+                (self.block_size,),
+            ).fetchone()[0]
+            conn.commit()
+            return end - self.block_size, end
+        finally:
+            if own_conn:
+                conn.close()
+
+    def discard(self, number: int, reason: str = "insert failed", conn=None):
+        """
+        Give up a number whose insert did not commit. Only block mode can
+        lose numbers (single mode rolls the counter back with the insert).
+        conn, if given, must have no open transaction.
+        """
+        if self.uses_blocks:
+            self.record_gaps([number], reason, conn)
+
+    def record_gaps(self, numbers, reason: str, conn=None):
+        """Store numbers that were allocated but will never be used (on conn if given)"""
+        numbers = list(numbers)
+        if not numbers:
+            return
+        own_conn = conn is None
+        if own_conn:
+            conn = self.db.get_connection()
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO report_number_gaps (number, reason) VALUES (?, ?)",
+                [(n, reason) for n in numbers],
+            )
+            conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+
+    def release(self):
+        """
+        Hand back the unused part of this process's block (at shutdown).
+        If no other process reserved after us the counter is simply rewound,
+        otherwise the leftovers are recorded as gaps.
+        """
+        with self._lock:
+            if self._next is None or self._pid != os.getpid():
+                return
+            start, end = self._next, self._end
+            self._next = self._end = None
+        if start >= end:
+            return
+
+        conn = self.db.get_connection()
+        try:
+            rewound = conn.execute(
+                "UPDATE report_counter SET next_number = ? WHERE id = 1 AND next_number = ?",
+                (start, end),
+            ).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        if not rewound:
+            self.record_gaps(range(start, end), "unused block released")
+
+
+_allocator: Optional[ReportNumberAllocator] = None
+_allocator_lock = threading.Lock()
+
+
+def get_report_number_allocator() -> ReportNumberAllocator:
+    """Get the global report number allocator"""
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = ReportNumberAllocator(get_db(), Config.REPORT_NUMBER_BLOCK_SIZE)
+    return _allocator
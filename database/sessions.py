@@ -0,0 +1,206 @@
+"""
+Server-side login sessions
+
+Session data lives in the user_sessions table, so every worker process
+sees the same sessions; the cookie only carries the session id, signed
+with Config.SECRET_KEY (see auth/session_middleware.py).
+
+Expiry slides: a session expires Config.SESSION_MAX_AGE seconds after it
+was last used. To avoid a write per request, the expiry is only pushed
+forward once it is more than SESSION_TOUCH_INTERVAL seconds old.
+
+Recently used sessions are kept in an in-process LRU, so most requests
+resolve their session without a database round trip. A cached entry is
+trusted for SESSION_CACHE_SECONDS; a session ended in another worker can
+therefore still be seen here for up to that long. Expired rows are
+deleted by a background purge thread (start_purger()).
+"""
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config import Config
+from .connection import get_db
+
+
+class SessionStore:
+    """SQLite-backed session store with an in-process LRU in front"""
+
+    def __init__(
+        self,
+        db,
+        max_age: int = 86400,
+        touch_interval: int = 300,
+        cache_size: int = 10000,
+        cache_seconds: float = 5.0,
+    ):
+        self.db = db
+        self.max_age = max_age
+        self.touch_interval = touch_interval
+        self.cache_size = cache_size
+        self.cache_seconds = cache_seconds
+        self._lock = threading.Lock()
+        # session id -> (data, expires_at, cached_at)
+        self._cache: "OrderedDict[str, Tuple[Dict, float, float]]" = OrderedDict()
+        self._stop = threading.Event()
+        self._purger: Optional[threading.Thread] = None
+
+    @staticmethod
+    def new_id() -> str:
+        return secrets.token_urlsafe(32)
+
+    # ------------------------------------------------------------------
+    # In-process cache
+    # ------------------------------------------------------------------
+
+    def _remember(self, session_id: str, data: Dict, expires_at: float):
+        with self._lock:
+            self._cache[session_id] = (data, expires_at, time.monotonic())
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, session_id: str):
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+    def peek(self, session_id: str) -> Optional[Dict]:
+        """The session from the in-process cache only (never blocks), or None"""
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is None:
+                return None
+            data, expires_at, cached_at = entry
+            if expires_at <= time.time() or time.monotonic() - cached_at > self.cache_seconds:
+                del self._cache[session_id]
+                return None
+            self._cache.move_to_end(session_id)
+            return dict(data)
+
+    def needs_touch(self, session_id: str) -> bool:
+        """Whether the session's expiry is due to be pushed forward"""
+        with self._lock:
+            entry = self._cache.get(session_id)
+        if entry is None:
+            return True
+        return entry[1] - time.time() < self.max_age - self.touch_interval
+
+    # ------------------------------------------------------------------
+    # Storage (blocking)
+    # ------------------------------------------------------------------
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        """The session's data, or None if it does not exist or has expired"""
+        conn = self.db.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT data, expires_at FROM user_sessions WHERE id = ? AND expires_at > ?",
+                (session_id, time.time()),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            self._forget(session_id)
+            return None
+        data = json.loads(row["data"])
+        self._remember(session_id, data, row["expires_at"])
+        return dict(data)
+
+    def save(self, session_id: str, data: Dict):
+        """Store the session's data and restart its expiry"""
+        expires_at = time.time() + self.max_age
+        conn = self.db.get_connection()
+        try:
+            conn.execute(
+                """
+                INSERT INTO user_sessions (id, data, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at
+                """,
+                (session_id, json.dumps(data, separators=(",", ":"), default=str), expires_at),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        self._remember(session_id, dict(data), expires_at)
+
+    def touch(self, session_id: str):
+        """Push the session's expiry forward (sliding expiry)"""
+        expires_at = time.time() + self.max_age
+        conn = self.db.get_connection()
+        try:
+            conn.execute("UPDATE user_sessions SET expires_at = ? WHERE id = ?", (expires_at, session_id))
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is not None:
+                self._cache[session_id] = (entry[0], expires_at, entry[2])
+
+    def delete(self, session_id: str):
+        self._forget(session_id)
+        conn = self.db.get_connection()
+        try:
+            conn.execute("DELETE FROM user_sessions WHERE id = ?", (session_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def purge_expired(self) -> int:
+        """Delete expired sessions; returns how many were removed"""
+        conn = self.db.get_connection()
+        try:
+            removed = conn.execute("DELETE FROM user_sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+            conn.commit()
+            return removed
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Background purge
+    # ------------------------------------------------------------------
+
+    def start_purger(self, interval: float):
+        """Purge expired sessions every interval seconds until shutdown()"""
+        if interval <= 0 or (self._purger is not None and self._purger.is_alive()):
+            return
+        self._stop.clear()
+        self._purger = threading.Thread(target=self._purge_loop, args=(interval,), name="session-purge", daemon=True)
+        self._purger.start()
+
+    def _purge_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                removed = self.purge_expired()
+                if removed:
+                    print(f"Purged {removed} expired session(s)")
+            except sqlite3.Error as e:
+                print(f"Session purge failed: {e}")
+
+    def shutdown(self):
+        self._stop.set()
+        if self._purger is not None:
+            self._purger.join(timeout=5)
+
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Get the global session store"""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore(
+                    get_db(),
+                    max_age=Config.SESSION_MAX_AGE,
+                    touch_interval=Config.SESSION_TOUCH_INTERVAL,
+                    cache_size=Config.SESSION_CACHE_SIZE,
+                    cache_seconds=Config.SESSION_CACHE_SECONDS,
+                )
+    return _session_store
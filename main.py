@@ -3,13 +3,13 @@ from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
-from starlette.middleware.sessions import SessionMiddleware
 from config import Config
 from app import api_router
 from auth.routes import router as auth_router
 from auth.auth import create_default_admin, get_current_user
-from database.connection import get_db
-import secrets
+from auth.session_middleware import ServerSessionMiddleware
+from database import get_db, get_async_db, get_report_number_allocator, get_audit_writer, get_session_store
+from services import get_import_jobs, get_dashboard_stats
 
 templates = Jinja2Templates(directory="jinja_templates")
 
@@ -21,20 +21,48 @@ async def lifespan(app: FastAPI):
         print("🚀 Starting Quality Management System...")
         print(f"📊 Database: {Config.DATABASE_PATH}")
         print(f"📄 Page Size: {Config.PAGE_SIZE}")
+        print(f"⚙️  PRAGMA profile: {Config.DB_PRAGMA_PROFILE}")
+        Config.validate()
         create_default_admin()
+        get_session_store().start_purger(Config.SESSION_PURGE_INTERVAL)
+        resumed = get_import_jobs().resume_pending()
+        if resumed:
+            print(f"📥 Resumed {resumed} queued import job(s)")
         yield
     except Exception as e:
         print(f"❌ Error during startup: {e}")
         raise
     finally:
         print("👋 Shutting down...")
+        get_import_jobs().shutdown()
+        get_session_store().shutdown()
+        get_async_db().shutdown()
+        audit = get_audit_writer()
+        if not audit.shutdown():
+            print(f"⚠️  Warning: audit queue not fully flushed: {audit.stats()}")
+        get_report_number_allocator().release()
+        db = get_db()
+        try:
+            busy, wal_pages, checkpointed = db.checkpoint()
+            print(f"💾 WAL checkpoint: {checkpointed}/{wal_pages} pages{' (busy)' if busy else ''}")
+        except Exception as e:
+            print(f"⚠️  Warning: WAL checkpoint failed: {e}")
+        db.close()
 
 
 # Initialize FastAPI application
 app = FastAPI(title=Config.APP_TITLE,
               version=Config.APP_VERSION, lifespan=lifespan)
 
-app.add_middleware(SessionMiddleware, secret_key=secrets.token_urlsafe(32))
+# Sessions are stored server-side and the cookie is signed with the configured
+# SECRET_KEY, so they work across processes (uvicorn --workers N)
+app.add_middleware(
+    ServerSessionMiddleware,
+    secret_key=Config.SECRET_KEY,
+    cookie_name=Config.SESSION_COOKIE_NAME,
+    max_age=Config.SESSION_MAX_AGE,
+    https_only=Config.SESSION_HTTPS_ONLY,
+)
 
 try:
     app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -60,85 +88,7 @@ async def root(request: Request):
         if not user:
             return RedirectResponse(url="/auth/login", status_code=302)
 
-        # Get dashboard statistics
-        db = get_db()
-        conn = db.get_connection()
-        c = conn.cursor()
-
-        stats = {}
-
-        if user["role"] == "Admin":
-            # Admin dashboard statistics
-            stats["total_users"] = c.execute(
-                "SELECT COUNT(*) FROM users" 
-            ).fetchone()[0]
-            stats["total_reports"] = c.execute(
-                "SELECT COUNT(*) FROM dmt_records WHERE is_active = 1"
-            ).fetchone()[0]
-            stats["open_reports"] = c.execute(
-                "SELECT COUNT(*) FROM dmt_records WHERE status = 'open' AND is_active = 1"
-            ).fetchone()[0]
-            stats["recent_audits"] = c.execute(
-                "SELECT COUNT(*) FROM audit_log WHERE date(timestamp) = date('now')"
-            ).fetchone()[0]
-
-            # Recent activity
-            stats["recent_reports"] = c.execute("""
-                SELECT report_number, part_num, status, created_at, created_by
-                FROM dmt_records 
-                WHERE is_active = 1
-                ORDER BY created_at DESC 
-                LIMIT 5
-            """).fetchall()
-
-            stats["recent_users"] = c.execute("""
-                SELECT username, role, created_at
-                FROM users 
-                WHERE is_active = 1
-                ORDER BY created_at DESC 
-                LIMIT 5
-            """).fetchall()
-        else:
-            # User dashboard statistics
-            stats["my_reports"] = c.execute(
-                """
-                SELECT COUNT(*) FROM dmt_records 
-                WHERE (created_by = ? OR assigned_to = ?) AND is_active = 1
-            """,
-                (user["username"], user["username"]),
-            ).fetchone()[0]
-
-            stats["my_open_reports"] = c.execute(
-                """
-                SELECT COUNT(*) FROM dmt_records 
-                WHERE (created_by = ? OR assigned_to = ?) 
-                AND status = 'open' AND is_active = 1
-            """,
-                (user["username"], user["username"]),
-            ).fetchone()[0]
-
-            stats["my_closed_reports"] = c.execute(
-                """
-                SELECT COUNT(*) FROM dmt_records 
-                WHERE (created_by = ? OR assigned_to = ?) 
-                AND status = 'closed' AND is_active = 1
-            """,
-                (user["username"], user["username"]),
-            ).fetchone()[0]
-
-            # Recent reports
-            stats["recent_reports"] = c.execute(
-                """
-                SELECT report_number, part_num, status, created_at, assigned_to
-                FROM dmt_records 
-                WHERE (created_by = ? OR assigned_to = ?) AND is_active = 1
-                ORDER BY created_at DESC 
-                LIMIT 5
-            """,
-                (user["username"], user["username"]),
-            ).fetchall()
-
-        conn.close()
+        stats = await get_async_db().run_read(get_dashboard_stats().get_stats, user)
 
         return templates.TemplateResponse(
             "base.html", {"request": request, "user": user, "stats": stats}
@@ -2,5 +2,9 @@
 Repository package initialization
 """
 from .base_repository import Repository
+from .dmt_repository import DMTRepository, DMTRow, DMTListItem, DMTSearchItem, DMTCard
+from .audit_repository import AuditRepository
+from .dmt_history import DMTHistory
 
-__all__ = ["Repository"]
+__all__ = ["Repository", "DMTRepository", "DMTRow", "DMTListItem", "DMTSearchItem", "DMTCard", "AuditRepository",
+           "DMTHistory"]
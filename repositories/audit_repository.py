@@ -0,0 +1,178 @@
+"""
+Repository for audit log queries
+
+Audit entries are listed newest first with keyset pagination on
+(timestamp, id), so every page is an index range scan (see migration 13)
+no matter how deep it is or how large audit_log grows. Timestamps are UTC
+in SQLite's CURRENT_TIMESTAMP format, which sorts and compares as text.
+
+Months before the current one may have been rolled into archive files
+(database/audit_archive.py). list_page routes each page: it reads the main
+database first and attaches archive months only when the page reaches back
+into them, newest first, a few files at a time.
+"""
+import base64
+import json
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from database import get_db
+from database.audit_archive import get_audit_archive, month_start, month_end
+
+# Entries written today (UTC), as a range the timestamp index can serve
+TODAY_CLAUSE = "timestamp >= date('now') AND timestamp < date('now', '+1 day')"
+
+# Equality filters accepted by list_page
+FILTER_COLUMNS = ("entity_type", "entity_id", "user_id", "action")
+
+
+def encode_audit_cursor(timestamp: str, entry_id: int) -> str:
+    raw = json.dumps({"t": timestamp, "i": entry_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_audit_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """(timestamp, id) from encode_audit_cursor; None if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(payload.get("t"), str) or not isinstance(payload.get("i"), int):
+            return None
+        return payload["t"], payload["i"]
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def parse_bound(value: str, end: bool = False) -> Optional[str]:
+    """
+    A date ('2024-05-01') or date-time ('2024-05-01T13:30') from a filter
+    form as a timestamp bound. An end date covers that whole day.
+    None if the value is empty or not a date.
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            day = date.fromisoformat(value)
+            if end:
+                day += timedelta(days=1)
+            return day.isoformat()
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+class AuditRepository:
+    """Read access to the audit log"""
+
+    def __init__(self):
+        self.db = get_db()
+
+    @staticmethod
+    def filter_clause(filters: Dict[str, str]) -> Tuple[str, List]:
+        """
+        WHERE clause for the equality filters (entity_type, entity_id,
+        user_id, action) and the since/until time range; empty values are
+        ignored. until is exclusive.
+        """
+        clauses, params = [], []
+        for column in FILTER_COLUMNS:
+            value = (filters.get(column) or "").strip()
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        since = parse_bound(filters.get("since"))
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        until = parse_bound(filters.get("until"), end=True)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        return (" AND ".join(clauses) or "1 = 1"), params
+
+    def list_page(self, filters: Optional[Dict[str, str]] = None, cursor: Optional[str] = None,
+                  page_size: Optional[int] = None) -> Dict:
+        """
+        One page of entries matching filters, newest first.
+        Returns a dict with logs and next_cursor (None on the last page).
+        """
+        page_size = min(page_size or Config.AUDIT_PAGE_SIZE, Config.MAX_PAGE_SIZE)
+        filters = filters or {}
+        where, params = self.filter_clause(filters)
+        position = decode_audit_cursor(cursor) if cursor else None
+        if position:
+            where += " AND (timestamp, id) < (?, ?)"
+            params += list(position)
+
+        # Newest timestamp the page can contain (exclusive)
+        upper = parse_bound(filters.get("until"), end=True)
+        if position and (upper is None or position[0] < upper):
+            upper = position[0]
+        rows = self._fetch_routed(where, params, page_size + 1, parse_bound(filters.get("since")), upper)
+
+        logs = [dict(row) for row in rows[:page_size]]
+        next_cursor = None
+        if len(rows) > page_size:
+            next_cursor = encode_audit_cursor(logs[-1]["timestamp"], logs[-1]["id"])
+        return {"logs": logs, "next_cursor": next_cursor}
+
+    def _fetch_routed(self, where: str, params: List, limit: int,
+                      since: Optional[str], upper: Optional[str]) -> List:
+        """
+        Up to limit rows matching where, newest first, across the main
+        database and the archive months overlapping [since, upper).
+
+        The partitions are read as consecutive time windows: main alone for
+        everything newer than the newest archived month, then main plus up
+        to AUDIT_MAX_ATTACHED archive months per window, going back in time.
+        Main takes part in every window because entries can reach it late
+        (e.g. from the async audit queue). The windows do not overlap, so
+        the results simply concatenate, and reading stops once the page is
+        full.
+        """
+        archive = get_audit_archive()
+        months = [
+            month for month in reversed(archive.months())
+            if (since is None or month_end(month) > since) and (upper is None or month_start(month) < upper)
+        ]
+        groups = [[]] + [months[i:i + archive.max_attached] for i in range(0, len(months), archive.max_attached)]
+
+        rows: List = []
+        window_upper = None
+        conn = self.db.get_connection()
+        try:
+            for index, group in enumerate(groups):
+                if index == len(groups) - 1:
+                    window_lower = None
+                elif group:
+                    window_lower = month_start(group[-1])
+                else:
+                    window_lower = month_end(months[0])
+                window_sql, window_params = "", []
+                if window_lower is not None:
+                    window_sql += " AND timestamp >= ?"
+                    window_params.append(window_lower)
+                if window_upper is not None:
+                    window_sql += " AND timestamp < ?"
+                    window_params.append(window_upper)
+                window_upper = window_lower
+
+                with archive.attached(conn, group) if group else nullcontext("audit_log") as source:
+                    rows += conn.execute(
+                        f"SELECT * FROM {source} WHERE {where}{window_sql} "
+                        "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                        params + window_params + [limit - len(rows)],
+                    ).fetchall()
+                if len(rows) >= limit:
+                    break
+        finally:
+            conn.close()
+        return rows
+
+    @staticmethod
+    def count_today(conn) -> int:
+        """Entries written today (UTC)"""
+        return conn.execute(f"SELECT COUNT(*) FROM audit_log WHERE {TODAY_CLAUSE}").fetchone()[0]
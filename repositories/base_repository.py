@@ -2,11 +2,33 @@
 Base repository for CRUD operations
 """
 import json
+import sqlite3
 import uuid
-from typing import Optional, Tuple, List, Dict
+from typing import Optional, Tuple, List, Dict, Iterator
 from datetime import datetime, timedelta
 from config import Config, EntityType
 from database import get_db
+from database.audit import get_audit_writer
+from database.cache import get_cache, SELECTORS
+
+
+_ASCII_LOWER = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"
+)
+
+
+def nocase_key(name: str) -> str:
+    """Comparison key matching SQLite's NOCASE collation (ASCII-only folding)"""
+    return name.translate(_ASCII_LOWER)
+
+
+def _new_id(used: set) -> str:
+    """Short item id, unique within the set of ids already handed out"""
+    while True:
+        item_id = str(uuid.uuid4())[:8]
+        if item_id not in used:
+            used.add(item_id)
+            return item_id
 
 
 class Repository:
@@ -27,17 +49,8 @@ class Repository:
         conn = self.db.get_connection()
         c = conn.cursor()
 
-        query = f"SELECT * FROM {self.table} WHERE is_active = 1"
-        params = []
-
-        if days:
-            date_filter = datetime.now() - timedelta(days=days)
-            query += " AND created_at >= ?"
-            params.append(date_filter)
-
-        if search:
-            query += " AND name LIKE ?"
-            params.append(f"%{search}%")
+        where, params = self._filter_clause(days, search)
+        query = f"SELECT * FROM {self.table} WHERE {where}"
 
         # Get total count
         count_query = query.replace("SELECT *", "SELECT COUNT(*)")
@@ -54,6 +67,51 @@ class Repository:
 
         return items, total
 
+    @staticmethod
+    def _filter_clause(days: Optional[int] = None, search: Optional[str] = None) -> Tuple[str, List]:
+        """WHERE clause (without the WHERE) shared by get_all and iter_all"""
+        where = "is_active = 1"
+        params = []
+
+        if days:
+            date_filter = datetime.now() - timedelta(days=days)
+            where += " AND created_at >= ?"
+            params.append(date_filter)
+
+        if search:
+            where += " AND name LIKE ?"
+            params.append(f"%{search}%")
+
+        return where, params
+
+    def iter_all(
+        self,
+        days: Optional[int] = None,
+        search: Optional[str] = None,
+        batch_size: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """
+        Yield every matching item, newest first, from a single query.
+        Rows are fetched batch_size at a time on one connection, which is
+        returned to the pool when the generator is exhausted or closed.
+        """
+        batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+        where, params = self._filter_clause(days, search)
+
+        conn = self.db.get_connection()
+        try:
+            c = conn.execute(
+                f"SELECT * FROM {self.table} WHERE {where} ORDER BY created_at DESC", params
+            )
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
     def get_by_id(self, item_id: str) -> Optional[Dict]:
         """Get a single item by ID"""
         conn = self.db.get_connection()
@@ -67,40 +125,235 @@ class Repository:
         return dict(row) if row else None
 
     def create(self, name: str, employee_number: Optional[str] = None) -> Dict:
-        """Create a new item"""
+        """
+        Create a new item.
+        Raises sqlite3.IntegrityError if an active item already has the
+        name (case-insensitive unique index).
+        """
         conn = self.db.get_connection()
         c = conn.cursor()
 
         item_id = str(uuid.uuid4())[:8]
         
-        if self.entity_type == EntityType.EMPLOYEES and employee_number:
-            c.execute(
-                f"INSERT INTO {self.table} (id, name, employee_number) VALUES (?, ?, ?)", 
-                (item_id, name, employee_number)
-            )
-            changes = {"name": name, "employee_number": employee_number}
-        else:
-            c.execute(
-                f"INSERT INTO {self.table} (id, name) VALUES (?, ?)", 
-                (item_id, name)
-            )
-            changes = {"name": name}
+        try:
+            if self.entity_type == EntityType.EMPLOYEES and employee_number:
+                c.execute(
+                    f"INSERT INTO {self.table} (id, name, employee_number) VALUES (?, ?, ?)", 
+                    (item_id, name, employee_number)
+                )
+                changes = {"name": name, "employee_number": employee_number}
+            else:
+                c.execute(
+                    f"INSERT INTO {self.table} (id, name) VALUES (?, ?)", 
+                    (item_id, name)
+                )
+                changes = {"name": name}
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            conn.close()
+            raise
         
         # Log the creation
-        c.execute(
-            "INSERT INTO audit_log (entity_type, entity_id, action, changes) VALUES (?, ?, ?, ?)",
-            (self.entity_type.value, item_id, "CREATE", json.dumps(changes)),
-        )
+        get_audit_writer().record(conn, self.entity_type.value, item_id, "CREATE", changes=json.dumps(changes))
 
         conn.commit()
         c.execute(f"SELECT * FROM {self.table} WHERE id = ?", (item_id,))
         new_item = dict(c.fetchone())
         conn.close()
+        get_cache().invalidate(SELECTORS)
 
         return new_item
 
+    def _upsert_sql(self) -> str:
+        """
+        INSERT that resolves a clash with an active item's name (the unique
+        NOCASE index from migration 10) by updating that item instead. For
+        employees a given employee_number is applied to the existing row;
+        other entities have nothing to update, so the row is left as is.
+        """
+        conflict = "ON CONFLICT (name COLLATE NOCASE) WHERE is_active = 1"
+        if self.entity_type == EntityType.EMPLOYEES:
+            return (
+                f"INSERT INTO {self.table} (id, name, employee_number) VALUES (?, ?, ?) {conflict} "
+                "DO UPDATE SET employee_number = COALESCE(excluded.employee_number, employee_number)"
+            )
+        return f"INSERT INTO {self.table} (id, name) VALUES (?, ?) {conflict} DO UPDATE SET name = name"
+
+    def _upsert_params(self, item_id: str, name: str, employee_number: Optional[str] = None) -> Tuple:
+        if self.entity_type == EntityType.EMPLOYEES:
+            return (item_id, name, employee_number)
+        return (item_id, name)
+
+    def upsert(self, name: str, employee_number: Optional[str] = None) -> Tuple[Dict, bool]:
+        """
+        Insert an item, or update the active item that already has this
+        name (case-insensitive) in one INSERT ... ON CONFLICT statement.
+        Returns (item, created).
+        """
+        conn = self.db.get_connection()
+        c = conn.cursor()
+
+        item_id = str(uuid.uuid4())[:8]
+        c.execute(self._upsert_sql() + " RETURNING id", self._upsert_params(item_id, name, employee_number))
+        stored_id = c.fetchone()[0]
+        created = stored_id == item_id
+
+        if created:
+            changes = {"name": name}
+            if employee_number is not None:
+                changes["employee_number"] = employee_number
+            get_audit_writer().record(conn, self.entity_type.value, item_id, "CREATE", changes=json.dumps(changes))
+        elif self.entity_type == EntityType.EMPLOYEES and employee_number is not None:
+            get_audit_writer().record(
+                conn, self.entity_type.value, stored_id, "UPDATE",
+                changes=json.dumps({"employee_number": employee_number}),
+            )
+
+        conn.commit()
+        c.execute(f"SELECT * FROM {self.table} WHERE id = ?", (stored_id,))
+        item = dict(c.fetchone())
+        conn.close()
+        if created or employee_number is not None:
+            get_cache().invalidate(SELECTORS)
+
+        return item, created
+
+    def bulk_create(self, items: List[Dict]) -> List[Dict]:
+        """
+        Upsert many items in one transaction. Names that repeat earlier in
+        the batch are skipped; names that already exist (case-insensitive,
+        active items only) are resolved by the upsert's conflict clause
+        against the unique NOCASE name index and reported as duplicates.
+        Rows and their audit entries are written with executemany.
+
+        If the batch insert fails it is retried row by row, each row in its
+        own savepoint, so only the rows that fail are reported as errors.
+
+        Each item is a dict with name (and employee_number for employees)
+        and an optional row number. Returns one result per item, in order:
+        {"row", "name", "status": created|duplicate|error, "id", "message"}.
+        """
+        results = [
+            {"row": item.get("row", pos + 1), "name": item["name"], "status": None, "id": None, "message": ""}
+            for pos, item in enumerate(items)
+        ]
+
+        # Duplicates inside the batch: the first occurrence wins
+        first_seen = {}
+        candidates = []
+        for pos, item in enumerate(items):
+            key = nocase_key(item["name"])
+            if key in first_seen:
+                results[pos]["status"] = "duplicate"
+                results[pos]["message"] = f"Same name as row {results[first_seen[key]]['row']}"
+                continue
+            first_seen[key] = pos
+            candidates.append(pos)
+
+        with_number = self.entity_type == EntityType.EMPLOYEES
+        created = []
+        updated = False
+        conn = self.db.get_connection()
+        c = conn.cursor()
+        try:
+            c.execute("DROP TABLE IF EXISTS temp.bulk_import")
+            c.execute("CREATE TEMP TABLE bulk_import (pos INTEGER PRIMARY KEY, id TEXT, name TEXT)")
+            used_ids = set()
+            c.executemany(
+                "INSERT INTO temp.bulk_import (pos, id, name) VALUES (?, ?, ?)",
+                [(pos, _new_id(used_ids), items[pos]["name"]) for pos in candidates],
+            )
+
+            # Short ids can clash with existing rows; redraw until none do
+            while True:
+                clashes = c.execute(
+                    f"SELECT pos FROM temp.bulk_import WHERE id IN (SELECT id FROM {self.table})"
+                ).fetchall()
+                if not clashes:
+                    break
+                c.executemany(
+                    "UPDATE temp.bulk_import SET id = ? WHERE pos = ?",
+                    [(_new_id(used_ids), pos) for (pos,) in clashes],
+                )
+
+            pending = c.execute("SELECT pos, id FROM temp.bulk_import ORDER BY pos").fetchall()
+            upsert_sql = self._upsert_sql()
+            rows = [
+                self._upsert_params(item_id, items[pos]["name"], items[pos].get("employee_number"))
+                for pos, item_id in pending
+            ]
+            c.execute("SAVEPOINT bulk_rows")
+            try:
+                c.executemany(upsert_sql, rows)
+                c.execute("RELEASE bulk_rows")
+            except sqlite3.Error:
+                # Undo the partial batch and retry row by row, so only the
+                # rows that fail are reported as errors
+                c.execute("ROLLBACK TO bulk_rows")
+                c.execute("RELEASE bulk_rows")
+                for (pos, _), row in zip(pending, rows):
+                    c.execute("SAVEPOINT bulk_row")
+                    try:
+                        c.execute(upsert_sql, row)
+                    except sqlite3.Error as e:
+                        c.execute("ROLLBACK TO bulk_row")
+                        results[pos]["status"] = "error"
+                        results[pos]["message"] = str(e)
+                    c.execute("RELEASE bulk_row")
+
+            # Each name now has one active row: the one just inserted (its id
+            # is ours) or the existing item the conflict clause resolved to
+            audits = []
+            for pos, new_id, item_id in c.execute(f"""
+                SELECT b.pos, b.id, t.id FROM temp.bulk_import b
+                JOIN {self.table} t ON t.name = b.name COLLATE NOCASE AND t.is_active = 1
+                ORDER BY b.pos
+            """).fetchall():
+                if results[pos]["status"] is not None:
+                    continue
+                item = items[pos]
+                if item_id == new_id:
+                    created.append((pos, item_id))
+                    changes = {"name": item["name"]}
+                    if with_number:
+                        changes["employee_number"] = item.get("employee_number")
+                    audits.append((self.entity_type.value, item_id, "CREATE", None, json.dumps(changes)))
+                    continue
+                results[pos]["status"] = "duplicate"
+                results[pos]["id"] = item_id
+                results[pos]["message"] = "Already exists"
+                if with_number and item.get("employee_number") is not None:
+                    updated = True
+                    audits.append((
+                        self.entity_type.value, item_id, "UPDATE", None,
+                        json.dumps({"employee_number": item["employee_number"]}),
+                    ))
+            get_audit_writer().record_many(conn, audits)
+            c.execute("DROP TABLE temp.bulk_import")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for result in results:
+                if result["status"] is None:
+                    result["status"] = "error"
+                    result["message"] = str(e)
+            return results
+        finally:
+            conn.close()
+
+        for pos, item_id in created:
+            results[pos]["status"] = "created"
+            results[pos]["id"] = item_id
+        if created or updated:
+            get_cache().invalidate(SELECTORS)
+        return results
+
     def update(self, item_id: str, name: str, employee_number: Optional[str] = None) -> Optional[Dict]:
-        """Update an existing item"""
+        """
+        Update an existing item.
+        Raises sqlite3.IntegrityError if the new name belongs to another
+        active item.
+        """
         conn = self.db.get_connection()
         c = conn.cursor()
 
@@ -113,37 +366,36 @@ class Repository:
 
         old_item = dict(old_item)
 
-        if self.entity_type == EntityType.EMPLOYEES and employee_number is not None:
-            c.execute(
-                f"UPDATE {self.table} SET name = ?, employee_number = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (name, employee_number, item_id),
-            )
-            changes = {
-                "old": {"name": old_item["name"], "employee_number": old_item.get("employee_number")},
-                "new": {"name": name, "employee_number": employee_number}
-            }
-        else:
-            c.execute(
-                f"UPDATE {self.table} SET name = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (name, item_id),
-            )
-            changes = {"old": old_item["name"], "new": name}
+        try:
+            if self.entity_type == EntityType.EMPLOYEES and employee_number is not None:
+                c.execute(
+                    f"UPDATE {self.table} SET name = ?, employee_number = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (name, employee_number, item_id),
+                )
+                changes = {
+                    "old": {"name": old_item["name"], "employee_number": old_item.get("employee_number")},
+                    "new": {"name": name, "employee_number": employee_number}
+                }
+            else:
+                c.execute(
+                    f"UPDATE {self.table} SET name = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (name, item_id),
+                )
+                changes = {"old": old_item["name"], "new": name}
+        except sqlite3.IntegrityError:
+            # Renamed to a name another active item already has
+            conn.rollback()
+            conn.close()
+            raise
         
         # Log the update
-        c.execute(
-            "INSERT INTO audit_log (entity_type, entity_id, action, changes) VALUES (?, ?, ?, ?)",
-            (
-                self.entity_type.value,
-                item_id,
-                "UPDATE",
-                json.dumps(changes),
-            ),
-        )
+        get_audit_writer().record(conn, self.entity_type.value, item_id, "UPDATE", changes=json.dumps(changes))
 
         conn.commit()
         c.execute(f"SELECT * FROM {self.table} WHERE id = ?", (item_id,))
         updated_item = dict(c.fetchone())
         conn.close()
+        get_cache().invalidate(SELECTORS)
 
         return updated_item
 
@@ -159,11 +411,10 @@ class Repository:
         affected = c.rowcount
 
         if affected > 0:
-            c.execute(
-                "INSERT INTO audit_log (entity_type, entity_id, action) VALUES (?, ?, ?)",
-                (self.entity_type.value, item_id, "DELETE"),
-            )
+            get_audit_writer().record(conn, self.entity_type.value, item_id, "DELETE")
 
         conn.commit()
         conn.close()
+        if affected > 0:
+            get_cache().invalidate(SELECTORS)
         return affected > 0
@@ -0,0 +1,146 @@
+"""
+Per-record change history for DMT records
+
+Every write to a DMT record stores a version in dmt_record_versions: a full
+snapshot of the row every Config.DMT_HISTORY_SNAPSHOT_EVERY versions
+(starting with version 1) and only the changed columns in between. Deltas
+are computed against the current row inside the writer's transaction, so
+they are exact and commit or roll back with the change.
+
+Any past version is rebuilt from the nearest snapshot at or before it plus
+at most SNAPSHOT_EVERY - 1 deltas. Records that existed before history was
+kept get a baseline snapshot of their current state on their first change.
+"""
+import json
+from typing import Dict, List, Optional
+from config import Config
+
+# Columns that change on every write and carry no information of their own
+IGNORED_COLUMNS = ("updated_at",)
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+
+def _dumps(data: Dict) -> str:
+    return json.dumps(data, separators=(",", ":"), default=str)
+
+
+def diff_rows(before: Dict, after: Dict) -> Dict:
+    """Columns of after whose values differ from before (ignored columns left out)"""
+    return {
+        column: value for column, value in after.items()
+        if column not in IGNORED_COLUMNS and before.get(column) != value
+    }
+
+
+class DMTHistory:
+    """Writes and replays dmt_record_versions (always on the caller's connection)"""
+
+    @staticmethod
+    def current(conn, dmt_id: str) -> Optional[Dict]:
+        """
+        The record as stored now, or None. Starts the write transaction
+        first (BEGIN IMMEDIATE) when none is open, so the row cannot change
+        between this read and the caller's UPDATE.
+        """
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT * FROM dmt_records WHERE id = ?", (dmt_id,)).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def latest_version(conn, dmt_id: str) -> int:
+        row = conn.execute(
+            "SELECT MAX(version) FROM dmt_record_versions WHERE dmt_id = ?", (dmt_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    @classmethod
+    def record(cls, conn, dmt_id: str, before: Optional[Dict], user_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Store the version produced by a write. before is the row from
+        current() taken before the write (None for a new record). Returns
+        the changes as {column: [old, new]}, or None when nothing changed.
+        """
+        after = cls.current(conn, dmt_id)
+        if after is None:
+            return None
+        version = cls.latest_version(conn, dmt_id)
+        if before is None:
+            delta = diff_rows({}, after)
+        else:
+            delta = diff_rows(before, after)
+            if not delta:
+                return None
+            if version == 0:
+                # First change since history was introduced: keep the old state too
+                version = 1
+                cls._insert(conn, dmt_id, version, SNAPSHOT, before, None, before.get("updated_at"))
+
+        version += 1
+        if (version - 1) % Config.DMT_HISTORY_SNAPSHOT_EVERY == 0:
+            cls._insert(conn, dmt_id, version, SNAPSHOT, after, user_id)
+        else:
+            cls._insert(conn, dmt_id, version, DELTA, delta, user_id)
+        if before is None:
+            return {}
+        return {column: [before.get(column), value] for column, value in delta.items()}
+
+    @staticmethod
+    def _insert(conn, dmt_id: str, version: int, kind: str, data: Dict,
+                user_id: Optional[str], created_at: Optional[str] = None):
+        conn.execute(
+            "INSERT INTO dmt_record_versions (dmt_id, version, kind, data, user_id, created_at) "
+            "VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+            (dmt_id, version, kind, _dumps(data), user_id, created_at),
+        )
+
+    @staticmethod
+    def rebuild(conn, dmt_id: str, version: int) -> Optional[Dict]:
+        """The record as it was at version, or None if there is no such version"""
+        rows = conn.execute(
+            """
+            SELECT version, kind, data FROM dmt_record_versions
+            WHERE dmt_id = ? AND version <= ? AND version >= (
+                SELECT MAX(version) FROM dmt_record_versions
+                WHERE dmt_id = ? AND version <= ? AND kind = 'snapshot'
+            )
+            ORDER BY version
+            """,
+            (dmt_id, version, dmt_id, version),
+        ).fetchall()
+        if not rows or rows[-1]["version"] != version:
+            return None
+        state: Dict = {}
+        for row in rows:
+            state.update(json.loads(row["data"]))
+        return state
+
+    @staticmethod
+    def history(conn, dmt_id: str) -> List[Dict]:
+        """
+        Every version of the record, newest first, each with the columns it
+        changed as {column: [old, new]} (empty for the first version)
+        """
+        versions = []
+        state: Dict = {}
+        for row in conn.execute(
+            "SELECT version, kind, data, user_id, created_at FROM dmt_record_versions "
+            "WHERE dmt_id = ? ORDER BY version",
+            (dmt_id,),
+        ):
+            data = json.loads(row["data"])
+            changes = {}
+            if state:
+                changes = {column: [state.get(column), value] for column, value in diff_rows(state, data).items()}
+            state.update(data)
+            versions.append({
+                "version": row["version"],
+                "kind": row["kind"],
+                "user_id": row["user_id"],
+                "created_at": row["created_at"],
+                "changes": changes,
+            })
+        versions.reverse()
+        return versions
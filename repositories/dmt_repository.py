@@ -0,0 +1,334 @@
+"""
+Repository for DMT record list queries
+"""
+import base64
+import json
+import re
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Tuple
+from config import Config
+from database import get_db
+
+# Roles that see every uploaded DMT, not just their own
+FULL_VISIBILITY_ROLES = ["Admin", "Inspector", "Supervisor"]
+
+
+class DMTRow:
+    """
+    Fixed projection of dmt_records. Subclasses list their columns in
+    __slots__, which is also the SELECT list, so a row costs one small
+    object instead of a sqlite3.Row plus a dict. Supports attribute access
+    (templates), record["col"] and record.get("col").
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.columns(), values):
+            setattr(self, name, value)
+
+    @classmethod
+    def columns(cls) -> Tuple[str, ...]:
+        """All projected columns, base classes first"""
+        names: Tuple[str, ...] = ()
+        for klass in reversed(cls.__mro__):
+            names += tuple(klass.__dict__.get("__slots__", ()))
+        return names
+
+    @classmethod
+    def select_list(cls, prefix: str = "") -> str:
+        return ", ".join(prefix + name for name in cls.columns())
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """sqlite3 row_factory building instances straight from the row tuple"""
+        return cls(*row)
+
+    def __getitem__(self, name: str):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def get(self, name: str, default=None):
+        return getattr(self, name, default)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.columns()
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.get('id')!r})"
+
+
+class DMTListItem(DMTRow):
+    """A row of the DMT records list"""
+    __slots__ = ("id", "report_number", "part_num", "shop_order", "status", "workflow_status", "is_session", "created_at")
+
+
+class DMTSearchItem(DMTListItem):
+    """A DMT records list row from a ranked search"""
+    __slots__ = ("search_rank",)
+
+
+class DMTCard(DMTRow):
+    """A recent-record card on the DMT dashboard"""
+    __slots__ = ("id", "report_number", "part_num", "shop_order", "status", "created_at")
+
+
+def encode_cursor(
+    report_number: int,
+    direction: str,
+    total: Optional[int] = None,
+    rank: Optional[float] = None,
+) -> str:
+    """Build an opaque pagination cursor"""
+    payload = {"k": report_number, "d": direction}
+    if total is not None:
+        payload["t"] = total
+    if rank is not None:
+        payload["r"] = rank
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Dict]:
+    """Decode a cursor produced by encode_cursor; None if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload.get("d") not in ("n", "p") or not isinstance(payload.get("k"), int):
+            return None
+        if "r" in payload and not isinstance(payload["r"], (int, float)):
+            return None
+        return payload
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def build_match_query(search: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word becomes a quoted prefix
+    term and all terms must match, e.g. 'PN-12 acme' -> '"PN"* "12"* "acme"*'.
+    """
+    terms = re.findall(r"\w+", search)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+class DMTRepository:
+    """Read access to DMT records with role-based visibility"""
+
+    _fts_enabled: Optional[bool] = None
+
+    def __init__(self):
+        self.db = get_db()
+
+    def fts_enabled(self) -> bool:
+        """Whether the dmt_records_fts index exists (checked once per process)"""
+        if DMTRepository._fts_enabled is None:
+            conn = self.db.get_connection()
+            row = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dmt_records_fts'"
+            ).fetchone()
+            conn.close()
+            DMTRepository._fts_enabled = row is not None
+        return DMTRepository._fts_enabled
+
+    @staticmethod
+    def visibility_clause(user: Dict) -> Tuple[str, List]:
+        """WHERE clause (without the WHERE) restricting records to what the user may see"""
+        if user["role"] in FULL_VISIBILITY_ROLES:
+            # Everyone's uploaded DMTs plus the user's own sessions
+            return "is_active = 1 AND (is_session = 0 OR (is_session = 1 AND created_by = ?))", [user["id"]]
+        # Own sessions and uploaded DMTs the user created or is assigned to
+        return (
+            "is_active = 1 AND ((is_session = 0 AND (created_by = ? OR assigned_to = ?)) OR (is_session = 1 AND created_by = ?))",
+            [user["id"], user["id"], user["id"]],
+        )
+
+    @staticmethod
+    def visibility_branches(user: Dict) -> List[Tuple[str, List]]:
+        """
+        The visibility filter split into disjoint clauses whose union is
+        visibility_clause(user). Each clause is an equality prefix of one
+        of the partial indexes from migration 12, so a UNION ALL of them
+        reads every branch in index order instead of filtering one index
+        with an OR.
+        """
+        own_sessions = ("is_active = 1 AND is_session = 1 AND created_by = ?", [user["id"]])
+        if user["role"] in FULL_VISIBILITY_ROLES:
+            return [("is_active = 1 AND is_session = 0", []), own_sessions]
+        return [
+            ("is_active = 1 AND is_session = 0 AND created_by = ?", [user["id"]]),
+            # Assigned to the user by someone else (own records are in the branch above)
+            ("is_active = 1 AND is_session = 0 AND assigned_to = ? AND created_by IS NOT ?", [user["id"], user["id"]]),
+            own_sessions,
+        ]
+
+    @classmethod
+    def visible_select(
+        cls,
+        user: Dict,
+        columns: str = "*",
+        where: str = "",
+        params: Sequence = (),
+        order: str = "report_number DESC",
+        limit: Optional[int] = None,
+    ) -> Tuple[str, List]:
+        """
+        (sql, params) selecting the records user may see as a UNION ALL of
+        the visibility branches. where (" AND ...") and params are added to
+        every branch; order may only name selected columns.
+        """
+        branches, all_params = [], []
+        for clause, clause_params in cls.visibility_branches(user):
+            branches.append(f"SELECT {columns} FROM dmt_records WHERE {clause}{where}")
+            all_params += clause_params + list(params)
+        sql = " UNION ALL ".join(branches) + f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            all_params.append(limit)
+        return sql, all_params
+
+    @classmethod
+    def visible_count(cls, user: Dict, where: str = "", params: Sequence = ()) -> Tuple[str, List]:
+        """(sql, params) counting the records user may see, one index-only count per branch"""
+        counts, all_params = [], []
+        for clause, clause_params in cls.visibility_branches(user):
+            counts.append(f"(SELECT COUNT(*) FROM dmt_records WHERE {clause}{where})")
+            all_params += clause_params + list(params)
+        return "SELECT " + " + ".join(counts), all_params
+
+    @staticmethod
+    def _search_clause(search: str) -> Tuple[str, List]:
+        search_param = f"%{search}%"
+        return (
+            " AND (report_number LIKE ? OR part_num LIKE ? OR shop_order LIKE ? OR status LIKE ?)",
+            [search_param, search_param, search_param, search_param],
+        )
+
+    def list_page(
+        self,
+        user: Dict,
+        search: str = "",
+        cursor: Optional[str] = None,
+        page_size: Optional[int] = None,
+        with_total: Optional[bool] = None,
+    ) -> Dict:
+        """
+        Keyset-paginated list.
+
+        Without a search, records are ordered by report_number DESC. With a
+        search, the FTS5 index is queried with prefix terms and results are
+        ordered by bm25 relevance, then report_number DESC; the visibility
+        filter applies in both modes. Pages are fetched with a keyset
+        predicate and LIMIT n+1 instead of OFFSET.
+
+        Returns a dict with records (DMTListItem / DMTSearchItem rows),
+        next_cursor, prev_cursor, total and total_is_estimate. The exact total is counted once, on the first
+        page; later pages carry it inside the cursor, so deep pages cost the
+        same as the first one. With with_total=False (or
+        Config.DMT_LIST_COUNT_TOTAL off) no COUNT runs and total is None.
+        """
+        page_size = page_size or Config.PAGE_SIZE
+        if with_total is None:
+            with_total = Config.DMT_LIST_COUNT_TOTAL
+
+        match = build_match_query(search) if search else ""
+        ranked = bool(match) and self.fts_enabled()
+
+        if ranked:
+            # Ordered by relevance, so there is no index order to exploit
+            where, params = self.visibility_clause(user)
+            hits = (
+                "WITH hits AS ("
+                "SELECT rowid AS hit_number, bm25(dmt_records_fts) AS search_rank "
+                "FROM dmt_records_fts WHERE dmt_records_fts MATCH ?) "
+            )
+            select_sql = (
+                f"{hits}SELECT {DMTListItem.select_list('d.')}, hits.search_rank "
+                f"FROM hits JOIN dmt_records d ON d.report_number = hits.hit_number WHERE {where}"
+            )
+            count_sql = f"{hits}SELECT COUNT(*) FROM hits JOIN dmt_records d ON d.report_number = hits.hit_number WHERE {where}"
+            params = [match] + params
+        else:
+            where, params = self._search_clause(search) if search else ("", [])
+            count_sql, count_params = self.visible_count(user, where, params)
+
+        position = decode_cursor(cursor) if cursor else None
+        if position and ranked != ("r" in position):
+            # Cursor from the other mode (search added or cleared): start over
+            position = None
+        backwards = bool(position) and position["d"] == "p"
+
+        if ranked:
+            order = "search_rank DESC, report_number ASC" if backwards else "search_rank ASC, report_number DESC"
+        else:
+            order = "report_number ASC" if backwards else "report_number DESC"
+
+        keyset_sql, keyset_params = "", []
+        if position:
+            cmp_rank, cmp_number = (">", "<") if not backwards else ("<", ">")
+            if ranked:
+                keyset_sql = f" AND (search_rank {cmp_rank} ? OR (search_rank = ? AND report_number {cmp_number} ?))"
+                keyset_params = [position["r"], position["r"], position["k"]]
+            else:
+                keyset_sql = f" AND report_number {cmp_number} ?"
+                keyset_params = [position["k"]]
+
+        conn = self.db.get_connection()
+        c = conn.cursor()
+
+        try:
+            total = position.get("t") if position else None
+            total_is_estimate = position is not None
+            if total is None and with_total:
+                c.execute(count_sql, params if ranked else count_params)
+                total = c.fetchone()[0]
+                total_is_estimate = False
+
+            if ranked:
+                c.execute(
+                    f"{select_sql}{keyset_sql} ORDER BY {order} LIMIT ?",
+                    params + keyset_params + [page_size + 1],
+                )
+            else:
+                c.execute(*self.visible_select(
+                    user, columns=DMTListItem.select_list(), where=where + keyset_sql,
+                    params=params + keyset_params, order=order, limit=page_size + 1,
+                ))
+            c.row_factory = (DMTSearchItem if ranked else DMTListItem).row_factory
+            rows = c.fetchall()
+        except sqlite3.OperationalError as e:
+            # A query the FTS parser rejects should read as "no results", not a 500
+            print(f"DMT search failed for {search!r}: {e}")
+            rows, total, total_is_estimate = [], 0, False
+        finally:
+            conn.close()
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            records = list(reversed(rows))
+            has_prev, has_next = has_more, True
+        else:
+            records = rows
+            has_prev, has_next = position is not None, has_more
+
+        next_cursor = prev_cursor = None
+        if records:
+            def make_cursor(record, direction):
+                rank = record.get("search_rank") if ranked else None
+                return encode_cursor(record["report_number"], direction, total, rank)
+
+            if has_next:
+                next_cursor = make_cursor(records[-1], "n")
+            if has_prev:
+                prev_cursor = make_cursor(records[0], "p")
+
+        return {
+            "records": records,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+            "total": total,
+            "total_is_estimate": total_is_estimate,
+        }
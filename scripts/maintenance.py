@@ -0,0 +1,219 @@
+"""
+Database maintenance commands
+
+Usage:
+    python scripts/maintenance.py rebuild-search
+    python scripts/maintenance.py rebuild-counters
+    python scripts/maintenance.py entity-duplicates [--merge]
+    python scripts/maintenance.py check-query-plans
+    python scripts/maintenance.py audit-rollover [--before YYYYMM]
+    python scripts/maintenance.py audit-retention [--keep MONTHS] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.connection import get_db
+from database.counters import rebuild_counters as rebuild_counter_values
+from database.migrations import find_duplicate_names, merge_duplicate_names, rebuild_dmt_fts
+from database.cache import get_cache, SELECTORS
+from database.audit_archive import get_audit_archive
+from repositories.dmt_repository import DMTRepository
+from repositories.audit_repository import AuditRepository, TODAY_CLAUSE
+from config import Config, EntityType
+
+
+def rebuild_search():
+    """Rebuild the DMT full-text index from dmt_records"""
+    db = get_db()
+    conn = db.get_connection()
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dmt_records_fts'"
+        ).fetchone()
+        if not exists:
+            print("dmt_records_fts does not exist (SQLite without FTS5?). Nothing to rebuild.")
+            return 1
+
+        start = time.perf_counter()
+        count = rebuild_dmt_fts(conn)
+        conn.commit()
+        conn.execute("INSERT INTO dmt_records_fts (dmt_records_fts) VALUES ('optimize')")
+        conn.commit()
+        print(f"Rebuilt search index for {count} DMT records in {time.perf_counter() - start:.2f}s")
+        return 0
+    finally:
+        conn.close()
+
+
+def rebuild_counters():
+    """Recount dashboard counters and report any drift that was corrected"""
+    db = get_db()
+    conn = db.get_connection()
+    try:
+        drift = rebuild_counter_values(conn)
+        conn.commit()
+        if not drift:
+            print("All counters were accurate.")
+        for name, delta in sorted(drift.items()):
+            print(f"  {name}: corrected by {delta:+d}")
+        return 0
+    finally:
+        conn.close()
+
+
+def entity_duplicates(merge=False):
+    """Report (and optionally merge) entity names that differ only in case"""
+    db = get_db()
+    conn = db.get_connection()
+    try:
+        found = 0
+        for entity in EntityType:
+            groups = merge_duplicate_names(conn, entity) if merge else find_duplicate_names(conn, entity)
+            for group in groups:
+                found += 1
+                names = ", ".join(f"{row['name']!r} ({row['id']})" for row in group)
+                print(f"  {entity.value}: {names}")
+        if merge:
+            conn.commit()
+            if found:
+                get_cache().invalidate(SELECTORS)
+        if not found:
+            print("No duplicate names.")
+        elif merge:
+            print(f"Merged {found} duplicate group(s) into their oldest item.")
+        else:
+            print(f"{found} duplicate group(s). Run with --merge to merge them.")
+        return 0
+    finally:
+        conn.close()
+
+
+def check_query_plans():
+    """
+    EXPLAIN QUERY PLAN the DMT visibility queries for both role scopes and
+    the audit log pages, and fail if any of them scans its table, misses
+    its indexes or sorts in a temp b-tree
+    """
+    queries = []
+    for role in ("Admin", "Operator"):
+        user = {"id": "plan-check", "role": role}
+        for order in ("report_number DESC", "created_at DESC"):
+            queries.append((f"{role} list by {order}", DMTRepository.visible_select(user, order=order, limit=26)))
+        queries.append((
+            f"{role} list page 2",
+            DMTRepository.visible_select(user, where=" AND report_number < ?", params=[100], limit=26),
+        ))
+        queries.append((f"{role} count", DMTRepository.visible_count(user)))
+
+    audit_order = " ORDER BY timestamp DESC, id DESC LIMIT 51"
+    for label, filters in (
+        ("audit log", {}),
+        ("audit log by entity", {"entity_type": "dmt_records", "entity_id": "X"}),
+        ("audit log by user", {"user_id": "X"}),
+        ("audit log by action and range", {"action": "UPDATE", "since": "2024-01-01", "until": "2024-01-31"}),
+    ):
+        where, params = AuditRepository.filter_clause(filters)
+        queries.append((
+            f"{label} page 2",
+            (f"SELECT * FROM audit_log WHERE {where} AND (timestamp, id) < (?, ?){audit_order}", params + ["2024-02-01", 1]),
+        ))
+    queries.append(("audit count today", (f"SELECT COUNT(*) FROM audit_log WHERE {TODAY_CLAUSE}", [])))
+
+    db = get_db()
+    conn = db.get_connection()
+    try:
+        failures = 0
+        for label, (sql, params) in queries:
+            details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            problems = [
+                detail for detail in details
+                if detail.startswith(("SCAN dmt_records", "SCAN audit_log"))
+                or "TEMP B-TREE" in detail
+                or (detail.startswith("SEARCH dmt_records") and "idx_dmt_records_" not in detail)
+                or (detail.startswith("SEARCH audit_log") and "idx_audit_log_" not in detail)
+            ]
+            print(f"{'FAIL' if problems else 'ok'}  {label}")
+            for detail in details:
+                print(f"      {detail}")
+            failures += bool(problems)
+        if failures:
+            print(f"{failures} query plan(s) do not use their indexes. Run migrations and ANALYZE.")
+            return 1
+        print("All checked queries use their indexes.")
+        return 0
+    finally:
+        conn.close()
+
+
+def audit_rollover(before=None):
+    """Move audit entries of past months into their monthly archive files"""
+    archive = get_audit_archive()
+    start = time.perf_counter()
+    moved = archive.rollover(before=before)
+    for month, count in moved:
+        print(f"  {month}: {count} entries -> {archive.path_for(month)}")
+    if not moved:
+        print("No past months in the main audit log.")
+    else:
+        print(f"Rolled over {len(moved)} month(s) in {time.perf_counter() - start:.2f}s")
+    if Config.AUDIT_RETENTION_MONTHS > 0:
+        return audit_retention(Config.AUDIT_RETENTION_MONTHS)
+    return 0
+
+
+def audit_retention(keep, dry_run=False):
+    """Delete archived audit months older than the retention period"""
+    if keep <= 0:
+        print("Retention is disabled (keep <= 0); nothing removed.")
+        return 0
+    expired = get_audit_archive().apply_retention(keep, dry_run=dry_run)
+    for month in expired:
+        print(f"  {month}: {'would be removed' if dry_run else 'removed'}")
+    if not expired:
+        print(f"No archived months older than {keep} month(s).")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QMS database maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild-search", help="Backfill/rebuild the DMT full-text search index")
+    subparsers.add_parser("rebuild-counters", help="Recount dashboard counters and fix drift")
+    duplicates_parser = subparsers.add_parser(
+        "entity-duplicates", help="Report entity names that differ only in case"
+    )
+    duplicates_parser.add_argument("--merge", action="store_true", help="Merge each group into its oldest item")
+    subparsers.add_parser("check-query-plans", help="Verify the DMT list and audit log queries use their indexes")
+    rollover_parser = subparsers.add_parser(
+        "audit-rollover", help="Move past months of the audit log into monthly archive files"
+    )
+    rollover_parser.add_argument("--before", help="Roll over months before YYYYMM (default: the current month)")
+    retention_parser = subparsers.add_parser("audit-retention", help="Delete archived audit months past retention")
+    retention_parser.add_argument(
+        "--keep", type=int, default=Config.AUDIT_RETENTION_MONTHS,
+        help="Months of archives to keep (default: AUDIT_RETENTION_MONTHS)",
+    )
+    retention_parser.add_argument("--dry-run", action="store_true", help="Only list what would be removed")
+
+    args = parser.parse_args()
+
+    if args.command == "rebuild-search":
+        return rebuild_search()
+    if args.command == "rebuild-counters":
+        return rebuild_counters()
+    if args.command == "entity-duplicates":
+        return entity_duplicates(merge=args.merge)
+    if args.command == "check-query-plans":
+        return check_query_plans()
+    if args.command == "audit-rollover":
+        return audit_rollover(before=args.before)
+    if args.command == "audit-retention":
+        return audit_retention(args.keep, dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
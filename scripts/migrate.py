@@ -0,0 +1,75 @@
+"""
+Schema migration CLI
+
+Usage:
+    python scripts/migrate.py status
+    python scripts/migrate.py apply [--target N]
+    python scripts/migrate.py apply --dry-run [--target N]
+"""
+import argparse
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Never migrate implicitly while importing the database module
+os.environ["DB_AUTO_MIGRATE"] = "0"
+
+from database.connection import get_db
+from database import migrations
+
+
+def show_status(conn):
+    """Print the current version and every registered migration"""
+    current = migrations.get_version(conn)
+    print(f"Database: {get_db().db_path}")
+    print(f"Schema version: {current} (latest: {migrations.latest_version()})")
+    print()
+    for step in migrations.MIGRATIONS:
+        state = "applied" if step.version <= current else "pending"
+        print(f"  [{state:>7}] {step.version:>3}  {step.description}")
+
+
+def apply(conn, target=None, dry_run=False):
+    """Apply (or rehearse) pending migrations"""
+    pending = migrations.pending_migrations(conn, target)
+    if not pending:
+        print("Schema is up to date, nothing to do.")
+        return
+
+    results = migrations.migrate(conn, target=target, dry_run=dry_run)
+    for step, statements in results:
+        verb = "Would apply" if dry_run else "Applied"
+        print(f"{verb} migration {step.version}: {step.description}")
+        if dry_run:
+            for statement in statements:
+                print("    " + " ".join(statement.split()))
+    if dry_run:
+        print("\nDry run only, all changes were rolled back.")
+    else:
+        print(f"\nSchema version is now {migrations.get_version(conn)}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage QMS database schema migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("status", help="Show applied and pending migrations")
+
+    apply_parser = subparsers.add_parser("apply", help="Apply pending migrations")
+    apply_parser.add_argument("--target", type=int, default=None, help="Stop at this version")
+    apply_parser.add_argument("--dry-run", action="store_true", help="Show the SQL without committing it")
+
+    args = parser.parse_args()
+
+    conn = get_db().get_connection()
+    try:
+        if args.command == "status":
+            show_status(conn)
+        elif args.command == "apply":
+            apply(conn, target=args.target, dry_run=args.dry_run)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Stress the report number allocator with concurrent threads and processes
+
+Every worker inserts DMT records through the same allocator the create
+route uses, against a scratch database, then the script checks that no
+report number was handed out twice and that every reserved number is
+either used or recorded as a gap.
+
+Usage:
+    python scripts/stress_report_numbers.py [--processes M] [--threads N]
+        [--inserts K] [--block-size B] [--fail-every F]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def worker_process(db_path, threads, inserts, block_size, fail_every):
+    """Run `threads` inserting threads in a fresh process"""
+    os.environ["DATABASE_PATH"] = db_path
+    os.environ["REPORT_NUMBER_BLOCK_SIZE"] = str(block_size)
+    from database import get_db, get_report_number_allocator
+
+    db = get_db()
+    allocator = get_report_number_allocator()
+    errors = []
+
+    def insert_many(thread_no):
+        for i in range(inserts):
+            conn = db.get_connection()
+            number = None
+            try:
+                number = allocator.allocate(conn)
+                if fail_every and (i + 1) % fail_every == 0:
+                    raise RuntimeError("simulated failure")
+                conn.execute(
+                    "INSERT INTO dmt_records (id, report_number, created_by) VALUES (?, ?, ?)",
+                    (uuid.uuid4().hex, number, f"stress-{os.getpid()}-{thread_no}"),
+                )
+                conn.commit()
+            except RuntimeError:
+                conn.rollback()
+                allocator.discard(number, "simulated failure")
+            except Exception as e:
+                conn.rollback()
+                errors.append(f"{type(e).__name__}: {e}")
+            finally:
+                conn.close()
+
+    workers = [threading.Thread(target=insert_many, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    allocator.release()
+    db.close()
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report number allocator stress test")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--inserts", type=int, default=50, help="Inserts per thread")
+    parser.add_argument("--block-size", type=int, default=1)
+    parser.add_argument("--fail-every", type=int, default=0, help="Abort every Nth insert after allocating")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="qms-stress-"), "stress.db")
+    os.environ["DATABASE_PATH"] = db_path
+    # Create the schema once before the workers start
+    from database import get_db
+    get_db().close()
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    first = conn.execute("SELECT next_number FROM report_counter WHERE id = 1").fetchone()[0]
+    conn.close()
+
+    print(
+        f"{args.processes} processes x {args.threads} threads x {args.inserts} inserts, "
+        f"block size {args.block_size} -> {db_path}"
+    )
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(args.processes) as pool:
+        results = [
+            pool.apply_async(worker_process, (db_path, args.threads, args.inserts, args.block_size, args.fail_every))
+            for _ in range(args.processes)
+        ]
+        errors = [e for r in results for e in r.get()]
+    elapsed = time.perf_counter() - start
+
+    conn = sqlite3.connect(db_path)
+    used = [row[0] for row in conn.execute("SELECT report_number FROM dmt_records")]
+    gaps = [row[0] for row in conn.execute("SELECT number FROM report_number_gaps")]
+    last = conn.execute("SELECT next_number FROM report_counter WHERE id = 1").fetchone()[0]
+    conn.close()
+
+    duplicates = len(used) - len(set(used))
+    unaccounted = set(range(first, last)) - set(used) - set(gaps)
+    print(f"Inserted {len(used)} records in {elapsed:.2f}s ({len(used) / elapsed:.0f}/s)")
+    print(f"Duplicates: {duplicates}, gaps recorded: {len(gaps)}, unaccounted numbers: {len(unaccounted)}")
+    for error in errors[:10]:
+        print(f"  worker error: {error}")
+
+    ok = duplicates == 0 and not unaccounted and not errors
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,5 +3,14 @@ Services package initialization
 """
 from .export_service import ExportService
 from .csv_import_service import CSVImportService
+from .import_job_service import ImportJobService, get_import_jobs
+from .dashboard_service import DashboardStatsService, get_dashboard_stats
 
-__all__ = ["ExportService", "CSVImportService"]
+__all__ = [
+    "ExportService",
+    "CSVImportService",
+    "ImportJobService",
+    "get_import_jobs",
+    "DashboardStatsService",
+    "get_dashboard_stats",
+]
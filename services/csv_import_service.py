@@ -1,9 +1,10 @@
 """
 CSV Import Service for bulk entity uploads
 """
+import codecs
 import csv
-import io
-from typing import List, Dict, Tuple
+import itertools
+from typing import Iterable, List, Dict, Optional, Tuple
 from repositories import Repository
 from config import EntityType
 
@@ -32,83 +33,209 @@ class CSVImportService:
         Parse CSV file and return list of items and any errors
         Returns: (items, errors)
         """
-        items = []
-        errors = []
-        
-        try:
-            # Decode file content
-            content = file_content.decode('utf-8')
-            csv_file = io.StringIO(content)
-            reader = csv.DictReader(csv_file)
-            
-            # Validate headers
-            if not reader.fieldnames:
-                return [], ["CSV file is empty or has no headers"]
-            
-            valid, error = CSVImportService.validate_csv_headers(reader.fieldnames, entity)
-            if not valid:
-                return [], [error]
-            
-            # Parse rows
-            for idx, row in enumerate(reader, start=2):  # Start at 2 (1 is header)
-                # Skip empty rows
-                if not any(row.values()):
-                    continue
-                
-                # Validate required fields
-                if not row.get('name', '').strip():
-                    errors.append(f"Row {idx}: Name is required")
-                    continue
-                
-                item = {'name': row['name'].strip()}
-                
-                # Add employee_number for employees
-                if entity == "employees":
-                    employee_number = row.get('employee_number', '').strip()
-                    if not employee_number:
-                        errors.append(f"Row {idx}: Employee number is required")
-                        continue
-                    item['employee_number'] = employee_number
-                
-                items.append(item)
-        
-        except UnicodeDecodeError:
-            errors.append("File encoding error. Please ensure the file is UTF-8 encoded")
-        except csv.Error as e:
-            errors.append(f"CSV parsing error: {str(e)}")
-        except Exception as e:
-            errors.append(f"Unexpected error: {str(e)}")
-        
-        return items, errors
-    
+        parser = CSVStreamParser(entity)
+        items = parser.feed(file_content) + parser.close()
+        return items, parser.errors
+
+    @staticmethod
+    def import_rows(items: List[Dict], entity: str) -> List[Dict]:
+        """
+        Import items in one transaction
+        Returns one result dict per item (row, name, status, id, message),
+        status being created, duplicate or error
+        """
+        repo = Repository(EntityType(entity))
+        return repo.bulk_create(items)
+
+    @staticmethod
+    def summarize(results: List[Dict]) -> Tuple[int, int, List[str]]:
+        """Collapse per-row results into (success_count, skip_count, errors)"""
+        success_count = sum(1 for r in results if r["status"] == "created")
+        skip_count = sum(1 for r in results if r["status"] == "duplicate")
+        errors = [
+            f"Error importing '{r['name']}': {r['message']}"
+            for r in results if r["status"] == "error"
+        ]
+        return success_count, skip_count, errors
+
     @staticmethod
     def import_items(items: List[Dict], entity: str) -> Tuple[int, int, List[str]]:
         """
         Import items into database
         Returns: (success_count, skip_count, errors)
         """
-        repo = Repository(EntityType(entity))
-        success_count = 0
-        skip_count = 0
-        errors = []
-        
-        for item in items:
+        return CSVImportService.summarize(CSVImportService.import_rows(items, entity))
+
+
+class CSVStreamParser:
+    """
+    Incremental CSV parser for entity uploads.
+
+    feed() takes raw bytes in arbitrary chunks and returns the items whose
+    rows are complete so far; close() flushes the rest. Bytes go through an
+    incremental UTF-8 decoder (so multi-byte characters may straddle
+    chunks) and complete lines go straight to csv.reader, which tracks
+    quoting itself (quoted fields may contain newlines; a stray quote
+    inside an unquoted field is literal). A record still open at the end
+    of the data received so far can only be inside a quoted field; it is
+    kept, and later lines are only scanned for the quote that closes that
+    field, so the record is parsed again once per multi-line field rather
+    than once per chunk. Memory is bounded by the chunk size plus one
+    record (at most csv.field_size_limit() per field).
+
+    Row problems, including malformed records, are collected in errors
+    with their row number and the row is skipped. A bad header or
+    undecodable input sets fatal and stops parsing.
+    """
+
+    def __init__(self, entity: str):
+        self.entity = entity
+        self.errors: List[str] = []
+        self.row_errors: List[Tuple[int, str, str]] = []  # (row, name, message)
+        self.fatal = False
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._tail = ""        # text after the last newline
+        self._pending = []     # lines of a record left open inside a quoted field
+        self._pending_size = 0
+        self._fieldnames: Optional[List[str]] = None
+        self._row = 1          # record number, 1 is the header
+
+    def feed(self, chunk: bytes) -> List[Dict]:
+        if self.fatal:
+            return []
+        try:
+            text = self._decoder.decode(chunk)
+        except UnicodeDecodeError:
+            return self._fail("File encoding error. Please ensure the file is UTF-8 encoded")
+        lines = (self._tail + text).split("\n")
+        self._tail = lines.pop()
+        return self._parse_lines(line + "\n" for line in lines)
+
+    def close(self) -> List[Dict]:
+        if self.fatal:
+            return []
+        try:
+            text = self._tail + self._decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return self._fail("File encoding error. Please ensure the file is UTF-8 encoded")
+        self._tail = ""
+        items = self._parse_lines([text] if text else [], final=True)
+        if self._fieldnames is None and not self.fatal:
+            self._fail("CSV file is empty or has no headers")
+        return items
+
+    def _fail(self, message: str) -> List[Dict]:
+        self.errors.append(message)
+        self.fatal = True
+        return []
+
+    def _row_error(self, idx: int, name: str, message: str):
+        self.errors.append(f"Row {idx}: {message}")
+        self.row_errors.append((idx, name, message))
+
+    def _parse_lines(self, lines, final: bool = False) -> List[Dict]:
+        """
+        Parse the complete records among the pending and new lines. Unless
+        final, a record that runs past the last line is kept pending.
+        """
+        lines = iter(lines)
+        if self._pending and not final:
+            # Nothing changes for csv.reader until the open quoted field
+            # closes (or outgrows the field limit, which it reports)
+            for line in lines:
+                self._pending.append(line)
+                self._pending_size += len(line)
+                if _closes_quoted_field(line) or self._pending_size > csv.field_size_limit():
+                    break
+            else:
+                return []
+        source = _LineSource(itertools.chain(self._pending, lines))
+        reader = csv.reader(source)
+        self._pending = []
+        self._pending_size = 0
+        items = []
+        while not self.fatal:
+            source.record = []
             try:
-                # Check if item already exists by name
-                existing_items, _ = repo.get_all(search=item['name'])
-                if any(i['name'].lower() == item['name'].lower() for i in existing_items):
-                    skip_count += 1
-                    continue
-                
-                # Create the item
-                if entity == "employees":
-                    repo.create(item['name'], employee_number=item['employee_number'])
-                else:
-                    repo.create(item['name'])
-                
-                success_count += 1
-            
-            except Exception as e:
-                errors.append(f"Error importing '{item['name']}': {str(e)}")
-        
-        return success_count, skip_count, errors
+                values = next(reader)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                self._row += 1
+                self._row_error(self._row, "", f"CSV parsing error: {str(e)}")
+                continue
+            if source.exhausted and not final:
+                # Inside a quoted field at the end of the data so far
+                self._pending = source.record
+                self._pending_size = sum(map(len, source.record))
+                break
+            items += self._parse_record(values)
+        return items
+
+    def _parse_record(self, values: List[str]) -> List[Dict]:
+        if self._fieldnames is None:
+            if values:
+                self._fieldnames = values
+                valid, error = CSVImportService.validate_csv_headers(values, self.entity)
+                if not valid:
+                    self._fail(error)
+            return []
+
+        self._row += 1
+        idx = self._row
+        # Skip empty rows
+        if not any(values):
+            return []
+        row = dict(zip(self._fieldnames, values))
+
+        # Validate required fields
+        if not row.get('name', '').strip():
+            self._row_error(idx, "", "Name is required")
+            return []
+
+        item = {'name': row['name'].strip(), 'row': idx}
+
+        # Add employee_number for employees
+        if self.entity == "employees":
+            employee_number = row.get('employee_number', '').strip()
+            if not employee_number:
+                self._row_error(idx, item['name'], "Employee number is required")
+                return []
+            item['employee_number'] = employee_number
+
+        return [item]
+
+
+def _closes_quoted_field(line: str) -> bool:
+    """Whether a quoted field that is open at the start of line ends in it"""
+    pos = line.find('"')
+    while pos != -1:
+        if not line.startswith('"', pos + 1):
+            return True
+        # A doubled quote is a literal quote inside the field
+        pos = line.find('"', pos + 2)
+    return False
+
+
+class _LineSource:
+    """
+    Line iterator for csv.reader that remembers the lines of the record
+    being read and whether the reader asked for more lines than there are
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines = iter(lines)
+        self.record: List[str] = []
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        try:
+            line = next(self._lines)
+        except StopIteration:
+            self.exhausted = True
+            raise
+        self.record.append(line)
+        return line
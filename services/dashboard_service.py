@@ -0,0 +1,138 @@
+"""
+Landing page statistics
+
+Each role scope is computed with as few statements as possible: admins read
+the trigger-maintained counters plus one statement for the user and audit
+counts; everyone else gets all their report counters from a single
+SUM(CASE ...) pass over the records they created or are assigned to.
+
+Results are cached per user for Config.DASHBOARD_STATS_TTL_SECONDS, since
+the landing page is hit by everyone at shift start. DMT writes in this
+process call invalidate(); writes made by other processes show up when the
+entry expires.
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from config import Config
+from database import get_db
+from database.counters import read_counters
+from repositories.audit_repository import TODAY_CLAUSE
+
+
+class DashboardStatsService:
+    """Per-user, short-TTL cache in front of the landing page aggregates"""
+
+    def __init__(self, db, ttl: float = 5.0):
+        self.db = db
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
+        self._generation = 0
+
+    def get_stats(self, user: Dict) -> Dict:
+        """Statistics for user's dashboard, cached for a few seconds (blocking on a miss)"""
+        key = (user["id"], user["role"])
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+            generation = self._generation
+
+        stats = self._compute(user)
+        with self._lock:
+            # Drop the result if a write invalidated the cache while computing
+            if self._generation == generation:
+                self._entries[key] = (time.monotonic() + self.ttl, stats)
+        return stats
+
+    def invalidate(self):
+        """Forget every cached entry (called after DMT writes)"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _compute(self, user: Dict) -> Dict:
+        conn = self.db.get_connection()
+        try:
+            if user["role"] == "Admin":
+                return self._admin_stats(conn)
+            return self._user_stats(conn, user["id"])
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _admin_stats(conn) -> Dict:
+        stats = {}
+        counters = read_counters(conn)
+        stats["total_reports"] = counters.get("dmt_records.active", 0)
+        stats["open_reports"] = counters.get("dmt_records.open", 0)
+        stats["total_users"], stats["recent_audits"] = conn.execute(f"""
+            SELECT
+                (SELECT COUNT(*) FROM users),
+                (SELECT COUNT(*) FROM audit_log WHERE {TODAY_CLAUSE})
+        """).fetchone()
+
+        # Recent activity
+        stats["recent_reports"] = conn.execute("""
+            SELECT report_number, part_num, status, created_at, created_by
+            FROM dmt_records
+            WHERE is_active = 1
+            ORDER BY created_at DESC
+            LIMIT 5
+        """).fetchall()
+
+        stats["recent_users"] = conn.execute("""
+            SELECT username, role, created_at
+            FROM users
+            WHERE is_active = 1
+            ORDER BY created_at DESC
+            LIMIT 5
+        """).fetchall()
+        return stats
+
+    @staticmethod
+    def _user_stats(conn, user_id: str) -> Dict:
+        stats = {}
+        # Records the user created, plus those assigned to them by someone
+        # else; the two branches are disjoint and each uses its own index
+        row = conn.execute("""
+            SELECT
+                COUNT(*),
+                SUM(CASE WHEN status = 'open' THEN 1 ELSE 0 END),
+                SUM(CASE WHEN status = 'closed' THEN 1 ELSE 0 END)
+            FROM (
+                SELECT status FROM dmt_records WHERE is_active = 1 AND created_by = ?
+                UNION ALL
+                SELECT status FROM dmt_records
+                WHERE is_active = 1 AND assigned_to = ? AND created_by IS NOT ?
+            )
+        """, (user_id, user_id, user_id)).fetchone()
+        stats["my_reports"] = row[0]
+        stats["my_open_reports"] = row[1] or 0
+        stats["my_closed_reports"] = row[2] or 0
+
+        # Recent reports
+        stats["recent_reports"] = conn.execute("""
+            SELECT report_number, part_num, status, created_at, assigned_to
+            FROM dmt_records
+            WHERE (created_by = ? OR assigned_to = ?) AND is_active = 1
+            ORDER BY created_at DESC
+            LIMIT 5
+        """, (user_id, user_id)).fetchall()
+        return stats
+
+
+_dashboard_stats: Optional[DashboardStatsService] = None
+_dashboard_stats_lock = threading.Lock()
+
+
+def get_dashboard_stats() -> DashboardStatsService:
+    """Get the global dashboard statistics service"""
+    global _dashboard_stats
+    if _dashboard_stats is None:
+        with _dashboard_stats_lock:
+            if _dashboard_stats is None:
+                _dashboard_stats = DashboardStatsService(get_db(), ttl=Config.DASHBOARD_STATS_TTL_SECONDS)
+    return _dashboard_stats
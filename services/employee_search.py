@@ -0,0 +1,140 @@
+"""
+In-memory prefix index for the employee typeahead
+
+Every active employee is indexed under the words of their name, their
+employee number and their id. Tokens are case- and accent-folded
+("Zuñiga" -> "zuniga"), kept in one sorted list and searched with bisect,
+so a lookup is O(log n) plus the matches. The index lives in the reference
+data cache and is rebuilt when an entity table changes (see
+database/cache.py). Rendered result fragments are cached per query inside
+the index, so repeated keystrokes are answered from memory.
+"""
+import bisect
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from database import get_db
+from database.cache import get_cache, SELECTORS
+
+_CACHE_KEY = "employee_index"
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents: 'Zuñiga' -> 'zuniga'"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", fold(text))
+
+
+# Match kinds, best first
+EXACT_NUMBER, NUMBER_PREFIX, NAME_PREFIX, FIRST_WORD, OTHER_WORD = range(5)
+
+
+class EmployeeIndex:
+    """Immutable prefix index over a snapshot of the employees table"""
+
+    def __init__(self, employees: List[Dict], fragment_cache_size: int = 1024):
+        self.employees = employees
+        self._names = [fold(e["name"]) for e in employees]
+        self._numbers = [fold(str(e.get("employee_number") or "")) for e in employees]
+        self._ids = [fold(str(e["id"])) for e in employees]
+
+        entries: List[Tuple[str, int]] = []
+        for idx, employee in enumerate(employees):
+            tokens = set(tokenize(employee["name"]))
+            tokens.update(tokenize(str(employee.get("employee_number") or "")))
+            tokens.update(tokenize(str(employee["id"])))
+            tokens.add(self._ids[idx])
+            entries.extend((token, idx) for token in tokens)
+        entries.sort()
+        self._tokens = [token for token, _ in entries]
+        self._owners = [idx for _, idx in entries]
+
+        self._fragments: "OrderedDict[str, str]" = OrderedDict()
+        self._fragment_cache_size = fragment_cache_size
+        self._lock = threading.Lock()
+
+    def _prefix_matches(self, prefix: str) -> set:
+        start = bisect.bisect_left(self._tokens, prefix)
+        end = bisect.bisect_left(self._tokens, prefix + "\U0010ffff")
+        return set(self._owners[start:end])
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Employees matching every word of query as a token prefix, best
+        first: exact employee number/id, number prefix, name prefix, first
+        word of the name, any other word; then by name.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return self.employees[:limit]
+        matches = None
+        for term in sorted(set(terms), key=len, reverse=True):
+            found = self._prefix_matches(term)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+
+        folded = fold(query).strip()
+        first = terms[0]
+
+        def rank(idx: int):
+            if folded in (self._numbers[idx], self._ids[idx]):
+                kind = EXACT_NUMBER
+            elif self._numbers[idx].startswith(folded):
+                kind = NUMBER_PREFIX
+            elif self._names[idx].startswith(folded):
+                kind = NAME_PREFIX
+            elif self._names[idx].startswith(first):
+                kind = FIRST_WORD
+            else:
+                kind = OTHER_WORD
+            return kind, self._names[idx]
+
+        return [self.employees[idx] for idx in sorted(matches, key=rank)[:limit]]
+
+    def cached_fragment(self, key: str) -> Optional[str]:
+        with self._lock:
+            html = self._fragments.get(key)
+            if html is not None:
+                self._fragments.move_to_end(key)
+            return html
+
+    def store_fragment(self, key: str, html: str):
+        with self._lock:
+            self._fragments[key] = html
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self._fragment_cache_size:
+                self._fragments.popitem(last=False)
+
+
+def _build_index() -> EmployeeIndex:
+    """Load active employees and index them (blocking)"""
+    db = get_db()
+    conn = db.get_connection()
+    rows = conn.execute(
+        "SELECT id, name, employee_number FROM employees WHERE is_active = 1 ORDER BY name"
+    ).fetchall()
+    conn.close()
+    return EmployeeIndex([dict(row) for row in rows], Config.EMPLOYEE_SEARCH_FRAGMENT_CACHE)
+
+
+def get_employee_index() -> EmployeeIndex:
+    """Current index, rebuilt after employees (or any entity table) change (blocking on a rebuild)"""
+    return get_cache().get(SELECTORS, _CACHE_KEY, _build_index)
+
+
+def peek_employee_index() -> Optional[EmployeeIndex]:
+    """The cached index if it is known to be current, without touching the database"""
+    return get_cache().peek(SELECTORS, _CACHE_KEY)
+
+
+def fragment_key(query: str) -> str:
+    """Queries that differ only in case, accents or outer spaces share one fragment"""
+    return fold(query).strip()
@@ -1,52 +1,134 @@
 """
 Export service for data export functionality
+
+Exports are generators end to end: rows are pulled from a cursor with
+fetchmany() and every batch is encoded and yielded before the next one is
+read, so memory use does not grow with the size of the export.
 """
 import io
 import csv
 import json
 from datetime import datetime
-from typing import List, Dict
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Sequence
 from fastapi.responses import StreamingResponse
+from config import Config
+from database import get_db
+
+# Columns never included in exported files
+EXCLUDED_COLUMNS = ("is_active",)
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
 
 
 class ExportService:
     """Service for exporting data in various formats"""
-    
+
     @staticmethod
-    def export_json(items: List[Dict], entity: str) -> StreamingResponse:
-        """Export items as JSON"""
-        clean_items = []
-        for item in items:
-            clean_item = {k: v for k, v in item.items() if k != "is_active"}
-            clean_items.append(clean_item)
-        
-        json_str = json.dumps(clean_items, indent=2, default=str)
+    def iter_query(sql: str, params: Sequence[Any] = (), batch_size: Optional[int] = None) -> Iterator[Mapping]:
+        """
+        Yield the rows of a query, fetching batch_size rows at a time.
+        The pooled connection is held only while the generator runs and is
+        returned when it is exhausted or closed (e.g. client disconnect).
+        """
+        batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+        conn = get_db().get_connection()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _clean_rows(rows: Iterable[Mapping]) -> Iterator[Dict]:
+        for row in rows:
+            yield {k: row[k] for k in row.keys() if k not in EXCLUDED_COLUMNS}
+
+    @staticmethod
+    def _batched(rows: Iterable[Dict], batch_size: int) -> Iterator[list]:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def stream_csv(rows: Iterable[Mapping], batch_size: Optional[int] = None) -> Iterator[bytes]:
+        """Encode rows as CSV, one chunk per batch; the header comes from the first row"""
+        batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+        buffer = io.StringIO()
+        writer = None
+        for batch in ExportService._batched(ExportService._clean_rows(rows), batch_size):
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=batch[0].keys())
+                writer.writeheader()
+            writer.writerows(batch)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    @staticmethod
+    def stream_ndjson(rows: Iterable[Mapping], batch_size: Optional[int] = None) -> Iterator[bytes]:
+        """Encode rows as newline-delimited JSON, one object per line"""
+        batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+        for batch in ExportService._batched(ExportService._clean_rows(rows), batch_size):
+            yield "".join(json.dumps(item, default=str) + "\n" for item in batch).encode()
+
+    @staticmethod
+    def stream_json_array(rows: Iterable[Mapping], batch_size: Optional[int] = None) -> Iterator[bytes]:
+        """Encode rows as a single JSON array, written incrementally"""
+        batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+        yield b"["
+        separator = "\n"
+        for batch in ExportService._batched(ExportService._clean_rows(rows), batch_size):
+            parts = []
+            for item in batch:
+                parts.append(separator + json.dumps(item, default=str))
+                separator = ",\n"
+            yield "".join(parts).encode()
+        yield b"\n]\n"
+
+    @staticmethod
+    def stream_response(rows: Iterable[Mapping], entity: str, format: str) -> StreamingResponse:
+        """StreamingResponse for csv, json or ndjson (unknown formats export JSON)"""
+        if format not in EXPORT_FORMATS:
+            format = "json"
+        media_type, extension = EXPORT_FORMATS[format]
+        encoders = {
+            "csv": ExportService.stream_csv,
+            "json": ExportService.stream_json_array,
+            "ndjson": ExportService.stream_ndjson,
+        }
         return StreamingResponse(
-            io.BytesIO(json_str.encode()),
-            media_type="application/json",
+            encoders[format](rows),
+            media_type=media_type,
             headers={
-                "Content-Disposition": f"attachment; filename={entity}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+                "Content-Disposition": f"attachment; filename={entity}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
             },
         )
-    
+
     @staticmethod
-    def export_csv(items: List[Dict], entity: str) -> StreamingResponse:
+    def export_json(items: Iterable[Mapping], entity: str) -> StreamingResponse:
+        """Export items as JSON"""
+        return ExportService.stream_response(items, entity, "json")
+
+    @staticmethod
+    def export_csv(items: Iterable[Mapping], entity: str) -> StreamingResponse:
         """Export items as CSV"""
-        clean_items = []
-        for item in items:
-            clean_item = {k: v for k, v in item.items() if k != "is_active"}
-            clean_items.append(clean_item)
-        
-        output = io.StringIO()
-        if clean_items:
-            writer = csv.DictWriter(output, fieldnames=clean_items[0].keys())
-            writer.writeheader()
-            writer.writerows(clean_items)
+        return ExportService.stream_response(items, entity, "csv")
 
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode()),
-            media_type="text/csv",
-            headers={
-                "Content-Disposition": f"attachment; filename={entity}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            },
-        )
+    @staticmethod
+    def export_ndjson(items: Iterable[Mapping], entity: str) -> StreamingResponse:
+        """Export items as newline-delimited JSON"""
+        return ExportService.stream_response(items, entity, "ndjson")
@@ -0,0 +1,265 @@
+"""
+Background CSV import jobs
+
+An upload is saved to Config.IMPORT_UPLOAD_DIR and recorded in import_jobs;
+the request returns immediately and a small worker pool streams the file
+through CSVStreamParser and Repository.bulk_create, updating the job's
+progress counters after every batch. Rows that were not imported (parse
+errors, duplicates, failed inserts) are kept in import_job_errors for the
+downloadable error report.
+
+Jobs are claimed with a conditional UPDATE, so several app processes can
+share the table. Jobs interrupted by a shutdown go back to 'queued' and are
+resumed at the next startup; re-running a file is safe because rows that
+already made it in are skipped as duplicates.
+"""
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from config import Config, EntityType
+from database import get_db
+from database.audit import now_sql
+from repositories import Repository
+from .csv_import_service import CSVStreamParser
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class ImportJobService:
+    """Queue and run CSV imports outside the request cycle"""
+
+    def __init__(self, db, workers: int = 1):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="csv-import")
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Job records
+    # ------------------------------------------------------------------
+
+    def create_job(self, entity: str, filename: str, source, created_by: Optional[str] = None) -> Dict:
+        """
+        Copy the uploaded file object to the upload directory, record a
+        queued job and hand it to the worker pool (blocking)
+        """
+        os.makedirs(Config.IMPORT_UPLOAD_DIR, exist_ok=True)
+        job_id = uuid.uuid4().hex[:12]
+        path = os.path.join(Config.IMPORT_UPLOAD_DIR, f"{job_id}.csv")
+        with open(path, "wb") as target:
+            shutil.copyfileobj(source, target, Config.CSV_READ_CHUNK_SIZE)
+
+        conn = self.db.get_connection()
+        try:
+            conn.execute(
+                "INSERT INTO import_jobs (id, entity, filename, file_path, status, created_by) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, entity, filename, path, QUEUED, created_by),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.submit(job_id)
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        conn = self.db.get_connection()
+        try:
+            row = conn.execute("SELECT * FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def iter_error_rows(self, job_id: str) -> Iterator[Dict]:
+        """Rows of a job that were not imported, in file order"""
+        conn = self.db.get_connection()
+        try:
+            c = conn.execute(
+                "SELECT row_number, name, status, message FROM import_job_errors WHERE job_id = ? ORDER BY row_number",
+                (job_id,),
+            )
+            while True:
+                rows = c.fetchmany(Config.EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn = self.db.get_connection()
+        try:
+            conn.execute(
+                f"UPDATE import_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                list(fields.values()) + [job_id],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _claim(self, job_id: str) -> bool:
+        """Move a queued job to running; False if someone else has it"""
+        conn = self.db.get_connection()
+        try:
+            claimed = conn.execute(
+                """
+                UPDATE import_jobs
+                SET status = ?, started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP,
+                    rows_parsed = 0, inserted = 0, skipped = 0, errors = 0, message = NULL
+                WHERE id = ? AND status = ?
+                """,
+                (RUNNING, job_id, QUEUED),
+            ).rowcount
+            if claimed:
+                conn.execute("DELETE FROM import_job_errors WHERE job_id = ?", (job_id,))
+            conn.commit()
+            return bool(claimed)
+        finally:
+            conn.close()
+
+    def _record_errors(self, job_id: str, rows: List[tuple]):
+        if not rows:
+            return
+        conn = self.db.get_connection()
+        try:
+            conn.executemany(
+                "INSERT INTO import_job_errors (job_id, row_number, name, status, message) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, *row) for row in rows],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Worker pool
+    # ------------------------------------------------------------------
+
+    def submit(self, job_id: str):
+        self._executor.submit(self._run_safely, job_id)
+
+    def resume_pending(self) -> int:
+        """
+        Re-queue jobs that stopped heartbeating (a crashed process) and
+        submit every queued job. Called at startup.
+        """
+        conn = self.db.get_connection()
+        try:
+            conn.execute(
+                "UPDATE import_jobs SET status = ? WHERE status = ? AND updated_at < datetime('now', ?)",
+                (QUEUED, RUNNING, f"-{int(Config.IMPORT_JOB_STALE_SECONDS)} seconds"),
+            )
+            conn.commit()
+            job_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM import_jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            )]
+        finally:
+            conn.close()
+        for job_id in job_ids:
+            self.submit(job_id)
+        return len(job_ids)
+
+    def shutdown(self):
+        """Stop after the current batch; unfinished jobs stay queued"""
+        self._stop.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run_safely(self, job_id: str):
+        try:
+            self._run(job_id)
+        except Exception as e:
+            print(f"Import job {job_id} failed: {e}")
+            self._update(job_id, status=FAILED, message=str(e), finished_at=now_sql())
+        finally:
+            # Finished jobs drop their upload; queued ones (shutdown) keep it for the rerun
+            job = self.get_job(job_id)
+            if job and job["status"] in (COMPLETED, FAILED):
+                _remove_file(job["file_path"])
+
+    def _run(self, job_id: str):
+        if self._stop.is_set() or not self._claim(job_id):
+            return
+        job = self.get_job(job_id)
+        repo = Repository(EntityType(job["entity"]))
+        parser = CSVStreamParser(job["entity"])
+        batch_size = Config.CSV_IMPORT_BATCH_SIZE
+        counts = {"rows_parsed": 0, "inserted": 0, "skipped": 0, "errors": 0}
+        pending: List[Dict] = []
+        reported = 0  # parser.row_errors already stored
+
+        def flush(batch):
+            problems = []
+            for result in repo.bulk_create(batch):
+                if result["status"] == "created":
+                    counts["inserted"] += 1
+                    continue
+                if result["status"] == "duplicate":
+                    counts["skipped"] += 1
+                else:
+                    counts["errors"] += 1
+                problems.append((result["row"], result["name"], result["status"], result["message"]))
+            self._record_errors(job_id, problems)
+
+        with open(job["file_path"], "rb") as source:
+            while True:
+                if self._stop.is_set():
+                    # Picked up again (from the start) at the next startup
+                    self._update(job_id, status=QUEUED, message="Interrupted by shutdown")
+                    return
+                chunk = source.read(Config.CSV_READ_CHUNK_SIZE)
+                items = parser.feed(chunk) if chunk else parser.close()
+                counts["rows_parsed"] += len(items)
+                pending.extend(items)
+
+                new_errors = parser.row_errors[reported:]
+                reported = len(parser.row_errors)
+                counts["rows_parsed"] += len(new_errors)
+                counts["errors"] += len(new_errors)
+                self._record_errors(job_id, [(row, name, "error", message) for row, name, message in new_errors])
+
+                if parser.fatal:
+                    self._update(
+                        job_id, status=FAILED, message=parser.errors[-1],
+                        finished_at=now_sql(), **counts,
+                    )
+                    return
+
+                while len(pending) >= batch_size or (pending and not chunk):
+                    batch, pending = pending[:batch_size], pending[batch_size:]
+                    flush(batch)
+                    self._update(job_id, **counts)
+
+                if not chunk:
+                    break
+                self._update(job_id, **counts)
+
+        self._update(job_id, status=COMPLETED, finished_at=now_sql(), **counts)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_import_jobs: Optional[ImportJobService] = None
+_import_jobs_lock = threading.Lock()
+
+
+def get_import_jobs() -> ImportJobService:
+    """Get the global import job service"""
+    global _import_jobs
+    if _import_jobs is None:
+        with _import_jobs_lock:
+            if _import_jobs is None:
+                _import_jobs = ImportJobService(get_db(), workers=Config.IMPORT_WORKERS)
+    return _import_jobs
@@ -0,0 +1,38 @@
+"""
+Shared test setup
+
+The database package opens Config.DATABASE_PATH on import, so the
+environment points it at a throwaway directory before anything else is
+imported.
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_TEST_DIR = tempfile.mkdtemp(prefix="qms-tests-")
+os.environ["DATABASE_PATH"] = os.path.join(_TEST_DIR, "qms.db")
+os.environ["AUDIT_ARCHIVE_DIR"] = os.path.join(_TEST_DIR, "audit_archive")
+os.environ["IMPORT_UPLOAD_DIR"] = os.path.join(_TEST_DIR, "uploads")
+
+
+@pytest.fixture
+def make_db(tmp_path, monkeypatch):
+    """Factory for a migrated Database in tmp_path with the given pool size and timeout"""
+    from config import Config
+    from database.connection import Database
+
+    databases = []
+
+    def factory(pool_size: int = 10, pool_timeout: float = 30.0):
+        monkeypatch.setattr(Config, "DB_POOL_MAX_SIZE", pool_size)
+        monkeypatch.setattr(Config, "DB_POOL_TIMEOUT", pool_timeout)
+        db = Database(str(tmp_path / f"test{len(databases)}.db"))
+        databases.append(db)
+        return db
+
+    yield factory
+    for db in databases:
+        db.close()
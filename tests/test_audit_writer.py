@@ -0,0 +1,63 @@
+"""
+Async audit entries are written only for committed changes
+"""
+import pytest
+from database.audit import AuditWriter, ASYNC
+
+
+@pytest.fixture
+def writer(make_db):
+    db = make_db()
+    writer = AuditWriter(db, mode=ASYNC, flush_interval=0.01)
+    yield writer
+    writer.shutdown()
+
+
+def audited_ids(db):
+    conn = db.get_connection()
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT entity_id FROM audit_log"))
+    finally:
+        conn.close()
+
+
+def change(writer, item_id: str):
+    conn = writer.db.get_connection()
+    conn.execute("INSERT INTO areas (id, name) VALUES (?, ?)", (item_id, f"Area {item_id}"))
+    writer.record(conn, "areas", item_id, "CREATE")
+    return conn
+
+
+def test_entries_are_queued_after_commit(writer):
+    conn = change(writer, "a1")
+    assert writer.stats()["enqueued"] == 0
+    conn.commit()
+    conn.close()
+
+    assert writer.flush(timeout=5)
+    assert audited_ids(writer.db) == ["a1"]
+
+
+def test_rolled_back_or_abandoned_changes_leave_no_entry(writer):
+    conn = change(writer, "a2")
+    conn.rollback()
+    conn.commit()
+    conn.close()
+
+    change(writer, "a3").close()
+
+    assert writer.flush(timeout=5)
+    assert writer.stats()["enqueued"] == 0
+    assert audited_ids(writer.db) == []
+
+
+def test_plain_connection_writes_with_the_change(writer):
+    conn = writer.db.get_connection()
+    try:
+        writer.record(conn.raw, "areas", "a4", "CREATE")
+        conn.rollback()
+    finally:
+        conn.close()
+
+    assert writer.flush(timeout=5)
+    assert audited_ids(writer.db) == []
@@ -0,0 +1,85 @@
+"""
+Repository.bulk_create reports only the rows that fail
+"""
+from config import EntityType
+from database import get_db
+from repositories.base_repository import Repository
+
+
+def test_failing_row_does_not_fail_the_batch():
+    db = get_db()
+    conn = db.get_connection()
+    try:
+        conn.execute("""
+            CREATE TRIGGER test_reject_part BEFORE INSERT ON partnumbers
+            WHEN NEW.name = 'PN-BAD'
+            BEGIN SELECT RAISE(ABORT, 'rejected by test'); END
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+    try:
+        repo = Repository(EntityType.PARTNUMBERS)
+        results = repo.bulk_create([
+            {"row": 2, "name": "PN-1"},
+            {"row": 3, "name": "PN-BAD"},
+            {"row": 4, "name": "PN-2"},
+            {"row": 5, "name": "pn-1"},
+        ])
+    finally:
+        conn = db.get_connection()
+        try:
+            conn.execute("DROP TRIGGER test_reject_part")
+            conn.commit()
+        finally:
+            conn.close()
+
+    assert [r["status"] for r in results] == ["created", "error", "created", "duplicate"]
+    assert "rejected by test" in results[1]["message"]
+    assert results[1]["id"] is None
+
+    conn = db.get_connection()
+    try:
+        names = {row[0] for row in conn.execute("SELECT name FROM partnumbers WHERE name LIKE 'PN-%'")}
+    finally:
+        conn.close()
+    assert names == {"PN-1", "PN-2"}
+
+
+def count_named(table: str, name: str) -> int:
+    conn = get_db().get_connection()
+    try:
+        return conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE name = ? COLLATE NOCASE AND is_active = 1", (name,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_upsert_updates_the_existing_row_on_a_mixed_case_duplicate():
+    repo = Repository(EntityType.EMPLOYEES)
+    first, created = repo.upsert("Ana Upsert", "100")
+    assert created
+
+    second, created = repo.upsert("ANA UPSERT", "200")
+    assert not created
+    assert second["id"] == first["id"]
+    assert second["name"] == "Ana Upsert"
+    assert second["employee_number"] == "200"
+    assert count_named("employees", "ana upsert") == 1
+
+
+def test_bulk_create_upserts_existing_names():
+    repo = Repository(EntityType.EMPLOYEES)
+    existing, _ = repo.upsert("Luis Bulk", "300")
+
+    results = repo.bulk_create([
+        {"row": 2, "name": "LUIS BULK", "employee_number": "301"},
+        {"row": 3, "name": "Marta Bulk", "employee_number": "302"},
+    ])
+
+    assert [r["status"] for r in results] == ["duplicate", "created"]
+    assert results[0]["id"] == existing["id"]
+    assert repo.get_by_id(existing["id"])["employee_number"] == "301"
+    assert count_named("employees", "luis bulk") == 1
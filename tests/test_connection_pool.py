@@ -0,0 +1,171 @@
+"""
+Connection pool checkout, waiting and rollback, and request jobs holding at
+most one pooled connection at a time
+"""
+import asyncio
+import sqlite3
+import threading
+import pytest
+from database.async_db import AsyncDatabase
+from database.cache import VersionedCache, SELECTORS
+from database.report_numbers import ReportNumberAllocator
+
+
+def test_concurrent_jobs_with_small_pool_do_not_time_out(make_db):
+    db = make_db(pool_size=2, pool_timeout=1.0)
+    adb = AsyncDatabase(db, read_workers=4, write_workers=1)
+    # check_interval=0: every get() runs the cross-process version check
+    cache = VersionedCache(db, check_interval=0)
+    allocator = ReportNumberAllocator(db, block_size=2)
+    # Both connections are checked out before either job touches the cache
+    both_checked_out = threading.Barrier(2, timeout=5)
+
+    def load_form(conn):
+        both_checked_out.wait()
+        return cache.get(SELECTORS, "form", lambda: conn.execute("SELECT 1").fetchone()[0], conn=conn)
+
+    def create(conn):
+        number = allocator.allocate(conn)
+        conn.execute("INSERT INTO dmt_records (id, report_number) VALUES (?, ?)", (f"T{number}", number))
+        return number
+
+    async def run():
+        reads = [adb.run_read_with_connection(load_form) for _ in range(4)]
+        writes = [adb.run_transaction(create) for _ in range(4)]
+        return await asyncio.gather(*reads, *writes)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        adb.shutdown()
+
+    assert results[:4] == [1, 1, 1, 1]
+    assert len(set(results[4:])) == 4
+    stats = db.pool_stats()
+    assert stats["in_use"] == 0
+    assert stats["timeouts"] == 0
+
+
+def test_run_transaction_commits_before_the_job_returns(make_db):
+    db = make_db(pool_size=2)
+    adb = AsyncDatabase(db)
+
+    def write(conn):
+        conn.execute("INSERT INTO dmt_records (id, report_number) VALUES ('W1', 1)")
+
+    try:
+        asyncio.run(adb.run_transaction(write))
+    finally:
+        adb.shutdown()
+
+    # The write lock is free again: another connection can start a write at once
+    other = sqlite3.connect(db.db_path, timeout=0)
+    try:
+        other.execute("BEGIN IMMEDIATE")
+        assert other.execute("SELECT COUNT(*) FROM dmt_records WHERE id = 'W1'").fetchone()[0] == 1
+        other.rollback()
+    finally:
+        other.close()
+
+
+def test_run_transaction_rolls_back_on_error(make_db):
+    db = make_db(pool_size=1)
+    adb = AsyncDatabase(db)
+
+    def fail(conn):
+        conn.execute("INSERT INTO dmt_records (id, report_number) VALUES ('F1', 1)")
+        raise ValueError("boom")
+
+    try:
+        with pytest.raises(ValueError):
+            asyncio.run(adb.run_transaction(fail))
+    finally:
+        adb.shutdown()
+
+    conn = db.get_connection()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM dmt_records WHERE id = 'F1'").fetchone()[0] == 0
+    finally:
+        conn.close()
+    assert db.pool_stats()["in_use"] == 0
+
+
+@pytest.fixture
+def pool(tmp_path):
+    from database.pool import ConnectionPool
+
+    path = str(tmp_path / "pool.db")
+    pools = []
+
+    def factory(max_size: int, timeout: float = 1.0):
+        pool = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), max_size=max_size, timeout=timeout)
+        pools.append(pool)
+        return pool
+
+    yield factory
+    for pool in pools:
+        pool.close_all()
+
+
+def test_returned_connection_is_reused(pool):
+    p = pool(max_size=2)
+    first = p.acquire()
+    raw = first.raw
+    assert p.stats()["in_use"] == 1
+    first.close()
+    assert p.stats()["in_use"] == 0 and p.stats()["idle"] == 1
+
+    second = p.acquire()
+    assert second.raw is raw
+    stats = p.stats()
+    assert stats["checkouts"] == 2 and stats["creations"] == 1 and stats["size"] == 1
+    second.close()
+
+
+def test_acquire_waits_for_a_release_then_times_out(pool):
+    from database.pool import PoolTimeoutError
+
+    p = pool(max_size=1)
+    held = p.acquire()
+    got = []
+
+    def waiter():
+        conn = p.acquire(timeout=5)
+        got.append(conn.raw)
+        conn.close()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    threading.Event().wait(0.1)
+    assert not got
+    raw = held.raw
+    held.close()
+    thread.join(timeout=5)
+    assert got == [raw]
+
+    held = p.acquire()
+    with pytest.raises(PoolTimeoutError):
+        p.acquire(timeout=0.05)
+    held.close()
+
+    stats = p.stats()
+    assert stats["waits"] == 2 and stats["timeouts"] == 1
+    assert stats["creations"] == 1 and stats["in_use"] == 0
+
+
+def test_release_rolls_back_an_open_transaction(pool):
+    p = pool(max_size=1)
+    conn = p.acquire()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    assert conn.in_transaction
+    conn.close()
+
+    conn = p.acquire()
+    try:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    finally:
+        conn.close()
+    assert p.stats()["discarded"] == 0
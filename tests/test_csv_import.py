@@ -0,0 +1,79 @@
+"""
+CSVStreamParser: record boundaries come from csv.reader, not quote counting
+"""
+import csv
+from services.csv_import_service import CSVStreamParser
+
+
+def parse(data: bytes, chunk_size: int = 0, entity: str = "workcenters"):
+    parser = CSVStreamParser(entity)
+    if chunk_size:
+        items = []
+        for start in range(0, len(data), chunk_size):
+            items += parser.feed(data[start:start + chunk_size])
+    else:
+        items = parser.feed(data)
+    return items + parser.close(), parser
+
+
+def test_stray_quote_in_unquoted_field_keeps_following_rows():
+    data = b'name\nPIPE 3/4" NPT\nValve\n"Quoted, name"\nElbow\n'
+    for chunk_size in (0, 1, 3, 7):
+        items, parser = parse(data, chunk_size)
+        assert [item["name"] for item in items] == ['PIPE 3/4" NPT', "Valve", "Quoted, name", "Elbow"]
+        assert [item["row"] for item in items] == [2, 3, 4, 5]
+        assert parser.errors == []
+
+
+def test_quoted_newline_across_chunks():
+    data = 'name\n"Line one\nline two"\nCafé\n'.encode()
+    for chunk_size in (0, 1, 4):
+        items, parser = parse(data, chunk_size)
+        assert [item["name"] for item in items] == ["Line one\nline two", "Café"]
+        assert parser.errors == []
+
+
+def test_malformed_record_is_reported_per_row():
+    limit = csv.field_size_limit()
+    csv.field_size_limit(50)
+    try:
+        items, parser = parse(b"name\nGood\n" + b"x" * 80 + b"\nAlso good\n")
+    finally:
+        csv.field_size_limit(limit)
+    assert [item["name"] for item in items] == ["Good", "Also good"]
+    assert [(row, message.split(":")[0]) for row, _, message in parser.row_errors] == [(3, "CSV parsing error")]
+    assert not parser.fatal
+
+
+def test_missing_header_is_fatal():
+    items, parser = parse(b"title\nValve\n")
+    assert items == []
+    assert parser.fatal
+
+
+def test_long_quoted_field_is_not_reparsed_per_chunk(monkeypatch):
+    from services import csv_import_service
+
+    lines_read = []
+    next_line = csv_import_service._LineSource.__next__
+
+    def counting_next(self):
+        line = next_line(self)
+        lines_read.append(line)
+        return line
+
+    monkeypatch.setattr(csv_import_service._LineSource, "__next__", counting_next)
+    body = "".join(f"line {n}\n" for n in range(2000))
+    data = f'name\n"{body}"\nValve\n'.encode()
+    items, parser = parse(data, chunk_size=8)
+
+    assert [item["name"] for item in items] == [body.strip(), "Valve"]
+    assert len(lines_read) < 2 * 2003
+
+
+def test_record_with_several_multiline_fields():
+    data = b'name,note\n"a\n""b""\nc","x\ny"\nNext,z\n'
+    for chunk_size in (0, 1, 2, 5):
+        items, parser = parse(data, chunk_size)
+        assert [item["name"] for item in items] == ['a\n"b"\nc', "Next"]
+        assert parser.errors == []
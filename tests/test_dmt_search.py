@@ -0,0 +1,50 @@
+"""
+The DMT full-text index stays attached to the right records
+"""
+import pytest
+from database.migrations import fts5_available, rebuild_dmt_fts
+
+SEARCH_SQL = (
+    "SELECT d.id FROM dmt_records_fts f JOIN dmt_records d ON d.report_number = f.rowid "
+    "WHERE dmt_records_fts MATCH ? ORDER BY d.id"
+)
+
+
+def test_search_survives_vacuum(make_db):
+    db = make_db()
+    conn = db.get_connection()
+    try:
+        if not fts5_available(conn):
+            pytest.skip("SQLite without FTS5")
+        conn.executemany(
+            "INSERT INTO dmt_records (id, report_number, part_num) VALUES (?, ?, ?)",
+            [(f"R{n}", n, f"part{n}") for n in range(1, 51)],
+        )
+        conn.execute("DELETE FROM dmt_records WHERE report_number % 3 = 0")
+        conn.commit()
+        conn.execute("VACUUM")
+
+        assert [r["id"] for r in conn.execute(SEARCH_SQL, ('"part10"',))] == ["R10"]
+        assert [r["id"] for r in conn.execute(SEARCH_SQL, ('"part11"',))] == ["R11"]
+        assert conn.execute(SEARCH_SQL, ('"part12"',)).fetchall() == []
+
+        conn.execute("UPDATE dmt_records SET part_num = 'renamed' WHERE id = 'R10'")
+        assert [r["id"] for r in conn.execute(SEARCH_SQL, ('"renamed"',))] == ["R10"]
+        assert conn.execute(SEARCH_SQL, ('"part10"',)).fetchall() == []
+
+        assert rebuild_dmt_fts(conn) == 34
+        conn.execute("INSERT INTO dmt_records_fts (dmt_records_fts) VALUES ('integrity-check')")
+    finally:
+        conn.close()
+
+
+def test_customer_is_indexed(make_db):
+    db = make_db()
+    conn = db.get_connection()
+    try:
+        if not fts5_available(conn):
+            pytest.skip("SQLite without FTS5")
+        conn.execute("INSERT INTO dmt_records (id, report_number, customer) VALUES ('R1', 1, 'acme7')")
+        assert [r["id"] for r in conn.execute(SEARCH_SQL, ('"acme7"',))] == ["R1"]
+    finally:
+        conn.close()
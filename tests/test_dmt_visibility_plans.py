@@ -0,0 +1,63 @@
+"""
+The DMT visibility queries read every branch from its partial index
+"""
+import re
+import pytest
+from config import UserRole
+from repositories.dmt_repository import DMTRepository, FULL_VISIBILITY_ROLES
+
+SEARCH_INDEX = re.compile(r"^SEARCH dmt_records USING (?:COVERING )?INDEX (idx_dmt_records_\w+)")
+
+
+def branch_indexes(role: str):
+    """Index stem each visibility branch must use, in branch order"""
+    if role in FULL_VISIBILITY_ROLES:
+        return ["idx_dmt_records_visible", "idx_dmt_records_creator"]
+    return ["idx_dmt_records_creator", "idx_dmt_records_assignee", "idx_dmt_records_creator"]
+
+
+def plan(conn, sql, params):
+    details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    assert not [d for d in details if d.startswith("SCAN dmt_records")], details
+    assert not [d for d in details if "USE TEMP B-TREE FOR ORDER BY" in d], details
+    return [m.group(1) for m in map(SEARCH_INDEX.match, details) if m]
+
+
+@pytest.fixture
+def conn(make_db):
+    conn = make_db().get_connection()
+    conn.executemany(
+        "INSERT INTO dmt_records (id, report_number, created_by, assigned_to, is_session, is_active) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (f"R{n}", n, f"user{n % 20}", f"user{n % 7}", int(n % 5 == 0), int(n % 11 != 0))
+            for n in range(1, 2001)
+        ],
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("role", [role.value for role in UserRole])
+@pytest.mark.parametrize("order, suffix", [("report_number DESC", "_number"), ("created_at DESC", "_created")])
+def test_visible_select_uses_the_partial_indexes(conn, role, order, suffix):
+    user = {"id": "user3", "role": role}
+    expected = [stem + suffix for stem in branch_indexes(role)]
+
+    assert plan(conn, *DMTRepository.visible_select(user, order=order, limit=26)) == expected
+    if suffix == "_number":
+        # Keyset page: the cursor predicate extends the same index range
+        sql, params = DMTRepository.visible_select(user, where=" AND report_number < ?", params=[100], limit=26)
+        assert plan(conn, sql, params) == expected
+
+
+@pytest.mark.parametrize("role", [role.value for role in UserRole])
+def test_visible_count_uses_the_partial_indexes(conn, role):
+    user = {"id": "user3", "role": role}
+    used = plan(conn, *DMTRepository.visible_count(user))
+
+    assert len(used) == len(branch_indexes(role))
+    for index, stem in zip(used, branch_indexes(role)):
+        assert index in (stem + "_number", stem + "_created")
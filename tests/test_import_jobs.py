@@ -0,0 +1,41 @@
+"""
+Finished import jobs remove their uploaded file
+"""
+import os
+from config import Config
+from database import get_db
+from services.import_job_service import ImportJobService, COMPLETED, FAILED
+
+
+def queue_job(service, job_id, entity, content: bytes):
+    os.makedirs(Config.IMPORT_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(Config.IMPORT_UPLOAD_DIR, f"{job_id}.csv")
+    with open(path, "wb") as f:
+        f.write(content)
+    conn = service.db.get_connection()
+    try:
+        conn.execute(
+            "INSERT INTO import_jobs (id, entity, filename, file_path, status) VALUES (?, ?, ?, ?, 'queued')",
+            (job_id, entity, f"{job_id}.csv", path),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+def test_upload_is_removed_when_a_job_completes_or_fails():
+    service = ImportJobService(get_db())
+    try:
+        cases = {
+            "job-ok": ("workcenters", b"name\nWC import test\n", COMPLETED),
+            "job-bad-header": ("workcenters", b"title\nX\n", FAILED),
+            "job-crash": ("no_such_entity", b"name\nX\n", FAILED),
+        }
+        for job_id, (entity, content, expected) in cases.items():
+            path = queue_job(service, job_id, entity, content)
+            service._run_safely(job_id)
+            assert service.get_job(job_id)["status"] == expected
+            assert not os.path.exists(path)
+    finally:
+        service.shutdown()
@@ -0,0 +1,68 @@
+"""
+Session cookies: signing key checks and session id rotation on login
+"""
+import asyncio
+import pytest
+from config import Config
+
+
+def test_default_secret_key_is_refused_outside_debug(monkeypatch):
+    monkeypatch.setattr(Config, "SECRET_KEY", Config.DEFAULT_SECRET_KEY)
+    monkeypatch.setattr(Config, "DEBUG", False)
+    with pytest.raises(ValueError):
+        Config.validate()
+
+    monkeypatch.setattr(Config, "DEBUG", True)
+    with pytest.warns(UserWarning):
+        Config.validate()
+
+    monkeypatch.setattr(Config, "DEBUG", False)
+    monkeypatch.setattr(Config, "SECRET_KEY", "a-real-secret")
+    Config.validate()
+
+
+def run_request(middleware, path: str, cookie=None):
+    """Send one request through the middleware; returns the Set-Cookie value (or None)"""
+    scope = {"type": "http", "path": path, "headers": []}
+    if cookie:
+        scope["headers"].append((b"cookie", cookie.encode()))
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    for name, value in sent[0].get("headers", []):
+        if name == b"set-cookie":
+            return value.decode().split(";")[0]
+    return None
+
+
+def test_login_rotates_the_session_id():
+    pytest.importorskip("starlette")
+    pytest.importorskip("itsdangerous")
+    from auth.session_middleware import ServerSessionMiddleware
+    from database.sessions import get_session_store
+
+    async def app(scope, receive, send):
+        if scope["path"] == "/login":
+            scope["session"]["user"] = {"id": "u1", "role": "Admin"}
+        else:
+            scope["session"]["visits"] = scope["session"].get("visits", 0) + 1
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = ServerSessionMiddleware(app, secret_key="test-secret")
+    anonymous = run_request(middleware, "/")
+    assert anonymous
+
+    logged_in = run_request(middleware, "/login", anonymous)
+    assert logged_in and logged_in != anonymous
+    old_id = middleware._unsign(anonymous.split("=", 1)[1])
+    assert get_session_store().load(old_id) is None
+
+    # Other changes keep the id
+    assert run_request(middleware, "/", logged_in) == logged_in